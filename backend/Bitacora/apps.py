@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BitacoraConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Bitacora'
+
+    def ready(self):
+        # Columna e índice de búsqueda de texto completo (solo PostgreSQL)
+        from .busqueda import crear_busqueda_al_migrar
+        post_migrate.connect(crear_busqueda_al_migrar, sender=self)
@@ -0,0 +1,44 @@
+"""
+Búsqueda de texto completo en la bitácora (PostgreSQL)
+
+La columna `busqueda` (tsvector generado a partir de acción y descripción) y su
+índice GIN no forman parte del modelo: las migraciones se generan en cada
+instalación y un GeneratedField con SearchVector no se puede crear en otras BD.
+Se agregan después de migrar, solo en PostgreSQL; en las demás BD la búsqueda
+usa coincidencia por subcadena (ver buscar_bitacoras).
+"""
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from .models import Bitacora
+
+
+TABLA = Bitacora._meta.db_table
+
+COLUMNA_BUSQUEDA = 'busqueda'
+
+INDICE_BUSQUEDA = 'bitacora_busqueda_gin_idx'
+
+
+def crear_busqueda(cursor):
+    # IF NOT EXISTS: se ejecuta después de cada migrate y al particionar la tabla
+    cursor.execute(
+        f'ALTER TABLE {TABLA} ADD COLUMN IF NOT EXISTS {COLUMNA_BUSQUEDA} tsvector '
+        f"GENERATED ALWAYS AS (to_tsvector('spanish'::regconfig, "
+        f"COALESCE(accion, '') || ' ' || COALESCE(descripcion, ''))) STORED"
+    )
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {INDICE_BUSQUEDA} ON {TABLA} USING gin ({COLUMNA_BUSQUEDA})')
+
+
+def crear_busqueda_al_migrar(using, **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        crear_busqueda(cursor)
+
+
+def vector_busqueda():
+    """Expresión con la columna generada, para filtrar con SearchQuery y ordenar con SearchRank"""
+    return RawSQL(f'{TABLA}.{COLUMNA_BUSQUEDA}', [], output_field=SearchVectorField())
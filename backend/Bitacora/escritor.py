@@ -0,0 +1,148 @@
+"""
+Escritura diferida de la bitácora
+
+registrar_accion_bitacora se llama en el camino crítico de login, logout y de
+cada cambio de usuarios, clientes y permisos. En lugar de un INSERT por acción, los
+registros se encolan en memoria y un hilo del proceso los guarda con bulk_create
+cuando se juntan TAMANO_LOTE_BITACORA o pasa INTERVALO_BITACORA, lo que ocurra
+primero. Al terminar el proceso se guardan los pendientes (atexit).
+
+Si la cola está llena, o con BITACORA_ASINCRONA=False en settings, el registro se
+guarda en el momento, como antes. Los registros encolados se pierden si el proceso
+muere de golpe (kill -9) antes del siguiente vaciado.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .models import Bitacora
+
+
+# Registros por bulk_create
+TAMANO_LOTE_BITACORA = 200
+
+# Segundos máximos que un registro espera en la cola
+INTERVALO_BITACORA = 1.0
+
+# Registros en espera a partir de los cuales se escribe en el momento
+MAX_PENDIENTES_BITACORA = 10000
+
+# Marca en la cola para que el hilo termine
+_FIN = object()
+
+
+class EscritorBitacora:
+    def __init__(self, tamano_lote=TAMANO_LOTE_BITACORA, intervalo=INTERVALO_BITACORA,
+                 max_pendientes=MAX_PENDIENTES_BITACORA):
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.cola = queue.Queue(maxsize=max_pendientes)
+        self._candado = threading.Lock()
+        self._hilo = None
+        self._pid = None
+
+    def registrar(self, bitacora):
+        """
+        Encola un Bitacora sin guardar; lo guarda en el momento si no se puede encolar
+        """
+        if not getattr(settings, 'BITACORA_ASINCRONA', True):
+            bitacora.save()
+            return
+        self._iniciar()
+        try:
+            self.cola.put_nowait(bitacora)
+        except queue.Full:
+            bitacora.save()
+
+    def vaciar(self):
+        """
+        Guarda lo que haya en la cola desde el hilo que llama. Retorna cuántos registros guardó
+        """
+        total = 0
+        while True:
+            lote = []
+            try:
+                while len(lote) < self.tamano_lote:
+                    bitacora = self.cola.get_nowait()
+                    if bitacora is not _FIN:
+                        lote.append(bitacora)
+            except queue.Empty:
+                pass
+            if not lote:
+                return total
+            self._guardar(lote)
+            total += len(lote)
+
+    def detener(self, espera=5):
+        """
+        Pide al hilo que guarde su lote en curso y termine, y guarda lo que quede
+        """
+        if self._pid == os.getpid() and self._hilo.is_alive():
+            try:
+                self.cola.put(_FIN, timeout=espera)
+                self._hilo.join(espera)
+            except queue.Full:
+                pass
+        self.vaciar()
+
+    def _iniciar(self):
+        # El hilo se crea en el proceso que registra: con `gunicorn --preload` cada
+        # worker (fork del maestro) necesita el suyo, y también su propia cola
+        if self._pid == os.getpid():
+            return
+        with self._candado:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self.cola = queue.Queue(maxsize=self.cola.maxsize)
+            self._hilo = threading.Thread(target=self._trabajar, name='escritor-bitacora', daemon=True)
+            self._hilo.start()
+            self._pid = os.getpid()
+
+    def _trabajar(self):
+        while True:
+            # El lote se guarda al llegar a tamano_lote o `intervalo` segundos
+            # después de su primer registro, lo que ocurra primero
+            bitacora = self.cola.get()
+            if bitacora is _FIN:
+                return
+            lote = [bitacora]
+            limite = time.monotonic() + self.intervalo
+            fin = False
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    bitacora = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if bitacora is _FIN:
+                    fin = True
+                    break
+                lote.append(bitacora)
+            self._guardar(lote)
+            if fin:
+                return
+
+    def _guardar(self, lote):
+        close_old_connections()
+        try:
+            Bitacora.objects.bulk_create(lote)
+        except Exception as e:
+            # Un registro inválido no debe hacer perder el resto del lote
+            print(f"Error guardando {len(lote)} registros de bitácora, se guardan uno a uno: {e}")
+            close_old_connections()
+            for bitacora in lote:
+                try:
+                    bitacora.save()
+                except Exception as e:
+                    print(f"Registro de bitácora descartado ({bitacora.accion}): {e}")
+
+
+escritor_bitacora = EscritorBitacora()
+atexit.register(escritor_bitacora.detener)
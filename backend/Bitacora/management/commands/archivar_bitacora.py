@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from Bitacora.particiones import archivar
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda los meses de bitácora anteriores al período de retención en archivos "
+        "CSV comprimidos (bitacora_AAAA_MM.csv.gz) y los elimina de la base de datos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=12,
+                            help='Meses completos que se conservan en la BD además del actual')
+        parser.add_argument('--destino', default=str(settings.BASE_DIR / 'archivo_bitacora'),
+                            help='Directorio donde se guardan los archivos')
+        parser.add_argument('--simular', action='store_true',
+                            help='Solo mostrar qué meses se archivarían')
+
+    def handle(self, *args, **options):
+        if options['meses'] < 0:
+            raise CommandError("--meses no puede ser negativo")
+
+        resultado = archivar(options['meses'], options['destino'], simular=options['simular'])
+
+        verbo = "Se archivaría" if options['simular'] else "Archivado"
+        for mes, filas, archivo in resultado:
+            self.stdout.write(f"{verbo} {mes:%Y-%m}: {filas} registros -> {archivo}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(resultado)} meses {'por archivar' if options['simular'] else 'archivados'}"
+        ))
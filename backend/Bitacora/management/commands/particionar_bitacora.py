@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from Bitacora.particiones import ParticionadoNoSoportado, particionar
+
+
+class Command(BaseCommand):
+    help = (
+        "Convierte la bitácora en una tabla particionada por mes (PostgreSQL) y crea "
+        "las particiones de los próximos meses. Ejecutar una vez al mes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses-futuros', type=int, default=3,
+                            help='Meses siguientes al actual para los que se crea partición')
+
+    def handle(self, *args, **options):
+        if options['meses_futuros'] < 0:
+            raise CommandError("--meses-futuros no puede ser negativo")
+
+        try:
+            convertida, creadas = particionar(options['meses_futuros'])
+        except ParticionadoNoSoportado as e:
+            raise CommandError(str(e))
+
+        if convertida:
+            self.stdout.write("Tabla bitacora convertida a tabla particionada por mes")
+        for nombre in creadas:
+            self.stdout.write(f"Partición creada: {nombre}")
+        self.stdout.write(self.style.SUCCESS(f"Particiones al día ({len(creadas)} nuevas)"))
@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
 
 # Create your models here.
 class Bitacora (models.Model):
@@ -7,6 +8,18 @@ class Bitacora (models.Model):
     fecha_hora = models.DateTimeField()
     accion = models.TextField()
     descripcion = models.TextField()
+    # En PostgreSQL la tabla tiene además la columna generada `busqueda` con su
+    # índice GIN, fuera del modelo (ver Bitacora/busqueda.py)
 
     class Meta :
-        db_table = 'bitacora'
\ No newline at end of file
+        db_table = 'bitacora'
+        indexes = [
+            # Orden del listado y de su paginación por cursor
+            models.Index(fields=['-fecha_hora', '-id'], name='bitacora_fecha_id_idx'),
+            # Rangos de fechas (filtros desde/hasta, archivado): las filas llegan en
+            # orden de fecha_hora y un BRIN ocupa unos pocos KB aun con millones de filas
+            BrinIndex(fields=['fecha_hora'], name='bitacora_fecha_brin_idx'),
+            # Filtros por usuario y por acción, ya ordenados por fecha
+            models.Index(fields=['username', '-fecha_hora'], name='bitacora_username_idx'),
+            models.Index(fields=['accion', '-fecha_hora'], name='bitacora_accion_idx'),
+        ]
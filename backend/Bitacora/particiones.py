@@ -0,0 +1,277 @@
+"""
+Particionado mensual y archivado de la bitácora (PostgreSQL)
+
+La tabla bitacora se convierte en una tabla particionada por rango de fecha_hora,
+con una partición por mes (bitacora_AAAA_MM) y una partición por defecto para las
+fechas sin partición. Las consultas con rango de fechas solo leen los meses
+involucrados, y borrar un mes viejo es un DROP TABLE en lugar de un DELETE de
+millones de filas.
+
+- particionar_bitacora: convierte la tabla (una vez) y crea las particiones de los
+  meses siguientes; conviene ejecutarlo cada mes (cron).
+- archivar_bitacora: guarda cada mes anterior al período de retención en un CSV
+  comprimido y lo elimina de la BD.
+
+La clave primaria de la tabla particionada es (id, fecha_hora), como exige
+PostgreSQL; id sigue siendo único porque lo asigna una secuencia.
+"""
+
+import csv
+import gzip
+import os
+import re
+from datetime import date, datetime, time, timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Bitacora
+from .busqueda import INDICE_BUSQUEDA, crear_busqueda
+
+
+TABLA = Bitacora._meta.db_table
+
+PATRON_PARTICION = re.compile(rf'^{TABLA}_(\d{{4}})_(\d{{2}})$')
+
+# Filas por viaje del cursor al archivar sin particiones
+TAMANO_BLOQUE_ARCHIVO = 5000
+
+
+class ParticionadoNoSoportado(Exception):
+    pass
+
+
+def _mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _mes_anterior(mes):
+    return date(mes.year - (mes.month == 1), (mes.month - 2) % 12 + 1, 1)
+
+
+def _columnas():
+    # Sin columnas generadas: PostgreSQL las calcula y no acepta valores para ellas
+    return [campo.column for campo in Bitacora._meta.concrete_fields if not getattr(campo, 'generated', False)]
+
+
+def _nombre_particion(mes):
+    return f'{TABLA}_{mes.year:04d}_{mes.month:02d}'
+
+
+def _inicio_mes(mes):
+    # Límites en UTC, igual que fecha_hora (timestamp with time zone)
+    return datetime.combine(mes, time.min, tzinfo=dt_timezone.utc)
+
+
+def _verificar_postgresql():
+    if connection.vendor != 'postgresql':
+        raise ParticionadoNoSoportado('El particionado de la bitácora requiere PostgreSQL')
+
+
+def esta_particionada():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [TABLA])
+        return cursor.fetchone()[0] == 'p'
+
+
+def particiones_existentes():
+    """
+    {primer día del mes: nombre} de las particiones mensuales
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass', [TABLA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    meses = {}
+    for nombre in nombres:
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            meses[date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)] = nombre
+    return meses
+
+
+def crear_particion(cursor, mes):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {_nombre_particion(mes)} PARTITION OF {TABLA} '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        [_inicio_mes(mes), _inicio_mes(_mes_siguiente(mes))]
+    )
+
+
+def particionar(meses_futuros=3):
+    """
+    Convierte la tabla en particionada si aún no lo está y crea las particiones
+    desde el mes más antiguo con datos hasta `meses_futuros` meses después del
+    actual. Retorna (convertida, particiones creadas)
+    """
+    _verificar_postgresql()
+    hoy = timezone.now().date().replace(day=1)
+    ultimo = hoy
+    for _ in range(meses_futuros):
+        ultimo = _mes_siguiente(ultimo)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Las escrituras esperan a que termine; si alguna falla al reanudarse (la
+        # tabla cambió), el escritor de la bitácora la reintenta fila a fila
+        cursor.execute(f'LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT MIN(fecha_hora) FROM {TABLA}')
+        minimo = cursor.fetchone()[0]
+        mes = min(minimo.astimezone(dt_timezone.utc).date().replace(day=1), hoy) if minimo else hoy
+
+        convertida = not esta_particionada()
+        if convertida:
+            _convertir(cursor)
+
+        existentes = particiones_existentes()
+        creadas = []
+        while mes <= ultimo:
+            if mes not in existentes:
+                crear_particion(cursor, mes)
+                creadas.append(_nombre_particion(mes))
+            mes = _mes_siguiente(mes)
+
+        if convertida:
+            columnas = ', '.join(_columnas())
+            cursor.execute(
+                f'INSERT INTO {TABLA} ({columnas}) SELECT {columnas} FROM {TABLA}_sin_particionar'
+            )
+            cursor.execute(f'DROP TABLE {TABLA}_sin_particionar')
+            # Los índices del modelo (BRIN, username, acción...) se crean en la tabla
+            # madre y PostgreSQL los replica en cada partición
+            with connection.schema_editor(atomic=False) as editor:
+                for indice in Bitacora._meta.indexes:
+                    editor.add_index(Bitacora, indice)
+            crear_busqueda(cursor)
+
+    return convertida, creadas
+
+
+def _convertir(cursor):
+    anterior = f'{TABLA}_sin_particionar'
+    # La secuencia de la columna identity original se elimina junto con la tabla anterior
+    secuencia = f'{TABLA}_particionada_id_seq'
+    cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {anterior}')
+    # Los nombres de los índices son globales al esquema: se eliminan los de la
+    # tabla anterior para volver a crearlos sobre la particionada
+    for indice in Bitacora._meta.indexes:
+        cursor.execute(f'DROP INDEX IF EXISTS {indice.name}')
+    cursor.execute(f'DROP INDEX IF EXISTS {INDICE_BUSQUEDA}')
+
+    cursor.execute(
+        f'CREATE TABLE {TABLA} (LIKE {anterior} INCLUDING DEFAULTS INCLUDING GENERATED) '
+        f'PARTITION BY RANGE (fecha_hora)'
+    )
+    cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {secuencia} AS bigint')
+    cursor.execute(
+        f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {anterior}), 0) + 1, false)', [secuencia]
+    )
+    cursor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{secuencia}')")
+    cursor.execute(f'ALTER SEQUENCE {secuencia} OWNED BY {TABLA}.id')
+    cursor.execute(f'ALTER TABLE {TABLA} ADD PRIMARY KEY (id, fecha_hora)')
+    cursor.execute(f'CREATE TABLE {TABLA}_default PARTITION OF {TABLA} DEFAULT')
+
+
+def archivar(meses_retencion, destino, simular=False):
+    """
+    Guarda en `destino`/bitacora_AAAA_MM.csv.gz cada mes anterior a los últimos
+    `meses_retencion` meses y lo elimina de la BD: con particiones, con COPY y
+    DROP de la partición; sin ellas (u otras BD), leyendo con un cursor y borrando
+    el rango. Con simular=True solo informa. Retorna [(mes, filas, archivo)]
+    """
+    limite = timezone.now().date().replace(day=1)
+    for _ in range(meses_retencion):
+        limite = _mes_anterior(limite)
+
+    particiones = particiones_existentes() if esta_particionada() else {}
+    meses = set(mes for mes in particiones if mes < limite)
+    primera = Bitacora.objects.filter(fecha_hora__lt=_inicio_mes(limite)).order_by('fecha_hora').first()
+    if primera:
+        mes = primera.fecha_hora.astimezone(dt_timezone.utc).date().replace(day=1)
+        while mes < limite:
+            meses.add(mes)
+            mes = _mes_siguiente(mes)
+
+    if not simular:
+        os.makedirs(destino, exist_ok=True)
+
+    resultado = []
+    for mes in sorted(meses):
+        archivo = os.path.join(destino, f'{_nombre_particion(mes)}.csv.gz')
+        rango = Bitacora.objects.filter(
+            fecha_hora__gte=_inicio_mes(mes), fecha_hora__lt=_inicio_mes(_mes_siguiente(mes))
+        )
+        if simular:
+            resultado.append((mes, rango.count(), archivo))
+            continue
+        if os.path.exists(archivo):
+            # No sobrescribir un archivo de una ejecución anterior
+            archivo = archivo.replace('.csv.gz', f'_{timezone.now():%Y%m%d%H%M%S}.csv.gz')
+
+        if mes in particiones:
+            filas = _archivar_particion(particiones[mes], archivo)
+        else:
+            filas = _archivar_rango(rango, archivo)
+        if filas:
+            resultado.append((mes, filas, archivo))
+        elif os.path.exists(archivo):
+            os.remove(archivo)
+    return resultado
+
+
+def _escribir_y_sincronizar(archivo, escribir):
+    # El archivo debe estar completo en disco antes de borrar las filas
+    with open(archivo, 'wb') as crudo:
+        with gzip.GzipFile(fileobj=crudo, mode='wb') as comprimido:
+            escribir(comprimido)
+        crudo.flush()
+        os.fsync(crudo.fileno())
+
+
+def _archivar_particion(nombre, archivo):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {nombre}')
+        filas = cursor.fetchone()[0]
+        columnas = ', '.join(_columnas())
+        _escribir_y_sincronizar(archivo, lambda salida: cursor.copy_expert(
+            f'COPY (SELECT {columnas} FROM {nombre} ORDER BY fecha_hora, id) TO STDOUT WITH CSV HEADER',
+            salida
+        ))
+        cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre}')
+        cursor.execute(f'DROP TABLE {nombre}')
+    return filas
+
+
+def _archivar_rango(rango, archivo):
+    campos = _columnas()
+    filas = 0
+    ultimo_id = None
+
+    def escribir(salida):
+        nonlocal filas, ultimo_id
+        escritor = csv.writer(_TextoGzip(salida))
+        escritor.writerow(campos)
+        for fila in rango.order_by('fecha_hora', 'id').values_list(*campos).iterator(
+                chunk_size=TAMANO_BLOQUE_ARCHIVO):
+            escritor.writerow(fila)
+            filas += 1
+            ultimo_id = max(ultimo_id or 0, fila[0])
+
+    with transaction.atomic():
+        _escribir_y_sincronizar(archivo, escribir)
+        # Solo las filas archivadas (no las que llegaron mientras se escribía).
+        # Bitacora no tiene relaciones ni señales: es un solo DELETE
+        if filas:
+            rango.filter(id__lte=ultimo_id).delete()
+    return filas
+
+
+class _TextoGzip:
+    """Adaptador para que csv.writer escriba texto UTF-8 en un archivo binario"""
+
+    def __init__(self, salida):
+        self.salida = salida
+
+    def write(self, texto):
+        self.salida.write(texto.encode('utf-8'))
@@ -13,4 +13,7 @@ class serializerBitacora (serializers.Serializer):
     ip = serializers.CharField(max_length=45)
     fecha_hora = serializers.DateTimeField()
     accion = serializers.CharField()
-    descripcion = serializers.CharField()
\ No newline at end of file
+    descripcion = serializers.CharField()
+
+class serializerBusquedaBitacora (serializerBitacora):
+    relevancia = serializers.FloatField()
@@ -1,3 +1,127 @@
-from django.test import TestCase
+import csv
+import gzip
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.core.cache import caches
+from Permisos import cache as cache_permisos
+from Permisos.models import PermisoModulo, Rol, RolPermiso, UsuarioRol
+from Usuarios.jwt_utils import generate_token
+from Usuarios.models import Usuario
+from .escritor import EscritorBitacora
+from .models import Bitacora
+from .particiones import archivar
 
-# Create your tests here.
+
+def registro(numero, fecha_hora=None, username='admin', accion='Prueba'):
+    return Bitacora(
+        username=username, ip='127.0.0.1', fecha_hora=fecha_hora or timezone.now(),
+        accion=accion, descripcion=f'Registro {numero}'
+    )
+
+
+class EscritorBitacoraTest(TransactionTestCase):
+    def tearDown(self):
+        connection.close()
+
+    def test_guarda_por_lotes_al_detener(self):
+        escritor = EscritorBitacora(tamano_lote=10, intervalo=60)
+        for numero in range(25):
+            escritor.registrar(registro(numero))
+
+        escritor.detener()
+
+        self.assertFalse(escritor._hilo.is_alive())
+        self.assertEqual(Bitacora.objects.count(), 25)
+
+    def test_cola_llena_guarda_en_el_momento(self):
+        escritor = EscritorBitacora(intervalo=60, max_pendientes=1)
+        escritor._iniciar = lambda: None  # Sin hilo: la cola no se vacía sola
+        escritor.registrar(registro(1))
+        escritor.registrar(registro(2))
+
+        self.assertEqual(Bitacora.objects.count(), 1)
+        self.assertEqual(escritor.vaciar(), 1)
+        self.assertEqual(Bitacora.objects.count(), 2)
+
+    @override_settings(BITACORA_ASINCRONA=False)
+    def test_modo_sincrono(self):
+        escritor = EscritorBitacora()
+        escritor.registrar(registro(1))
+
+        self.assertIsNone(escritor._hilo)
+        self.assertEqual(Bitacora.objects.count(), 1)
+
+
+class FiltrosBitacoraTest(TestCase):
+    def setUp(self):
+        inicio = datetime(2025, 3, 1, 12, tzinfo=dt_timezone.utc)
+        Bitacora.objects.bulk_create([
+            registro(dia, inicio + timedelta(days=dia),
+                     username='ana' if dia % 2 else 'luis',
+                     accion='Login' if dia % 3 else 'Logout')
+            for dia in range(10)
+        ])
+        cache_permisos._local.clear()
+        caches['permisos'].clear()
+        usuario = Usuario.objects.create(username='auditor', correo='auditor@test.com', password='clave', tipo_usuario='empleado')
+        rol = Rol.objects.create(nombre='Auditor')
+        modulo = PermisoModulo.objects.create(modulo='bitacora', nombre_menu='Bitácora', ruta='/bitacora')
+        RolPermiso.objects.create(rol=rol, permiso_modulo=modulo)
+        UsuarioRol.objects.create(usuario=usuario, rol=rol)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(usuario)}')
+
+    def test_filtros(self):
+        api = self.api
+        respuesta = api.get('/api/bitacora/', {'username': 'ana', 'desde': '2025-03-03', 'hasta': '2025-03-08'})
+        self.assertEqual([fila['descripcion'] for fila in respuesta.data], ['Registro 7', 'Registro 5', 'Registro 3'])
+
+        respuesta = api.get('/api/bitacora/', {'accion': 'Logout', 'hasta': '2025-03-04T11:00:00Z'})
+        self.assertEqual([fila['descripcion'] for fila in respuesta.data], ['Registro 0'])
+
+        self.assertEqual(api.get('/api/bitacora/', {'desde': '2025-13-01'}).status_code, 400)
+
+    def test_busqueda(self):
+        Bitacora.objects.bulk_create([
+            registro('cliente con CI 7788990', accion='Creación de Cliente'),
+            registro('rol Vendedor asignado', accion='Asignación de Rol a Usuario'),
+        ])
+        api = self.api
+        respuesta = api.get('/api/bitacora/buscar/', {'q': '7788990'})
+        self.assertEqual(respuesta.data['count'], 1)
+        self.assertEqual(respuesta.data['results'][0]['accion'], 'Creación de Cliente')
+        self.assertIn('relevancia', respuesta.data['results'][0])
+
+        respuesta = api.get('/api/bitacora/buscar/', {'q': 'Login', 'username': 'ana', 'page_size': 2})
+        self.assertEqual(respuesta.data['count'], 3)
+        self.assertEqual(len(respuesta.data['results']), 2)
+
+        self.assertEqual(api.get('/api/bitacora/buscar/').status_code, 400)
+
+
+class ArchivarBitacoraTest(TestCase):
+    def test_archiva_meses_fuera_de_retencion(self):
+        mes_actual = timezone.now().replace(day=1, hour=12)
+        hace_tres_meses = (mes_actual - timedelta(days=80)).replace(day=15)
+        Bitacora.objects.bulk_create([
+            registro(1, hace_tres_meses), registro(2, hace_tres_meses), registro(3, mes_actual),
+        ])
+
+        with tempfile.TemporaryDirectory() as destino:
+            resultado = archivar(1, destino)
+
+            self.assertEqual(len(resultado), 1)
+            _, filas, archivo = resultado[0]
+            self.assertEqual(filas, 2)
+            with gzip.open(archivo, 'rt', encoding='utf-8') as entrada:
+                lineas = list(csv.reader(entrada))
+            self.assertEqual(lineas[0][:3], ['id', 'username', 'ip'])
+            self.assertEqual([linea[-1] for linea in lineas[1:]], ['Registro 1', 'Registro 2'])
+            self.assertEqual(os.listdir(destino), [os.path.basename(archivo)])
+
+        self.assertEqual(list(Bitacora.objects.values_list('descripcion', flat=True)), ['Registro 3'])
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import listar_bitacoras, registrar_bitacora
+from .views import listar_bitacoras, buscar_bitacoras, exportar_bitacoras, registrar_bitacora
 
 urlpatterns = [
     path('', listar_bitacoras, name='listar_bitacoras'),
+    path('buscar/', buscar_bitacoras, name='buscar_bitacoras'),
+    path('exportar/', exportar_bitacoras, name='exportar_bitacoras'),
     path('registrar/', registrar_bitacora, name='registrar_bitacora'),
 ]
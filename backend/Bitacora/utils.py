@@ -1,11 +1,12 @@
 from django.utils import timezone
 from .models import Bitacora
-from Usuarios.models import Usuario
+from .escritor import escritor_bitacora
 
 def registrar_accion_bitacora(request, accion, descripcion, usuario_obj=None):
     """
     Una función centralizada para registrar acciones en la bitácora.
     Acepta un objeto de usuario opcional para vistas públicas como login o registro.
+    El registro se guarda en segundo plano, por lotes (ver Bitacora/escritor.py).
     """
     username = "Anónimo"
     
@@ -13,15 +14,15 @@ def registrar_accion_bitacora(request, accion, descripcion, usuario_obj=None):
         username = usuario_obj.username
     else:
         # Si no se pasa un usuario, intentamos obtenerlo del request (para vistas protegidas)
-        # El decorador @jwt_required se encarga de asignar el usuario autenticado a request.user.
-        if hasattr(request, 'user') and isinstance(request.user, Usuario):
+        # JWTAutenticacion y el decorador @jwt_required asignan el usuario autenticado a request.user.
+        if getattr(getattr(request, 'user', None), 'is_authenticated', False):
             username = request.user.username
 
-    Bitacora.objects.create(
+    escritor_bitacora.registrar(Bitacora(
         username=username,
         ip=request.META.get('REMOTE_ADDR'),
         fecha_hora=timezone.now(),
         accion=accion,
         descripcion=descripcion
-    )
+    ))
     
\ No newline at end of file
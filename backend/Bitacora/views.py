@@ -2,16 +2,111 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Bitacora
-from .serializers import RegistroBitacora, serializerBitacora
+from .busqueda import vector_busqueda
+from .serializers import RegistroBitacora, serializerBitacora, serializerBusquedaBitacora
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+from nucleo.paginacion import PaginacionPorPagina, respuesta_paginada
+from nucleo.exportacion import FORMATOS_EXPORTACION, respuesta_exportacion
 
 
-# 📋 Listar todas las bitácoras
+def _limite_fecha(valor):
+    """
+    Convierte AAAA-MM-DD o una fecha y hora ISO en datetime aware.
+    Retorna (fecha_hora, solo_fecha). Lanza ValueError si el valor es inválido
+    """
+    try:
+        dia = parse_date(valor)
+        fecha_hora = datetime.combine(dia, time.min) if dia else parse_datetime(valor)
+    except ValueError:
+        raise ValueError(valor)
+    if fecha_hora is None:
+        raise ValueError(valor)
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora, dia is not None
+
+
+def filtrar_bitacoras(bitacoras, params):
+    """
+    Filtros ?username=&accion=&ip=&desde=&hasta= (coincidencia exacta, para que
+    usen los índices). `hasta` con solo fecha incluye todo ese día.
+    Lanza ValueError si una fecha es inválida
+    """
+    for campo in ("username", "accion", "ip"):
+        if params.get(campo):
+            bitacoras = bitacoras.filter(**{campo: params[campo]})
+    if params.get("desde"):
+        desde, _ = _limite_fecha(params["desde"])
+        bitacoras = bitacoras.filter(fecha_hora__gte=desde)
+    if params.get("hasta"):
+        hasta, solo_fecha = _limite_fecha(params["hasta"])
+        if solo_fecha:
+            bitacoras = bitacoras.filter(fecha_hora__lt=hasta + timedelta(days=1))
+        else:
+            bitacoras = bitacoras.filter(fecha_hora__lte=hasta)
+    return bitacoras
+
+
+# 📋 Listar las bitácoras (filtros opcionales: username, accion, ip, desde, hasta)
 @api_view(["GET"])
 def listar_bitacoras(request):
-    bitacoras = Bitacora.objects.all().order_by("-fecha_hora")  # orden descendente
-    serializer = serializerBitacora(bitacoras, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    try:
+        bitacoras = filtrar_bitacoras(Bitacora.objects.all(), request.query_params)
+    except ValueError as e:
+        return Response({"error": f"Fecha inválida: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    bitacoras = bitacoras.order_by("-fecha_hora", "-id")  # orden descendente
+    return respuesta_paginada(request, bitacoras, serializerBitacora, ("-fecha_hora", "-id"))
+
+
+# 🔎 Buscar texto en la acción y la descripción (?q=, además de los filtros del listado)
+@api_view(["GET"])
+def buscar_bitacoras(request):
+    texto = request.query_params.get("q", "").strip()
+    if not texto:
+        return Response({"error": "Debe indicar el texto a buscar en el parámetro q"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        bitacoras = filtrar_bitacoras(Bitacora.objects.all(), request.query_params)
+    except ValueError as e:
+        return Response({"error": f"Fecha inválida: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if connection.vendor == "postgresql":
+        # Índice GIN sobre la columna generada `busqueda`; admite "frases", OR y -exclusión
+        consulta = SearchQuery(texto, config="spanish", search_type="websearch")
+        bitacoras = bitacoras.alias(busqueda=vector_busqueda()).filter(busqueda=consulta).annotate(
+            relevancia=SearchRank(F("busqueda"), consulta)
+        ).order_by("-relevancia", "-fecha_hora", "-id")
+    else:
+        # Otras BD (p. ej. SQLite en desarrollo): coincidencia por subcadena, sin ranking
+        bitacoras = bitacoras.filter(
+            Q(accion__icontains=texto) | Q(descripcion__icontains=texto)
+        ).annotate(
+            relevancia=Value(0.0, output_field=FloatField())
+        ).order_by("-fecha_hora", "-id")
+
+    paginador = PaginacionPorPagina()
+    pagina = paginador.paginate_queryset(bitacoras, request)
+    return paginador.get_paginated_response(serializerBusquedaBitacora(pagina, many=True).data)
+
+
+# 📤 Exportar la bitácora como stream (?formato=ndjson|csv, mismos filtros que el listado)
+@api_view(["GET"])
+def exportar_bitacoras(request):
+    formato = request.query_params.get("formato", "ndjson")
+    if formato not in FORMATOS_EXPORTACION:
+        return Response({"error": "Formato no soportado: use ndjson o csv"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        bitacoras = filtrar_bitacoras(Bitacora.objects.all(), request.query_params)
+    except ValueError as e:
+        return Response({"error": f"Fecha inválida: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    bitacoras = bitacoras.order_by("-fecha_hora", "-id")
+    columnas = {campo: campo for campo in ("id", "username", "ip", "fecha_hora", "accion", "descripcion")}
+    return respuesta_exportacion(bitacoras, columnas, formato, "bitacora")
 
 
 # 📝 Registrar una nueva bitácora
@@ -0,0 +1,529 @@
+"""
+Almacén de carritos activos
+
+Las acciones del carrito (Carrito/views.py), el checkout desde el carrito y los
+pagos pasan por almacen_carritos(), que según CARRITO_ALMACEN en settings es:
+
+- 'bd': cada cambio se escribe en carrito / carrito_item en el momento;
+- 'redis': los carritos en uso viven en Redis (un hash de producto → cantidad por
+  usuario) y los cambios son comandos atómicos de Redis (HINCRBY, HSET, HDEL),
+  sin tocar la BD. Cada usuario modificado queda en un conjunto de pendientes y un
+  hilo de cada proceso lo pasa a la BD cada INTERVALO_CARRITOS segundos, con un
+  bulk_create / bulk_update / DELETE por carrito;
+- 'memoria': lo mismo en la memoria del proceso (Carrito/redis_local.py). Solo
+  sirve con un proceso: con varios workers cada uno vería su propio carrito.
+
+Un carrito se carga desde la BD la primera vez que se usa y vence en Redis tras
+TTL_CARRITO sin cambios. Los ítems aún no guardados en la BD se muestran con
+id = -producto_id, que sigue valiendo como item_id después de guardarlos.
+Los datos de los productos se toman de una copia local de TTL_LOCAL_PRODUCTOS
+segundos: el stock mostrado puede tener ese retraso, y el checkout lo vuelve a
+validar con los productos bloqueados.
+
+Quien modifique carrito_item directamente debe llamar antes a persistir(usuario)
+y, al confirmar, a olvidar(usuario), para que el almacén lo vuelva a cargar.
+Con CARRITO_ASINCRONO=False cada cambio se guarda en la BD en el momento.
+"""
+
+import abc
+import atexit
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from nucleo.cache_local import CacheLocal
+from Producto.models import Producto
+from Usuarios.models import Usuario
+from .models import Carrito, CarritoItem
+from .precios import actualizar_totales
+from .redis_local import RedisEnMemoria
+
+
+# Segundos sin cambios tras los que un carrito se descarta de Redis (sigue en la BD)
+TTL_CARRITO = 24 * 60 * 60
+
+# Segundos entre cada paso de los carritos modificados a la BD
+INTERVALO_CARRITOS = 1.0
+
+# Segundos máximos que se espera a otro proceso que está cargando el mismo carrito
+ESPERA_CARGA = 2.0
+
+# Copia local de los productos que se muestran en los carritos
+TTL_LOCAL_PRODUCTOS = 5
+MAX_PRODUCTOS_LOCALES = 4096
+
+CLAVE_PENDIENTES = 'carritos:pendientes'
+
+
+class ExcedeStock(Exception):
+    """La cantidad resultante en el carrito supera el stock del producto"""
+
+    def __init__(self, disponible):
+        self.disponible = disponible
+        super().__init__(f'Stock insuficiente. Solo hay {disponible} unidades disponibles')
+
+
+class EstadoCarrito:
+    """
+    Contenido de un carrito: `items` es {producto_id: (item_id o None, cantidad)}
+    """
+
+    def __init__(self, carrito_id, username, fecha, items):
+        self.carrito_id = carrito_id
+        self.username = username
+        self.fecha = fecha
+        self.items = items
+
+
+_productos = CacheLocal(MAX_PRODUCTOS_LOCALES, TTL_LOCAL_PRODUCTOS)
+
+
+def productos_para_carrito(producto_ids):
+    """
+    {id: Producto} desde la copia local; los que faltan se leen con una consulta.
+    No se deben modificar
+    """
+    productos = {}
+    faltantes = []
+    for producto_id in producto_ids:
+        producto = _productos.get(producto_id)
+        if producto is None:
+            faltantes.append(producto_id)
+        else:
+            productos[producto_id] = producto
+    if faltantes:
+        for producto_id, producto in Producto.objects.in_bulk(faltantes).items():
+            _productos.set(producto_id, producto)
+            productos[producto_id] = producto
+    return productos
+
+
+def carritos_para_lectura():
+    """
+    Carritos con su usuario y sus ítems (con producto) cargados: CarritoSerializer
+    hace dos consultas por carrito sin importar cuántos ítems tenga
+    """
+    return Carrito.objects.select_related('usuario').prefetch_related(
+        Prefetch('items', queryset=CarritoItem.objects.select_related('producto').order_by('id'))
+    )
+
+
+def escribir_items(carrito_id, cantidades, completo=False):
+    """
+    Aplica {producto_id: cantidad} a los ítems de un carrito (0 quita el ítem) con
+    un DELETE, un bulk_update y un bulk_create como máximo, y actualiza sus
+    totales. Con `completo` los productos que no figuran también se quitan. Debe
+    llamarse dentro de una transacción. Retorna los ítems creados
+    """
+    filas = CarritoItem.objects.filter(carrito_id=carrito_id)
+    if not completo:
+        filas = filas.filter(producto_id__in=cantidades)
+    existentes = {
+        producto_id: (item_id, cantidad)
+        for item_id, producto_id, cantidad in filas.values_list('id', 'producto_id', 'cantidad')
+    }
+    faltantes = [producto_id for producto_id, cantidad in cantidades.items() if cantidad > 0 and producto_id not in existentes]
+    # Productos eliminados de la BD mientras estaban en el carrito
+    validos = set(Producto.objects.filter(id__in=faltantes).values_list('id', flat=True)) if faltantes else set()
+
+    borrar = [
+        item_id for producto_id, (item_id, _) in existentes.items() if cantidades.get(producto_id, 0) <= 0
+    ]
+    cambiar = [
+        CarritoItem(id=existentes[producto_id][0], cantidad=cantidad)
+        for producto_id, cantidad in cantidades.items()
+        if cantidad > 0 and producto_id in existentes and existentes[producto_id][1] != cantidad
+    ]
+    nuevos = [
+        CarritoItem(carrito_id=carrito_id, producto_id=producto_id, cantidad=cantidades[producto_id])
+        for producto_id in faltantes if producto_id in validos
+    ]
+    if borrar:
+        CarritoItem.objects.filter(id__in=borrar).delete()
+    if cambiar:
+        CarritoItem.objects.bulk_update(cambiar, ['cantidad'])
+    if nuevos:
+        CarritoItem.objects.bulk_create(nuevos)
+    if borrar or cambiar or nuevos:
+        actualizar_totales([carrito_id])
+    return nuevos
+
+
+class AlmacenCarritos(abc.ABC):
+    """
+    Operaciones sobre el carrito de un usuario. `agregar` con `maximo` lanza
+    ExcedeStock sin modificar nada si la cantidad resultante lo supera
+    """
+
+    @abc.abstractmethod
+    def estado(self, usuario_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def agregar(self, usuario_id, producto_id, cantidad, maximo=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fijar(self, usuario_id, producto_id, cantidad):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def quitar(self, usuario_id, producto_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def aplicar(self, usuario_id, cantidades):
+        """
+        Fija de una vez {producto_id: cantidad} en el carrito (0 quita el producto)
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def vaciar(self, usuario_id):
+        raise NotImplementedError
+
+    def persistir(self, usuario_id):
+        """Guarda en la BD los cambios pendientes del carrito"""
+
+    def olvidar(self, usuario_id):
+        """Descarta la copia del almacén; el carrito se vuelve a leer de la BD"""
+
+    def producto_de_item(self, usuario_id, item_id):
+        """
+        Producto del ítem `item_id` del carrito del usuario, o None si no está en él
+        """
+        estado = self.estado(usuario_id)
+        if item_id < 0:
+            return -item_id if -item_id in estado.items else None
+        return next((
+            producto_id for producto_id, (id_guardado, _) in estado.items.items() if id_guardado == item_id
+        ), None)
+
+    def foto(self, usuario_id):
+        """
+        Carrito (sin guardar) listo para CarritoSerializer, con sus ítems en
+        `items_cargados`
+        """
+        estado = self.estado(usuario_id)
+        productos = productos_para_carrito(estado.items)
+        carrito = Carrito(id=estado.carrito_id, usuario_id=usuario_id, fecha_actualizacion=estado.fecha)
+        carrito.usuario = Usuario(id=usuario_id, username=estado.username)
+        orden = sorted(estado.items.items(), key=lambda par: (par[1][0] is None, par[1][0] or 0, par[0]))
+        carrito.items_cargados = [
+            CarritoItem(
+                id=item_id or -producto_id, carrito_id=estado.carrito_id,
+                producto=productos[producto_id], cantidad=cantidad
+            )
+            for producto_id, (item_id, cantidad) in orden if producto_id in productos
+        ]
+        return carrito
+
+
+class AlmacenBD(AlmacenCarritos):
+    """Sin almacén intermedio: cada operación se aplica a la BD"""
+
+    def estado(self, usuario_id):
+        carrito, _ = Carrito.objects.select_related('usuario').get_or_create(usuario_id=usuario_id)
+        filas = CarritoItem.objects.filter(carrito=carrito).values_list('id', 'producto_id', 'cantidad')
+        return EstadoCarrito(
+            carrito.id, carrito.usuario.username, carrito.fecha_actualizacion,
+            {producto_id: (item_id, cantidad) for item_id, producto_id, cantidad in filas}
+        )
+
+    def foto(self, usuario_id):
+        carrito, _ = carritos_para_lectura().get_or_create(usuario_id=usuario_id)
+        carrito.items_cargados = list(carrito.items.all())
+        return carrito
+
+    def producto_de_item(self, usuario_id, item_id):
+        items = CarritoItem.objects.filter(carrito__usuario_id=usuario_id)
+        if item_id < 0:
+            items = items.filter(producto_id=-item_id)
+        else:
+            items = items.filter(id=item_id)
+        return items.values_list('producto_id', flat=True).first()
+
+    @transaction.atomic
+    def agregar(self, usuario_id, producto_id, cantidad, maximo=None):
+        carrito, _ = Carrito.objects.get_or_create(usuario_id=usuario_id)
+        item, creado = CarritoItem.objects.get_or_create(
+            carrito=carrito, producto_id=producto_id, defaults={'cantidad': cantidad}
+        )
+        if not creado:
+            if maximo is not None and item.cantidad + cantidad > maximo:
+                raise ExcedeStock(maximo)
+            item.cantidad += cantidad
+            item.save(update_fields=['cantidad'])
+        actualizar_totales([carrito.id])
+        return item.cantidad
+
+    @transaction.atomic
+    def fijar(self, usuario_id, producto_id, cantidad):
+        CarritoItem.objects.filter(carrito__usuario_id=usuario_id, producto_id=producto_id).update(cantidad=cantidad)
+        actualizar_totales(Carrito.objects.filter(usuario_id=usuario_id).values('pk'))
+
+    @transaction.atomic
+    def quitar(self, usuario_id, producto_id):
+        borrados, _ = CarritoItem.objects.filter(carrito__usuario_id=usuario_id, producto_id=producto_id).delete()
+        actualizar_totales(Carrito.objects.filter(usuario_id=usuario_id).values('pk'))
+        return bool(borrados)
+
+    @transaction.atomic
+    def aplicar(self, usuario_id, cantidades):
+        carrito, _ = Carrito.objects.get_or_create(usuario_id=usuario_id)
+        escribir_items(carrito.id, cantidades)
+
+    @transaction.atomic
+    def vaciar(self, usuario_id):
+        CarritoItem.objects.filter(carrito__usuario_id=usuario_id).delete()
+        actualizar_totales(Carrito.objects.filter(usuario_id=usuario_id).values('pk'))
+
+
+class AlmacenRedis(AlmacenCarritos):
+    """
+    Carritos en Redis (o en RedisEnMemoria) con escritura diferida a la BD.
+    `cliente` debe devolver str (redis-py con decode_responses=True)
+    """
+
+    def __init__(self, cliente, intervalo=INTERVALO_CARRITOS):
+        self.cliente = cliente
+        self.escritor = EscritorCarritos(self, intervalo)
+
+    def _claves(self, usuario_id):
+        base = f'carrito:{usuario_id}'
+        return f'{base}:items', f'{base}:ids', f'{base}:meta'
+
+    def _cargar(self, usuario_id):
+        items, ids, meta = self._claves(usuario_id)
+        if self.cliente.exists(meta):
+            return
+        # Un solo proceso carga el carrito; los demás esperan a que termine
+        candado = f'carrito:{usuario_id}:carga'
+        limite = time.monotonic() + ESPERA_CARGA
+        while not self.cliente.set(candado, os.getpid(), nx=True, ex=10):
+            if self.cliente.exists(meta):
+                return
+            if time.monotonic() > limite:
+                break
+            time.sleep(0.005)
+        try:
+            if self.cliente.exists(meta):
+                return
+            carrito, _ = Carrito.objects.select_related('usuario').get_or_create(usuario_id=usuario_id)
+            filas = list(CarritoItem.objects.filter(carrito=carrito).values_list('id', 'producto_id', 'cantidad'))
+            with self.cliente.pipeline() as pipe:
+                pipe.delete(items, ids)
+                if filas:
+                    pipe.hset(items, mapping={producto_id: cantidad for _, producto_id, cantidad in filas})
+                    pipe.hset(ids, mapping={producto_id: item_id for item_id, producto_id, _ in filas})
+                # meta al final: su existencia indica que el carrito está completo
+                pipe.hset(meta, mapping={
+                    'carrito_id': carrito.id,
+                    'username': carrito.usuario.username,
+                    'fecha': carrito.fecha_actualizacion.isoformat(),
+                })
+                for clave in (items, ids, meta):
+                    pipe.expire(clave, TTL_CARRITO)
+                pipe.execute()
+        finally:
+            self.cliente.delete(candado)
+
+    def _modificado(self, usuario_id):
+        items, ids, meta = self._claves(usuario_id)
+        with self.cliente.pipeline() as pipe:
+            pipe.hset(meta, 'fecha', timezone.now().isoformat())
+            pipe.sadd(CLAVE_PENDIENTES, usuario_id)
+            for clave in (items, ids, meta):
+                pipe.expire(clave, TTL_CARRITO)
+            pipe.execute()
+        if getattr(settings, 'CARRITO_ASINCRONO', True):
+            self.escritor.iniciar()
+        else:
+            self.escritor.vaciar()
+
+    def estado(self, usuario_id):
+        items, ids, meta = self._claves(usuario_id)
+        for _ in range(2):
+            self._cargar(usuario_id)
+            with self.cliente.pipeline() as pipe:
+                pipe.hgetall(items)
+                pipe.hgetall(ids)
+                pipe.hgetall(meta)
+                cantidades, guardados, datos = pipe.execute()
+            if datos:
+                break
+        return EstadoCarrito(
+            int(datos['carrito_id']), datos['username'], parse_datetime(datos['fecha']),
+            {
+                int(producto_id): (int(guardados[producto_id]) if producto_id in guardados else None, int(cantidad))
+                for producto_id, cantidad in cantidades.items() if int(cantidad) > 0
+            }
+        )
+
+    def agregar(self, usuario_id, producto_id, cantidad, maximo=None):
+        self._cargar(usuario_id)
+        items, _, _ = self._claves(usuario_id)
+        nueva = int(self.cliente.hincrby(items, producto_id, cantidad))
+        if maximo is not None and nueva > maximo:
+            if int(self.cliente.hincrby(items, producto_id, -cantidad)) <= 0:
+                self.cliente.hdel(items, producto_id)
+            raise ExcedeStock(maximo)
+        self._modificado(usuario_id)
+        return nueva
+
+    def fijar(self, usuario_id, producto_id, cantidad):
+        self._cargar(usuario_id)
+        items, _, _ = self._claves(usuario_id)
+        self.cliente.hset(items, producto_id, cantidad)
+        self._modificado(usuario_id)
+
+    def quitar(self, usuario_id, producto_id):
+        self._cargar(usuario_id)
+        items, ids, _ = self._claves(usuario_id)
+        with self.cliente.pipeline() as pipe:
+            pipe.hdel(items, producto_id)
+            pipe.hdel(ids, producto_id)
+            borrados, _ = pipe.execute()
+        if borrados:
+            self._modificado(usuario_id)
+        return bool(borrados)
+
+    def aplicar(self, usuario_id, cantidades):
+        self._cargar(usuario_id)
+        items, ids, _ = self._claves(usuario_id)
+        fijar = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad > 0}
+        quitar = [producto_id for producto_id, cantidad in cantidades.items() if cantidad <= 0]
+        with self.cliente.pipeline() as pipe:
+            if fijar:
+                pipe.hset(items, mapping=fijar)
+            if quitar:
+                pipe.hdel(items, *quitar)
+                pipe.hdel(ids, *quitar)
+            pipe.execute()
+        self._modificado(usuario_id)
+
+    def vaciar(self, usuario_id):
+        self._cargar(usuario_id)
+        items, ids, _ = self._claves(usuario_id)
+        self.cliente.delete(items, ids)
+        self._modificado(usuario_id)
+
+    def olvidar(self, usuario_id):
+        self.cliente.delete(*self._claves(usuario_id))
+
+    def persistir(self, usuario_id):
+        items, ids, meta = self._claves(usuario_id)
+        with self.cliente.pipeline() as pipe:
+            pipe.hgetall(items)
+            pipe.hgetall(meta)
+            cantidades, datos = pipe.execute()
+        if not datos:
+            # No está en el almacén: la BD ya tiene la última versión
+            return
+        carrito_id = int(datos['carrito_id'])
+        cantidades = {int(producto_id): int(cantidad) for producto_id, cantidad in cantidades.items() if int(cantidad) > 0}
+
+        with transaction.atomic():
+            if not Carrito.objects.select_for_update().filter(pk=carrito_id).exists():
+                return
+            nuevos = escribir_items(carrito_id, cantidades, completo=True)
+            if nuevos:
+                # Los ids de la BD se muestran desde ahora (el id negativo sigue valiendo)
+                transaction.on_commit(lambda: self.cliente.hset(
+                    ids, mapping={item.producto_id: item.id for item in nuevos}
+                ))
+
+
+class EscritorCarritos:
+    """
+    Hilo que pasa a la BD los carritos pendientes de un AlmacenRedis. Se crea en
+    el proceso que modifica carritos (fork-safe, como Bitacora/escritor.py) y al
+    terminar el proceso guarda lo que quede
+    """
+
+    def __init__(self, almacen, intervalo):
+        self.almacen = almacen
+        self.intervalo = intervalo
+        self._candado = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+
+    def iniciar(self):
+        if self._pid == os.getpid():
+            return
+        with self._candado:
+            if self._pid == os.getpid():
+                return
+            self._detener = threading.Event()
+            self._hilo = threading.Thread(target=self._trabajar, name='escritor-carritos', daemon=True)
+            self._hilo.start()
+            self._pid = os.getpid()
+
+    def vaciar(self):
+        """
+        Guarda todos los carritos pendientes desde el hilo que llama. Retorna cuántos guardó
+        """
+        guardados = 0
+        while True:
+            usuario_id = self.almacen.cliente.spop(CLAVE_PENDIENTES)
+            if usuario_id is None:
+                return guardados
+            try:
+                self.almacen.persistir(int(usuario_id))
+                guardados += 1
+            except Exception as e:
+                # Se reintenta en la siguiente pasada
+                print(f"Error guardando el carrito del usuario {usuario_id}: {e}")
+                self.almacen.cliente.sadd(CLAVE_PENDIENTES, usuario_id)
+                return guardados
+
+    def detener(self, espera=5):
+        if self._pid == os.getpid() and self._hilo.is_alive():
+            self._detener.set()
+            self._hilo.join(espera)
+        if self._pid is not None:
+            self.vaciar()
+
+    def _trabajar(self):
+        while not self._detener.wait(self.intervalo):
+            close_old_connections()
+            self.vaciar()
+
+
+_almacenes = {}
+_candado_almacenes = threading.Lock()
+
+
+def _crear_almacen(nombre):
+    if nombre == 'bd':
+        return AlmacenBD()
+    if nombre == 'memoria':
+        almacen = AlmacenRedis(RedisEnMemoria())
+    elif nombre == 'redis':
+        # Dependencia opcional: solo se necesita con este almacén
+        import redis
+        almacen = AlmacenRedis(redis.Redis.from_url(settings.REDIS_URL, decode_responses=True))
+    else:
+        raise ImproperlyConfigured(f"CARRITO_ALMACEN inválido: {nombre!r} (use 'bd', 'memoria' o 'redis')")
+    atexit.register(almacen.escritor.detener)
+    return almacen
+
+
+def almacen_carritos():
+    """
+    Almacén configurado en CARRITO_ALMACEN (uno por proceso)
+    """
+    nombre = getattr(settings, 'CARRITO_ALMACEN', 'bd')
+    almacen = _almacenes.get(nombre)
+    if almacen is None:
+        with _candado_almacenes:
+            almacen = _almacenes.get(nombre)
+            if almacen is None:
+                almacen = _almacenes[nombre] = _crear_almacen(nombre)
+    return almacen
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CarritoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Carrito'
+
+    def ready(self):
+        # Totales de los carritos al cambiar el precio de un producto
+        from . import signals  # noqa: F401
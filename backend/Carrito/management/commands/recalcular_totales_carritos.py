@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from Carrito.models import Carrito
+from Carrito.precios import actualizar_totales
+
+
+class Command(BaseCommand):
+    help = "Recalcula los totales guardados de todos los carritos (p. ej. tras agregar las columnas)"
+
+    def handle(self, *args, **options):
+        actualizar_totales(Carrito.objects.values('pk'))
+        self.stdout.write(self.style.SUCCESS(f"Totales recalculados en {Carrito.objects.count()} carritos"))
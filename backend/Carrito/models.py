@@ -5,6 +5,9 @@ from Producto.models import Producto
 class Carrito(models.Model):
     usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='carrito')
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # Totales guardados (ver Carrito/precios.py): suma de cantidad × precio y de cantidades
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_items = models.PositiveIntegerField(default=0)
     
     class Meta:
         db_table = 'carrito'
@@ -13,8 +16,8 @@ class Carrito(models.Model):
         return f"Carrito de {self.usuario.username}"
     
     def total(self):
-        """Calcula el total del carrito"""
-        return sum(item.subtotal() for item in self.items.all())
+        """Calcula el total del carrito (sin IGV) a partir de sus ítems"""
+        return sum(item.cantidad * item.producto.precio for item in self.items.select_related('producto'))
 
 
 class CarritoItem(models.Model):
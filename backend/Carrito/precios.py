@@ -0,0 +1,79 @@
+"""
+Totales del carrito
+
+calcular_totales recorre una sola vez los ítems (con su producto ya cargado) y
+devuelve subtotal, IGV, total y sus equivalentes en bolivianos; CarritoSerializer
+lo usa en lugar de recalcular el carrito en cada campo.
+
+Carrito.subtotal y Carrito.total_items guardan además los totales ya calculados,
+para listados y pagos que no necesitan los ítems. Se actualizan con
+actualizar_totales, un solo UPDATE con la suma de los ítems, que quien modifique
+los ítems de un carrito debe llamar dentro de la misma transacción (no hay señales
+sobre CarritoItem: harían más lentos los borrados en cascada). Al guardar un
+producto, Carrito/signals.py actualiza los carritos que lo contienen.
+"""
+
+from decimal import Decimal
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Carrito, CarritoItem
+
+
+# Tipo de cambio USD a BOB (Bolivianos)
+TIPO_CAMBIO_USD_BOB = Decimal("6.96")
+
+IGV = Decimal("0.18")
+
+
+def totales_desde_subtotal(subtotal, total_items):
+    """
+    Totales del carrito a partir del subtotal en USD, con los mismos tipos que la API
+    """
+    igv = subtotal * IGV
+    total = subtotal + igv
+    return {
+        'total_items': total_items,
+        'subtotal': subtotal,
+        'subtotal_bs': float(subtotal * TIPO_CAMBIO_USD_BOB),
+        'igv': igv,
+        'igv_bs': float(igv * TIPO_CAMBIO_USD_BOB),
+        'total': total,
+        'total_bs': float(total * TIPO_CAMBIO_USD_BOB),
+    }
+
+
+def calcular_totales(items):
+    """
+    Totales de una lista de CarritoItem en una sola pasada. Usa item.producto:
+    conviene pasarlos con select_related('producto')
+    """
+    subtotal = 0
+    total_items = 0
+    for item in items:
+        subtotal += item.cantidad * item.producto.precio
+        total_items += item.cantidad
+    return totales_desde_subtotal(subtotal, total_items)
+
+
+def actualizar_totales(carrito_ids):
+    """
+    Recalcula Carrito.subtotal y Carrito.total_items de los carritos indicados
+    (lista de ids o queryset de ids) con un único UPDATE
+    """
+    if isinstance(carrito_ids, (list, tuple, set)) and not carrito_ids:
+        return
+    sumas = CarritoItem.objects.filter(carrito=OuterRef('pk')).order_by().values('carrito')
+    Carrito.objects.filter(pk__in=carrito_ids).update(
+        subtotal=Coalesce(
+            Subquery(sumas.annotate(
+                suma=Sum(F('cantidad') * F('producto__precio'), output_field=DecimalField(max_digits=12, decimal_places=2))
+            ).values('suma')),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+        total_items=Coalesce(
+            Subquery(sumas.annotate(suma=Sum('cantidad')).values('suma')),
+            Value(0),
+            output_field=IntegerField()
+        ),
+    )
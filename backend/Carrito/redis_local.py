@@ -0,0 +1,152 @@
+"""
+Sustituto en memoria de Redis para el almacén de carritos
+
+Implementa solo los comandos que usa Carrito/almacen.py, con las mismas
+respuestas que redis-py con decode_responses=True (claves y valores str). Sirve
+para CARRITO_ALMACEN='memoria' (un solo proceso) y para probar el almacén de
+Redis sin un servidor.
+"""
+
+import threading
+import time
+
+
+class RedisEnMemoria:
+    def __init__(self):
+        self._datos = {}
+        self._vence = {}
+        self._candado = threading.RLock()
+
+    def _vigente(self, clave):
+        vence = self._vence.get(clave)
+        if vence is not None and vence < time.monotonic():
+            self._datos.pop(clave, None)
+            self._vence.pop(clave, None)
+        return self._datos.get(clave)
+
+    def _hash(self, clave):
+        valor = self._vigente(clave)
+        if valor is None:
+            valor = self._datos[clave] = {}
+        return valor
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def exists(self, *claves):
+        with self._candado:
+            return sum(1 for clave in claves if self._vigente(clave) is not None)
+
+    def delete(self, *claves):
+        with self._candado:
+            borradas = 0
+            for clave in claves:
+                borradas += self._vigente(clave) is not None
+                self._datos.pop(clave, None)
+                self._vence.pop(clave, None)
+            return borradas
+
+    def expire(self, clave, segundos):
+        with self._candado:
+            if self._vigente(clave) is None:
+                return False
+            self._vence[clave] = time.monotonic() + segundos
+            return True
+
+    def set(self, clave, valor, nx=False, ex=None):
+        with self._candado:
+            if nx and self._vigente(clave) is not None:
+                return None
+            self._datos[clave] = str(valor)
+            self._vence.pop(clave, None)
+            if ex:
+                self._vence[clave] = time.monotonic() + ex
+            return True
+
+    def get(self, clave):
+        with self._candado:
+            return self._vigente(clave)
+
+    def hget(self, clave, campo):
+        with self._candado:
+            return (self._vigente(clave) or {}).get(str(campo))
+
+    def hgetall(self, clave):
+        with self._candado:
+            return dict(self._vigente(clave) or {})
+
+    def hset(self, clave, campo=None, valor=None, mapping=None):
+        with self._candado:
+            datos = self._hash(clave)
+            pares = dict(mapping or {})
+            if campo is not None:
+                pares[campo] = valor
+            nuevos = 0
+            for campo, valor in pares.items():
+                nuevos += str(campo) not in datos
+                datos[str(campo)] = str(valor)
+            return nuevos
+
+    def hincrby(self, clave, campo, cantidad=1):
+        with self._candado:
+            datos = self._hash(clave)
+            valor = int(datos.get(str(campo), 0)) + cantidad
+            datos[str(campo)] = str(valor)
+            return valor
+
+    def hdel(self, clave, *campos):
+        with self._candado:
+            datos = self._vigente(clave)
+            if datos is None:
+                return 0
+            borrados = 0
+            for campo in campos:
+                borrados += datos.pop(str(campo), None) is not None
+            if not datos:
+                self.delete(clave)
+            return borrados
+
+    def sadd(self, clave, *miembros):
+        with self._candado:
+            conjunto = self._vigente(clave)
+            if conjunto is None:
+                conjunto = self._datos[clave] = set()
+            antes = len(conjunto)
+            conjunto.update(str(miembro) for miembro in miembros)
+            return len(conjunto) - antes
+
+    def spop(self, clave):
+        with self._candado:
+            conjunto = self._vigente(clave)
+            if not conjunto:
+                return None
+            miembro = conjunto.pop()
+            if not conjunto:
+                self.delete(clave)
+            return miembro
+
+
+class _Pipeline:
+    """Encola comandos y los ejecuta juntos, sin que otro hilo se intercale (como MULTI/EXEC)"""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._comandos = []
+
+    def __getattr__(self, nombre):
+        def encolar(*args, **kwargs):
+            self._comandos.append((nombre, args, kwargs))
+            return self
+        return encolar
+
+    def execute(self):
+        with self._redis._candado:
+            resultados = [getattr(self._redis, nombre)(*args, **kwargs) for nombre, args, kwargs in self._comandos]
+        self._comandos = []
+        return resultados
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._comandos = []
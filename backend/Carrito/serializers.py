@@ -2,9 +2,7 @@ from rest_framework import serializers
 from .models import Carrito, CarritoItem
 from Producto.models import Producto
 from decimal import Decimal
-
-# Tipo de cambio USD a BOB (Bolivianos)
-TIPO_CAMBIO_USD_BOB = Decimal("6.96")
+from .precios import TIPO_CAMBIO_USD_BOB, calcular_totales
 
 class CarritoItemSerializer(serializers.ModelSerializer):
     producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
@@ -35,7 +33,7 @@ class CarritoItemSerializer(serializers.ModelSerializer):
 
 
 class CarritoSerializer(serializers.ModelSerializer):
-    items = CarritoItemSerializer(many=True, read_only=True)
+    items = serializers.SerializerMethodField()
     total = serializers.SerializerMethodField()
     total_bs = serializers.SerializerMethodField()
     subtotal = serializers.SerializerMethodField()
@@ -56,32 +54,71 @@ class CarritoSerializer(serializers.ModelSerializer):
     def get_tipo_cambio(self, obj):
         return float(TIPO_CAMBIO_USD_BOB)
     
+    def _items(self, obj):
+        # Los carritos del almacén (Carrito/almacen.py) traen sus ítems ya armados
+        items = getattr(obj, 'items_cargados', None)
+        return obj.items.all() if items is None else items
+    
+    def get_items(self, obj):
+        return CarritoItemSerializer(self._items(obj), many=True).data
+    
+    def _totales(self, obj):
+        # Todos los totales salen de una sola pasada por los ítems (ver Carrito/precios.py)
+        totales = getattr(obj, '_totales', None)
+        if totales is None:
+            totales = obj._totales = calcular_totales(self._items(obj))
+        return totales
+    
     def get_total_items(self, obj):
-        return sum(item.cantidad for item in obj.items.all())
+        return self._totales(obj)['total_items']
     
     def get_subtotal(self, obj):
-        return obj.total()
+        return self._totales(obj)['subtotal']
     
     def get_subtotal_bs(self, obj):
-        subtotal_usd = obj.total()
-        return float(subtotal_usd * TIPO_CAMBIO_USD_BOB)
+        return self._totales(obj)['subtotal_bs']
     
     def get_igv(self, obj):
-        return obj.total() * Decimal("0.18")
+        return self._totales(obj)['igv']
     
     def get_igv_bs(self, obj):
-        igv_usd = obj.total() * Decimal("0.18")
-        return float(igv_usd * TIPO_CAMBIO_USD_BOB)
+        return self._totales(obj)['igv_bs']
     
     def get_total(self, obj):
-        subtotal = obj.total()
-        return subtotal + (subtotal * Decimal("0.18"))
+        return self._totales(obj)['total']
     
     def get_total_bs(self, obj):
-        total_usd = self.get_total(obj)
-        return float(total_usd * TIPO_CAMBIO_USD_BOB)
+        return self._totales(obj)['total_bs']
 
 
 class AgregarItemSerializer(serializers.Serializer):
     producto_id = serializers.IntegerField()
     cantidad = serializers.IntegerField(min_value=1)
+
+
+class OperacionCarritoSerializer(serializers.Serializer):
+    """
+    Una operación de /api/carritos/aplicar_cambios/. El ítem se indica con
+    producto_id o con item_id (como lo devuelve el carrito)
+    """
+    accion = serializers.ChoiceField(choices=['agregar', 'actualizar', 'eliminar', 'vaciar'])
+    producto_id = serializers.IntegerField(required=False)
+    item_id = serializers.IntegerField(required=False)
+    cantidad = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate(self, data):
+        accion = data['accion']
+        if accion in ('agregar', 'actualizar', 'eliminar') and 'producto_id' not in data and 'item_id' not in data:
+            raise serializers.ValidationError('producto_id o item_id requerido')
+        if accion == 'agregar' and 'producto_id' not in data:
+            raise serializers.ValidationError('producto_id requerido')
+        if accion == 'actualizar' and 'cantidad' not in data:
+            raise serializers.ValidationError('cantidad requerida')
+        return data
+
+
+class AplicarCambiosSerializer(serializers.Serializer):
+    usuario_id = serializers.IntegerField(default=1)
+    operaciones = OperacionCarritoSerializer(many=True, allow_empty=False, max_length=500)
+    # Con delta=True solo se devuelven los ítems modificados y los totales
+    delta = serializers.BooleanField(default=False)
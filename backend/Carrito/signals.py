@@ -0,0 +1,18 @@
+"""
+Mantiene los totales guardados en Carrito (ver Carrito/precios.py) cuando cambia
+el precio de un producto que está en algún carrito.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from Producto.models import Producto
+from .models import CarritoItem
+from .precios import actualizar_totales
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_carritos_del_producto(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'precio' not in update_fields):
+        return
+    # Un solo UPDATE con los carritos como subconsulta
+    actualizar_totales(CarritoItem.objects.filter(producto_id=instance.pk).values('carrito_id'))
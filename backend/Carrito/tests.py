@@ -1,3 +1,214 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from Producto.models import Producto
+from Usuarios import autenticacion
+from Usuarios.jwt_utils import generate_token
+from Usuarios.models import Usuario
+from . import almacen
+from .almacen import AlmacenRedis, ExcedeStock
+from .models import Carrito, CarritoItem
+from .redis_local import RedisEnMemoria
 
-# Create your tests here.
+
+class CarritoConsultasTest(TestCase):
+    """
+    Cada acción del carrito hace una cantidad fija de consultas, sin importar
+    cuántos ítems tenga, y deja los totales guardados al día. Dentro de TestCase
+    cada transaction.atomic() suma un SAVEPOINT y su RELEASE
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(username='admin', correo='admin@test.com', password='clave', tipo_usuario='admin')
+        token = f'Bearer {generate_token(self.usuario)}'
+        autenticacion._local.clear()
+        autenticacion.autenticar(token)  # Versión de sesión ya cacheada: no suma consultas
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=token)
+        almacen._productos.clear()  # Los ids de productos se repiten entre tests
+
+        self.productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', precio='2.50', stock=50) for i in range(6)
+        ])
+        self.carrito = Carrito.objects.create(usuario=self.usuario)
+        CarritoItem.objects.bulk_create([
+            CarritoItem(carrito=self.carrito, producto=producto, cantidad=2) for producto in self.productos[:5]
+        ])
+
+    def post(self, accion, datos):
+        respuesta = self.api.post(f'/api/carritos/{accion}/', {'usuario_id': self.usuario.id, **datos}, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return respuesta.data['carrito']
+
+    def assertTotalesGuardados(self, datos):
+        self.carrito.refresh_from_db()
+        self.assertEqual(self.carrito.subtotal, Decimal(str(datos['subtotal'])))
+        self.assertEqual(self.carrito.total_items, datos['total_items'])
+
+    def test_mi_carrito(self):
+        with self.assertNumQueries(2):
+            datos = self.api.get('/api/carritos/mi_carrito/', {'usuario_id': self.usuario.id}).data
+        self.assertEqual(len(datos['items']), 5)
+        self.assertEqual(datos['total_items'], 10)
+        self.assertEqual(datos['subtotal'], Decimal('25.00'))
+        self.assertEqual(datos['total'], Decimal('29.5000'))
+        self.assertAlmostEqual(datos['total_bs'], 205.32)
+
+    def test_agregar_item(self):
+        with self.assertNumQueries(17):
+            datos = self.post('agregar_item', {'producto_id': self.productos[5].id, 'cantidad': 3})
+        self.assertEqual(datos['total_items'], 13)
+        self.assertTotalesGuardados(datos)
+
+        with self.assertNumQueries(15):
+            datos = self.post('agregar_item', {'producto_id': self.productos[0].id, 'cantidad': 1})
+        self.assertEqual(datos['total_items'], 14)
+        self.assertTotalesGuardados(datos)
+
+    def test_actualizar_eliminar_y_vaciar(self):
+        item = CarritoItem.objects.filter(carrito=self.carrito).first()
+        with self.assertNumQueries(12):
+            datos = self.post('actualizar_cantidad', {'item_id': item.id, 'cantidad': 7})
+        self.assertEqual(datos['total_items'], 15)
+        self.assertTotalesGuardados(datos)
+
+        with self.assertNumQueries(8):
+            datos = self.post('eliminar_item', {'item_id': item.id})
+        self.assertEqual(datos['total_items'], 8)
+        self.assertTotalesGuardados(datos)
+
+        with self.assertNumQueries(7):
+            datos = self.post('vaciar', {})
+        self.assertEqual(datos['total_items'], 0)
+        self.assertTotalesGuardados(datos)
+
+    def test_aplicar_cambios(self):
+        primero = CarritoItem.objects.filter(carrito=self.carrito).order_by('id').first()
+        operaciones = [
+            {'accion': 'agregar', 'producto_id': self.productos[5].id, 'cantidad': 3},
+            {'accion': 'agregar', 'producto_id': self.productos[5].id},
+            {'accion': 'actualizar', 'item_id': primero.id, 'cantidad': 6},
+            {'accion': 'eliminar', 'producto_id': self.productos[1].id},
+        ]
+        with self.assertNumQueries(19):
+            datos = self.post('aplicar_cambios', {'operaciones': operaciones})
+        cantidades = {item['producto']: item['cantidad'] for item in datos['items']}
+        self.assertEqual(cantidades[self.productos[5].id], 4)
+        self.assertEqual(cantidades[self.productos[0].id], 6)
+        self.assertNotIn(self.productos[1].id, cantidades)
+        self.assertEqual(datos['total_items'], 16)
+        self.assertTotalesGuardados(datos)
+
+    def test_aplicar_cambios_todo_o_nada(self):
+        respuesta = self.api.post('/api/carritos/aplicar_cambios/', {'usuario_id': self.usuario.id, 'operaciones': [
+            {'accion': 'eliminar', 'producto_id': self.productos[0].id},
+            {'accion': 'actualizar', 'producto_id': self.productos[1].id, 'cantidad': 51},
+        ]}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data['producto_id'], self.productos[1].id)
+        self.assertEqual(CarritoItem.objects.filter(carrito=self.carrito).count(), 5)
+
+    def test_aplicar_cambios_delta(self):
+        primero = CarritoItem.objects.filter(carrito=self.carrito).order_by('id').first()
+        respuesta = self.api.post('/api/carritos/aplicar_cambios/', {'usuario_id': self.usuario.id, 'delta': True, 'operaciones': [
+            {'accion': 'eliminar', 'item_id': primero.id},
+            {'accion': 'actualizar', 'producto_id': self.productos[1].id, 'cantidad': 5},
+        ]}, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        delta = respuesta.data['delta']
+        self.assertEqual([(item['producto'], item['cantidad']) for item in delta['items']], [(self.productos[1].id, 5)])
+        self.assertEqual(delta['eliminados'], [primero.id])
+        self.assertEqual(delta['total_items'], 11)
+
+    def test_cambio_de_precio(self):
+        producto = self.productos[0]
+        producto.precio = Decimal('10.00')
+        producto.save()
+        self.carrito.refresh_from_db()
+        self.assertEqual(self.carrito.subtotal, Decimal('40.00'))
+
+
+class AlmacenRedisTest(TestCase):
+    """
+    Almacén de carritos sobre RedisEnMemoria: los cambios no tocan la BD hasta que
+    el escritor guarda los carritos pendientes
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(username='cliente', correo='cliente@test.com', password='clave')
+        self.productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', precio='2.50', stock=10) for i in range(3)
+        ])
+        self.carrito = Carrito.objects.create(usuario=self.usuario)
+        self.item = CarritoItem.objects.create(carrito=self.carrito, producto=self.productos[0], cantidad=2)
+        almacen._productos.clear()
+        self.almacen = AlmacenRedis(RedisEnMemoria())
+        self.almacen.escritor.iniciar = lambda: None  # Se guarda a mano con escritor.vaciar()
+
+    def cantidades_en_bd(self):
+        return dict(CarritoItem.objects.filter(carrito=self.carrito).values_list('producto_id', 'cantidad'))
+
+    def test_cambios_sin_consultas(self):
+        self.almacen.estado(self.usuario.id)  # Carga el carrito
+        almacen.productos_para_carrito([producto.id for producto in self.productos])
+        nuevo, otro = self.productos[1].id, self.productos[2].id
+        with self.assertNumQueries(0):
+            self.almacen.agregar(self.usuario.id, nuevo, 3)
+            self.almacen.agregar(self.usuario.id, otro, 1)
+            self.almacen.fijar(self.usuario.id, self.productos[0].id, 5)
+            self.almacen.quitar(self.usuario.id, otro)
+            foto = self.almacen.foto(self.usuario.id)
+        self.assertEqual([(item.id, item.cantidad) for item in foto.items_cargados], [(self.item.id, 5), (-nuevo, 3)])
+        self.assertEqual(self.cantidades_en_bd(), {self.productos[0].id: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.almacen.escritor.vaciar(), 1)
+        self.assertEqual(self.cantidades_en_bd(), {self.productos[0].id: 5, nuevo: 3})
+        self.carrito.refresh_from_db()
+        self.assertEqual((self.carrito.total_items, self.carrito.subtotal), (8, Decimal('20.00')))
+
+        # El ítem nuevo ya tiene id de la BD; el id negativo sigue valiendo
+        item_nuevo = CarritoItem.objects.get(carrito=self.carrito, producto_id=nuevo)
+        self.assertEqual(self.almacen.producto_de_item(self.usuario.id, item_nuevo.id), nuevo)
+        self.assertEqual(self.almacen.producto_de_item(self.usuario.id, -nuevo), nuevo)
+        self.assertEqual(self.almacen.escritor.vaciar(), 0)
+
+    def test_aplicar_en_un_paso(self):
+        self.almacen.estado(self.usuario.id)
+        with self.assertNumQueries(0):
+            self.almacen.aplicar(self.usuario.id, {self.productos[0].id: 0, self.productos[1].id: 2, self.productos[2].id: 1})
+        self.almacen.escritor.vaciar()
+        self.assertEqual(self.cantidades_en_bd(), {self.productos[1].id: 2, self.productos[2].id: 1})
+
+    def test_excede_stock(self):
+        with self.assertRaises(ExcedeStock):
+            self.almacen.agregar(self.usuario.id, self.productos[0].id, 9, maximo=10)
+        self.assertEqual(self.almacen.estado(self.usuario.id).items, {self.productos[0].id: (self.item.id, 2)})
+
+    def test_olvidar_vuelve_a_leer_la_bd(self):
+        self.almacen.vaciar(self.usuario.id)
+        self.almacen.escritor.vaciar()
+        self.assertEqual(self.cantidades_en_bd(), {})
+        CarritoItem.objects.create(carrito=self.carrito, producto=self.productos[1], cantidad=4)
+        self.almacen.olvidar(self.usuario.id)
+        self.assertEqual(self.almacen.estado(self.usuario.id).items[self.productos[1].id][1], 4)
+
+    @override_settings(CARRITO_ALMACEN='memoria', CARRITO_ASINCRONO=False)
+    def test_api_con_almacen_en_memoria(self):
+        almacen._almacenes.clear()
+        admin = Usuario.objects.create(username='admin', correo='admin@test.com', password='clave', tipo_usuario='admin')
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(admin)}')
+        respuesta = api.post('/api/carritos/agregar_item/', {
+            'usuario_id': self.usuario.id, 'producto_id': self.productos[1].id, 'cantidad': 2
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(respuesta.data['carrito']['total_items'], 4)
+        # Con CARRITO_ASINCRONO=False el cambio ya está en la BD
+        self.assertEqual(self.cantidades_en_bd(), {self.productos[0].id: 2, self.productos[1].id: 2})
+
+        respuesta = api.post('/api/carritos/eliminar_item/', {
+            'usuario_id': self.usuario.id, 'item_id': -self.productos[1].id
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(self.cantidades_en_bd(), {self.productos[0].id: 2})
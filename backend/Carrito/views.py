@@ -3,135 +3,222 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
 from .models import Carrito, CarritoItem
-from .serializers import CarritoSerializer, CarritoItemSerializer, AgregarItemSerializer
-from Producto.models import Producto
+from .serializers import CarritoSerializer, CarritoItemSerializer, AgregarItemSerializer, AplicarCambiosSerializer
+from .precios import actualizar_totales, calcular_totales
+from .almacen import almacen_carritos, carritos_para_lectura, productos_para_carrito
+from Producto.inventario import StockInsuficiente
+from Producto.reservas import liberar, reservar
+
+
+def respuesta_carrito(mensaje, usuario_id):
+    # El carrito se arma desde el almacén, con sus ítems y productos ya cargados
+    return Response({
+        'message': mensaje,
+        'carrito': CarritoSerializer(almacen_carritos().foto(usuario_id)).data
+    })
+
+
+def stock_insuficiente(disponible, **extra):
+    return Response({
+        'error': f'Stock insuficiente. Solo hay {disponible} unidades disponibles', **extra
+    }, status=status.HTTP_400_BAD_REQUEST)
+
 
 class CarritoViewSet(viewsets.ModelViewSet):
-    queryset = Carrito.objects.all()
+    queryset = carritos_para_lectura()
     serializer_class = CarritoSerializer
     
     @action(detail=False, methods=['get'])
     def mi_carrito(self, request):
         """Obtener carrito del usuario actual o por usuario_id"""
-        usuario_id = request.query_params.get('usuario_id', 1)  # Default usuario 1 para demo
+        usuario_id = int(request.query_params.get('usuario_id', 1))  # Default usuario 1 para demo
         
-        carrito, created = Carrito.objects.get_or_create(usuario_id=usuario_id)
-        serializer = self.get_serializer(carrito)
+        serializer = self.get_serializer(almacen_carritos().foto(usuario_id))
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def agregar_item(self, request):
         """Agregar item al carrito"""
-        usuario_id = request.data.get('usuario_id', 1)
+        usuario_id = int(request.data.get('usuario_id', 1))
         producto_id = request.data.get('producto_id')
         cantidad = request.data.get('cantidad', 1)
         
         if not producto_id:
             return Response({'error': 'producto_id requerido'}, status=status.HTTP_400_BAD_REQUEST)
         
+        producto = productos_para_carrito([int(producto_id)]).get(int(producto_id))
+        if producto is None or producto.estado != "Activo":
+            return Response({'error': 'Producto no encontrado o inactivo'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Reservar las unidades valida el stock descontando lo reservado por otros
+        almacen = almacen_carritos()
+        actual = almacen.estado(usuario_id).items.get(producto.id, (None, 0))[1]
         try:
-            producto = Producto.objects.get(id=producto_id, estado="Activo")
-            
-            # Verificar stock
-            if producto.stock < cantidad:
-                return Response({
-                    'error': f'Stock insuficiente. Solo hay {producto.stock} unidades disponibles'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            carrito, created = Carrito.objects.get_or_create(usuario_id=usuario_id)
-            
-            # Verificar si ya existe el item en el carrito
-            item, item_created = CarritoItem.objects.get_or_create(
-                carrito=carrito,
-                producto=producto,
-                defaults={'cantidad': cantidad}
-            )
-            
-            if not item_created:
-                nueva_cantidad = item.cantidad + cantidad
-                if producto.stock < nueva_cantidad:
-                    return Response({
-                        'error': f'Stock insuficiente. Solo hay {producto.stock} unidades disponibles'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                item.cantidad = nueva_cantidad
-                item.save()
-            
-            return Response({
-                'message': 'Producto agregado al carrito',
-                'carrito': CarritoSerializer(carrito).data
-            })
+            reservar(usuario_id, {producto.id: actual + cantidad})
+        except StockInsuficiente as e:
+            return stock_insuficiente(e.disponible)
         
-        except Producto.DoesNotExist:
-            return Response({'error': 'Producto no encontrado o inactivo'}, status=status.HTTP_404_NOT_FOUND)
+        almacen.agregar(usuario_id, producto.id, cantidad)
+        return respuesta_carrito('Producto agregado al carrito', usuario_id)
     
     @action(detail=False, methods=['post'])
     def actualizar_cantidad(self, request):
         """Actualizar cantidad de un item"""
-        usuario_id = request.data.get('usuario_id', 1)
+        usuario_id = int(request.data.get('usuario_id', 1))
         item_id = request.data.get('item_id')
         cantidad = request.data.get('cantidad')
         
         if not item_id or not cantidad:
             return Response({'error': 'item_id y cantidad requeridos'}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            carrito = Carrito.objects.get(usuario_id=usuario_id)
-            item = CarritoItem.objects.get(id=item_id, carrito=carrito)
-            
-            # Verificar stock
-            if item.producto.stock < cantidad:
-                return Response({
-                    'error': f'Stock insuficiente. Solo hay {item.producto.stock} unidades disponibles'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            item.cantidad = cantidad
-            item.save()
-            
-            return Response({
-                'message': 'Cantidad actualizada',
-                'carrito': CarritoSerializer(carrito).data
-            })
-        except (Carrito.DoesNotExist, CarritoItem.DoesNotExist):
+        almacen = almacen_carritos()
+        producto_id = almacen.producto_de_item(usuario_id, int(item_id))
+        producto = productos_para_carrito([producto_id]).get(producto_id) if producto_id else None
+        if producto is None:
             return Response({'error': 'Item no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            reservar(usuario_id, {producto_id: cantidad})
+        except StockInsuficiente as e:
+            return stock_insuficiente(e.disponible)
+        
+        almacen.fijar(usuario_id, producto_id, cantidad)
+        return respuesta_carrito('Cantidad actualizada', usuario_id)
     
     @action(detail=False, methods=['post'])
     def eliminar_item(self, request):
         """Eliminar item del carrito"""
-        usuario_id = request.data.get('usuario_id', 1)
+        usuario_id = int(request.data.get('usuario_id', 1))
         item_id = request.data.get('item_id')
         
         if not item_id:
             return Response({'error': 'item_id requerido'}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            carrito = Carrito.objects.get(usuario_id=usuario_id)
-            item = CarritoItem.objects.get(id=item_id, carrito=carrito)
-            item.delete()
-            
-            return Response({
-                'message': 'Item eliminado del carrito',
-                'carrito': CarritoSerializer(carrito).data
-            })
-        except (Carrito.DoesNotExist, CarritoItem.DoesNotExist):
+        almacen = almacen_carritos()
+        producto_id = almacen.producto_de_item(usuario_id, int(item_id))
+        if producto_id is None or not almacen.quitar(usuario_id, producto_id):
             return Response({'error': 'Item no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        liberar(usuario_id, [producto_id])
+        
+        return respuesta_carrito('Item eliminado del carrito', usuario_id)
     
     @action(detail=False, methods=['post'])
     def vaciar(self, request):
         """Vaciar carrito"""
-        usuario_id = request.data.get('usuario_id', 1)
+        usuario_id = int(request.data.get('usuario_id', 1))
         
-        try:
-            carrito = Carrito.objects.get(usuario_id=usuario_id)
-            carrito.items.all().delete()
+        almacen_carritos().vaciar(usuario_id)
+        liberar(usuario_id)
+        return respuesta_carrito('Carrito vaciado', usuario_id)
+    
+    @action(detail=False, methods=['post'])
+    def aplicar_cambios(self, request):
+        """
+        Aplicar una lista de operaciones sobre el carrito (sincronización del
+        cliente móvil). Se validan todas juntas y se aplican todas o ninguna
+        """
+        serializer = AplicarCambiosSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        datos = serializer.validated_data
+        usuario_id = datos['usuario_id']
+        almacen = almacen_carritos()
+        estado = almacen.estado(usuario_id)
+        
+        # Cantidades resultantes de aplicar las operaciones en orden
+        cantidades = {producto_id: cantidad for producto_id, (_, cantidad) in estado.items.items()}
+        por_item = {item_id: producto_id for producto_id, (item_id, _) in estado.items.items() if item_id}
+        tocados = set()
+        for indice, operacion in enumerate(datos['operaciones']):
+            accion = operacion['accion']
+            if accion == 'vaciar':
+                tocados.update(cantidades)
+                cantidades = {}
+                continue
+            producto_id = operacion.get('producto_id')
+            if producto_id is None:
+                item_id = operacion['item_id']
+                producto_id = -item_id if item_id < 0 else por_item.get(item_id)
+            if accion != 'agregar' and producto_id not in cantidades:
+                return Response({'error': 'Item no encontrado', 'operacion': indice}, status=status.HTTP_404_NOT_FOUND)
             
-            return Response({
-                'message': 'Carrito vaciado',
-                'carrito': CarritoSerializer(carrito).data
-            })
-        except Carrito.DoesNotExist:
-            return Response({'error': 'Carrito no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+            if accion == 'agregar':
+                cantidades[producto_id] = cantidades.get(producto_id, 0) + operacion.get('cantidad', 1)
+            elif accion == 'actualizar':
+                cantidades[producto_id] = operacion['cantidad']
+            else:
+                del cantidades[producto_id]
+            tocados.add(producto_id)
+        
+        productos = productos_para_carrito(tocados)
+        for producto_id in tocados:
+            producto = productos.get(producto_id)
+            if cantidades.get(producto_id) and (
+                    producto is None or (producto_id not in estado.items and producto.estado != "Activo")):
+                return Response({
+                    'error': 'Producto no encontrado o inactivo', 'producto_id': producto_id
+                }, status=status.HTTP_404_NOT_FOUND)
+        
+        if tocados:
+            cambios = {producto_id: cantidades.get(producto_id, 0) for producto_id in tocados}
+            # Las reservas validan el stock de todos los productos con una sola consulta
+            try:
+                reservar(usuario_id, cambios)
+            except StockInsuficiente as e:
+                return stock_insuficiente(e.disponible, producto_id=e.producto.id)
+            almacen.aplicar(usuario_id, cambios)
+        
+        if not datos['delta']:
+            return respuesta_carrito('Cambios aplicados', usuario_id)
+        
+        # Solo los ítems modificados, los eliminados (por id) y los totales
+        carrito = almacen.foto(usuario_id)
+        return Response({
+            'message': 'Cambios aplicados',
+            'delta': {
+                'items': CarritoItemSerializer(
+                    [item for item in carrito.items_cargados if item.producto_id in tocados], many=True
+                ).data,
+                'eliminados': [
+                    estado.items[producto_id][0] or -producto_id
+                    for producto_id in tocados if producto_id in estado.items and not cantidades.get(producto_id)
+                ],
+                **calcular_totales(carrito.items_cargados),
+            }
+        })
+
+
+def usuario_de_carrito(carrito_id):
+    return Carrito.objects.filter(pk=carrito_id).values_list('usuario_id', flat=True).first()
 
 
 class CarritoItemViewSet(viewsets.ModelViewSet):
-    queryset = CarritoItem.objects.all()
+    queryset = CarritoItem.objects.select_related('producto')
     serializer_class = CarritoItemSerializer
+    
+    # Cada cambio de ítems actualiza los totales guardados del carrito. Como se
+    # escribe directo en la BD, antes se guardan los cambios pendientes del almacén
+    # y al confirmar se descarta su copia (ver Carrito/almacen.py)
+    def _en_bd(self, carrito_ids, cambio):
+        almacen = almacen_carritos()
+        usuarios = {usuario_de_carrito(carrito_id) for carrito_id in carrito_ids} - {None}
+        for usuario_id in usuarios:
+            almacen.persistir(usuario_id)
+        with transaction.atomic():
+            cambio()
+            actualizar_totales(list(carrito_ids))
+            for usuario_id in usuarios:
+                transaction.on_commit(lambda usuario_id=usuario_id: almacen.olvidar(usuario_id))
+    
+    def perform_create(self, serializer):
+        carrito = serializer.validated_data['carrito']
+        self._en_bd({carrito.id}, serializer.save)
+    
+    def perform_update(self, serializer):
+        carritos = {serializer.instance.carrito_id}
+        if 'carrito' in serializer.validated_data:
+            carritos.add(serializer.validated_data['carrito'].id)
+        self._en_bd(carritos, serializer.save)
+    
+    def perform_destroy(self, instance):
+        self._en_bd({instance.carrito_id}, instance.delete)
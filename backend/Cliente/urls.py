@@ -5,6 +5,7 @@ urlpatterns = [
     # === CLIENTES ===
     path('', views.listar_clientes, name='listar-clientes'),
     path('todos/', views.listar_todos_clientes, name='listar-todos-clientes'),
+    path('exportar/', views.exportar_clientes, name='exportar-clientes'),
     path('crear/', views.crear_cliente, name='crear-cliente'),
     path('<int:pk>/', views.obtener_cliente, name='obtener-cliente'),
     path('<int:pk>/actualizar/', views.actualizar_cliente, name='actualizar-cliente'),
@@ -5,6 +5,8 @@ from .models import Cliente
 from .serializers import ClienteSerializer
 from Usuarios.decorators import jwt_required
 from Bitacora.utils import registrar_accion_bitacora
+from nucleo.paginacion import respuesta_paginada
+from nucleo.exportacion import FORMATOS_EXPORTACION, respuesta_exportacion
 
 from django.db.models import Q
 
@@ -30,8 +32,19 @@ def listar_clientes(request):
 @jwt_required
 def listar_todos_clientes(request):
     clientes = Cliente.objects.all()
-    serializer = ClienteSerializer(clientes, many=True)
-    return Response(serializer.data)
+    return respuesta_paginada(request, clientes, ClienteSerializer, ('-id',))
+
+
+# GET /api/clientes/exportar/ - Exportar todos los clientes como stream, ?formato=ndjson|csv (PROTEGIDA)
+@api_view(['GET'])
+@jwt_required
+def exportar_clientes(request):
+    formato = request.query_params.get('formato', 'ndjson')
+    if formato not in FORMATOS_EXPORTACION:
+        return Response({'error': 'Formato no soportado: use ndjson o csv'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    columnas = {campo: campo for campo in ClienteSerializer.Meta.fields}
+    return respuesta_exportacion(Cliente.objects.order_by('-id'), columnas, formato, 'clientes')
 
 
 # GET /api/clientes/{id}/ - Obtener cliente específico (PROTEGIDA)
@@ -3,13 +3,24 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
 import stripe
-from decimal import Decimal
-from Carrito.models import Carrito, CarritoItem
+from Carrito.almacen import almacen_carritos
+from Carrito.models import Carrito
+from Carrito.precios import TIPO_CAMBIO_USD_BOB, calcular_totales
+from Producto.inventario import StockInsuficiente
+from Producto.reservas import TTL_RESERVA_PAGO, liberar, reservar
 from Usuarios.decorators import jwt_required
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
+def reservar_para_pago(usuario_id, items):
+    """Extiende las reservas del carrito por lo que dura un pago (ver Producto/reservas.py)"""
+    reservar(
+        usuario_id, {item.producto_id: item.cantidad for item in items},
+        ttl=TTL_RESERVA_PAGO, origen='pago'
+    )
+
+
 @api_view(['POST'])
 @jwt_required
 def create_checkout_session(request):
@@ -19,18 +30,24 @@ def create_checkout_session(request):
     """
     try:
         # Usar usuario_id=1 por defecto para demo (igual que en el resto de la app)
-        usuario_id = request.data.get('usuario_id', 1)
+        usuario_id = int(request.data.get('usuario_id', 1))
         
-        # Obtener o crear el carrito del usuario
-        carrito, created = Carrito.objects.get_or_create(usuario_id=usuario_id)
+        # Carrito del usuario desde el almacén de carritos activos
+        carrito = almacen_carritos().foto(usuario_id)
         
-        items = CarritoItem.objects.filter(carrito=carrito)
-        if not items.exists():
+        items = carrito.items_cargados
+        if not items:
             return Response(
                 {'error': 'Tu carrito está vacío'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Mantener reservadas las unidades mientras dura la sesión de pago
+        try:
+            reservar_para_pago(usuario_id, items)
+        except StockInsuficiente as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         # Crear los line_items para Stripe
         line_items = []
         for item in items:
@@ -105,7 +122,8 @@ def verify_checkout_session(request):
             carrito = Carrito.objects.get(id=carrito_id)
             
             # Vaciar el carrito después del pago exitoso
-            CarritoItem.objects.filter(carrito=carrito).delete()
+            almacen_carritos().vaciar(carrito.usuario_id)
+            liberar(carrito.usuario_id)
             
             return Response({
                 'message': 'Pago confirmado exitosamente',
@@ -135,25 +153,29 @@ def create_payment_intent(request):
     """
     try:
         # Usar usuario_id=1 por defecto para demo
-        usuario_id = request.data.get('usuario_id', 1)
+        usuario_id = int(request.data.get('usuario_id', 1))
         
-        # Obtener o crear el carrito del usuario
-        carrito, created = Carrito.objects.get_or_create(usuario_id=usuario_id)
+        # Carrito del usuario desde el almacén de carritos activos: los totales
+        # guardados en la BD pueden ir detrás de los últimos cambios
+        carrito = almacen_carritos().foto(usuario_id)
+        totales = calcular_totales(carrito.items_cargados)
         
-        items = CarritoItem.objects.filter(carrito=carrito)
-        if not items.exists():
+        if not totales['total_items']:
             return Response(
                 {'error': 'Tu carrito está vacío'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Calcular el total en USD (del carrito)
-        subtotal = sum(Decimal(str(item.producto.precio)) * item.cantidad for item in items)
-        igv = subtotal * Decimal("0.18")
-        total_usd = subtotal + igv
+        try:
+            reservar_para_pago(usuario_id, carrito.items_cargados)
+        except StockInsuficiente as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Total en USD
+        total_usd = totales['total']
         
         # Convertir a Bolivianos (Bs) - Tipo de cambio aproximado: 1 USD = 6.96 Bs
-        tipo_cambio = Decimal("6.96")
+        tipo_cambio = TIPO_CAMBIO_USD_BOB
         total_bs = total_usd * tipo_cambio
         
         # Stripe requiere el monto en centavos (menor unidad de la moneda)
@@ -213,7 +235,8 @@ def confirm_payment(request):
             carrito = Carrito.objects.get(id=carrito_id)
             
             # Vaciar el carrito después del pago exitoso
-            CarritoItem.objects.filter(carrito=carrito).delete()
+            almacen_carritos().vaciar(carrito.usuario_id)
+            liberar(carrito.usuario_id)
             
             return Response({
                 'message': 'Pago confirmado exitosamente',
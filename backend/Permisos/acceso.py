@@ -0,0 +1,151 @@
+"""
+Control de acceso de la API según los permisos por módulo
+
+Cada ruta bajo /api/ pertenece a un módulo de PermisoModulo, y el método HTTP
+indica qué permiso del rol se necesita: GET/HEAD/OPTIONS puede_ver, POST
+puede_crear, PUT/PATCH puede_editar y DELETE puede_eliminar. Las vistas de función
+que usan POST o PUT para otra cosa (…/restaurar/, …/eliminar/) se corrigen por el
+último segmento de la ruta (ACCIONES).
+
+La tabla RUTAS_MODULOS se compila al importar en un dict por prefijo (uno o dos
+segmentos después de /api/), y los permisos del usuario se leen como máscaras de
+bits cacheadas (Permisos/cache.py): cada petición cuesta dos búsquedas en dicts y
+ninguna consulta mientras la caché esté caliente.
+
+Las rutas que no figuran en la tabla no se restringen. Los usuarios con
+tipo_usuario 'admin' (el usuario inicial de seed_initial_user no tiene roles)
+pasan siempre. Con PERMISOS_POR_MODULO=False en settings no se valida nada.
+"""
+
+from django.conf import settings
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
+from rest_framework.permissions import BasePermission
+from .cache import VER, CREAR, EDITAR, ELIMINAR, mascaras_de_usuario
+
+
+# Rutas sin token y rutas que solo exigen un usuario autenticado
+PUBLICA = 'publica'
+AUTENTICADA = 'autenticada'
+
+# (prefijo bajo /api/, módulo o módulos que dan acceso, permiso fijo para
+# POST/PUT/PATCH/DELETE). El prefijo de dos segmentos tiene prioridad sobre el de uno
+RUTAS_MODULOS = [
+    ('usuarios/login/', PUBLICA, None),
+    ('usuarios/crear/', PUBLICA, None),
+    ('usuarios/logout/', AUTENTICADA, None),
+    ('usuarios/', 'usuarios', None),
+    ('empleados/', 'usuarios', None),
+    ('permisos/mis-permisos/', AUTENTICADA, None),
+    ('permisos/', 'roles', None),
+    ('bitacora/registrar/', AUTENTICADA, None),
+    ('bitacora/', 'bitacora', None),
+    ('clientes/', 'clientes', None),
+    ('productos/movimientos/', 'inventario', None),
+    # El catálogo lee productos y categorías; solo inventario los modifica
+    ('productos/', ('inventario', 'catalogo'), None),
+    # Cada usuario maneja su propio carrito: crear basta para modificarlo
+    ('carritos/', 'carrito', CREAR),
+    ('ventas/crear_desde_carrito/', 'carrito', CREAR),
+    ('pagos/', 'carrito', CREAR),
+    ('ventas/', 'ventas', None),
+    ('notificaciones/dispositivos/', 'notificaciones', VER),
+    ('notificaciones/', 'notificaciones', None),
+    ('reportes/', 'reportes', None),
+    ('predicciones/dashboard/', 'dashboard', None),
+    ('predicciones/', 'predicciones', None),
+]
+
+PERMISO_POR_METODO = {
+    'GET': VER,
+    'HEAD': VER,
+    'OPTIONS': VER,
+    'POST': CREAR,
+    'PUT': EDITAR,
+    'PATCH': EDITAR,
+    'DELETE': ELIMINAR,
+}
+
+METODOS_LECTURA = {'GET', 'HEAD', 'OPTIONS'}
+
+# Último segmento de la ruta cuyo permiso no es el de su método
+ACCIONES = {
+    'actualizar': EDITAR,
+    'editar': EDITAR,
+    'restaurar': EDITAR,
+    'eliminar': ELIMINAR,
+    'marcar_leida': VER,
+    'marcar_todas_leidas': VER,
+    'generar': VER,
+    'generar_pdf': VER,
+    'predecir_lote': VER,
+}
+
+NOMBRES_PERMISOS = {VER: 'ver', CREAR: 'crear', EDITAR: 'editar', ELIMINAR: 'eliminar'}
+
+
+def _compilar(rutas):
+    tabla = {}
+    for prefijo, modulos, fijo in rutas:
+        if isinstance(modulos, str):
+            modulos = (modulos,)
+        tabla[prefijo] = (modulos, fijo)
+    return tabla
+
+
+_TABLA = _compilar(RUTAS_MODULOS)
+
+
+def regla_de_ruta(ruta):
+    """
+    (módulos, permiso fijo, último segmento) de una ruta de la API, o None si no está en la tabla
+    """
+    if not ruta.startswith('/api/'):
+        return None
+    segmentos = ruta[5:].split('/')
+    ultimo = next((segmento for segmento in reversed(segmentos) if segmento), '')
+    if len(segmentos) > 2:
+        regla = _TABLA.get(f'{segmentos[0]}/{segmentos[1]}/')
+        if regla is not None:
+            return regla + (ultimo,)
+    regla = _TABLA.get(f'{segmentos[0]}/')
+    if regla is None:
+        return None
+    return regla + (ultimo,)
+
+
+def permiso_requerido(metodo, fijo, ultimo):
+    if fijo is not None and metodo not in METODOS_LECTURA:
+        return fijo
+    return ACCIONES.get(ultimo) or PERMISO_POR_METODO.get(metodo, VER)
+
+
+class PermisoPorModulo(BasePermission):
+    """
+    Permiso de DRF que aplica los permisos por módulo de los roles del usuario
+    """
+
+    def has_permission(self, request, view):
+        if not getattr(settings, 'PERMISOS_POR_MODULO', True):
+            return True
+
+        regla = regla_de_ruta(request.path)
+        if regla is None:
+            return True
+        modulos, fijo, ultimo = regla
+        if modulos == (PUBLICA,):
+            return True
+
+        usuario = request.user
+        if not getattr(usuario, 'is_authenticated', False):
+            # Mismo formato de error que @jwt_required
+            raise NotAuthenticated({'error': getattr(request, 'error_token', 'Token no proporcionado')})
+        if modulos == (AUTENTICADA,) or getattr(usuario, 'tipo_usuario', None) == 'admin':
+            return True
+
+        permiso = permiso_requerido(request.method, fijo, ultimo)
+        mascaras = mascaras_de_usuario(usuario.id)
+        if any(mascaras.get(modulo, 0) & permiso for modulo in modulos):
+            return True
+        raise PermissionDenied({
+            'error': f'No tiene permiso para {NOMBRES_PERMISOS[permiso]} en el módulo {modulos[0]}'
+        })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PermisosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Permisos'
+
+    def ready(self):
+        # Invalidación de los permisos cacheados
+        from . import signals  # noqa: F401
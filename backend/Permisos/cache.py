@@ -0,0 +1,158 @@
+"""
+Permisos efectivos de cada usuario, cacheados
+
+Los módulos que ve un usuario son la unión de los permisos de sus roles activos
+(puede_ver, y crear/editar/eliminar si algún rol los otorga). Se calculan con una
+sola consulta y se guardan en dos niveles:
+
+- una caché LRU propia de cada proceso, con vida corta (TTL_LOCAL_PERMISOS), que
+  responde sin red ni BD a las llamadas repetidas de una misma navegación;
+- la caché 'permisos' (ver CACHES en settings): LocMemCache, o Redis si hay
+  REDIS_URL, compartida entonces por todos los workers.
+
+Las señales de Permisos/signals.py invalidan a los usuarios afectados al
+confirmarse cada cambio de roles, asignaciones o permisos de rol. En los demás
+procesos la copia local vence a los TTL_LOCAL_PERMISOS segundos; sin Redis, la
+caché 'permisos' también es local y el cambio se ve al vencer su TIMEOUT.
+"""
+
+from django.core.cache import caches
+from nucleo.cache_local import CacheLocal
+from .models import RolPermiso, UsuarioRol
+
+
+# Segundos que un proceso reutiliza su copia sin consultar la caché compartida
+TTL_LOCAL_PERMISOS = 10
+
+# Usuarios que guarda la caché local de cada proceso
+MAX_USUARIOS_LOCALES = 1024
+
+
+# Bits de la máscara de permisos de un módulo
+VER = 1
+CREAR = 2
+EDITAR = 4
+ELIMINAR = 8
+
+
+_local = CacheLocal(MAX_USUARIOS_LOCALES, TTL_LOCAL_PERMISOS)
+
+
+def _clave(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def _clave_mascaras(usuario_id):
+    # Solo en la caché local: se derivan de la lista de permisos
+    return f'mascaras:{usuario_id}'
+
+
+def calcular_permisos(usuario_id):
+    """
+    Módulos visibles para el usuario con sus permisos combinados, en el orden del
+    menú. Una sola consulta
+    """
+    filas = RolPermiso.objects.filter(
+        rol__usuarios__usuario_id=usuario_id,
+        rol__usuarios__activo=True,
+        rol__activo=True,
+        puede_ver=True,
+    ).order_by(
+        'permiso_modulo__orden', 'permiso_modulo__nombre_menu'
+    ).values_list(
+        'permiso_modulo__modulo', 'permiso_modulo__nombre_menu', 'permiso_modulo__ruta',
+        'permiso_modulo__icono', 'puede_crear', 'puede_editar', 'puede_eliminar'
+    )
+
+    modulos = {}
+    for modulo, nombre_menu, ruta, icono, puede_crear, puede_editar, puede_eliminar in filas:
+        permiso = modulos.get(modulo)
+        if permiso is None:
+            modulos[modulo] = {
+                'modulo': modulo,
+                'nombre_menu': nombre_menu,
+                'ruta': ruta,
+                'icono': icono,
+                'puede_ver': True,
+                'puede_crear': puede_crear,
+                'puede_editar': puede_editar,
+                'puede_eliminar': puede_eliminar,
+            }
+        else:
+            # Varios roles dan acceso al módulo: se suman sus permisos
+            permiso['puede_crear'] |= puede_crear
+            permiso['puede_editar'] |= puede_editar
+            permiso['puede_eliminar'] |= puede_eliminar
+    return list(modulos.values())
+
+
+def permisos_de_usuario(usuario_id):
+    """
+    Lista cacheada de calcular_permisos(usuario_id). No se debe modificar
+    """
+    clave = _clave(usuario_id)
+    permisos = _local.get(clave)
+    if permisos is not None:
+        return permisos
+
+    compartida = caches['permisos']
+    permisos = compartida.get(clave)
+    if permisos is None:
+        permisos = calcular_permisos(usuario_id)
+        compartida.set(clave, permisos)
+    _local.set(clave, permisos)
+    return permisos
+
+
+def mascara(permiso):
+    """
+    Permisos de un módulo (un elemento de permisos_de_usuario) como bits VER | CREAR | ...
+    """
+    return (
+        VER
+        | (CREAR if permiso['puede_crear'] else 0)
+        | (EDITAR if permiso['puede_editar'] else 0)
+        | (ELIMINAR if permiso['puede_eliminar'] else 0)
+    )
+
+
+def mascaras_de_usuario(usuario_id):
+    """
+    {módulo: máscara} de los módulos visibles para el usuario. No se debe modificar
+    """
+    clave = _clave_mascaras(usuario_id)
+    mascaras = _local.get(clave)
+    if mascaras is None:
+        mascaras = {permiso['modulo']: mascara(permiso) for permiso in permisos_de_usuario(usuario_id)}
+        _local.set(clave, mascaras)
+    return mascaras
+
+
+def roles_de_usuario(usuario_id):
+    """
+    Nombres de los roles activos asignados al usuario
+    """
+    return list(UsuarioRol.objects.filter(
+        usuario_id=usuario_id, activo=True, rol__activo=True
+    ).order_by('rol__nombre').values_list('rol__nombre', flat=True))
+
+
+def invalidar_permisos(usuario_ids):
+    """
+    Descarta los permisos cacheados de los usuarios indicados
+    """
+    usuario_ids = set(usuario_ids)
+    claves = [_clave(usuario_id) for usuario_id in usuario_ids]
+    if not claves:
+        return
+    for usuario_id in usuario_ids:
+        _local.delete(_clave(usuario_id))
+        _local.delete(_clave_mascaras(usuario_id))
+    caches['permisos'].delete_many(claves)
+
+
+def usuarios_de_roles(rol_ids):
+    """
+    Usuarios con alguno de los roles asignado (activo o no)
+    """
+    return list(UsuarioRol.objects.filter(rol_id__in=rol_ids).values_list('usuario_id', flat=True))
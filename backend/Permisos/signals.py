@@ -0,0 +1,43 @@
+"""
+Invalida los permisos cacheados (Permisos/cache.py) de los usuarios afectados por
+cada cambio de roles, asignaciones de rol, permisos de rol o módulos. La
+invalidación se hace al confirmar la transacción, para que otra petición no vuelva
+a cachear los permisos anteriores mientras el cambio aún no es visible.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache import invalidar_permisos, usuarios_de_roles
+from .models import PermisoModulo, Rol, RolPermiso, UsuarioRol
+
+
+def _invalidar_al_confirmar(usuario_ids):
+    usuario_ids = list(usuario_ids)
+    if usuario_ids:
+        transaction.on_commit(lambda: invalidar_permisos(usuario_ids))
+
+
+@receiver([post_save, post_delete], sender=UsuarioRol)
+def invalidar_por_asignacion(sender, instance, **kwargs):
+    _invalidar_al_confirmar([instance.usuario_id])
+
+
+@receiver([post_save, post_delete], sender=RolPermiso)
+def invalidar_por_permiso_de_rol(sender, instance, **kwargs):
+    _invalidar_al_confirmar(usuarios_de_roles([instance.rol_id]))
+
+
+@receiver(post_save, sender=Rol)
+def invalidar_por_rol(sender, instance, created, **kwargs):
+    # Activar o desactivar un rol cambia los permisos de todos sus usuarios
+    if not created:
+        _invalidar_al_confirmar(usuarios_de_roles([instance.pk]))
+
+
+@receiver(post_save, sender=PermisoModulo)
+def invalidar_por_modulo(sender, instance, created, **kwargs):
+    # Nombre, ruta o icono del menú
+    if not created:
+        rol_ids = RolPermiso.objects.filter(permiso_modulo=instance).values_list('rol_id', flat=True)
+        _invalidar_al_confirmar(usuarios_de_roles(rol_ids))
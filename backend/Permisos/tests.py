@@ -1,3 +1,127 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from Usuarios import autenticacion
+from Usuarios.jwt_utils import generate_token
+from Usuarios.models import Usuario
+from . import cache as cache_permisos
+from .acceso import regla_de_ruta, permiso_requerido
+from .cache import VER, CREAR, EDITAR, ELIMINAR
+from .models import PermisoModulo, Rol, RolPermiso, UsuarioRol
 
-# Create your tests here.
+
+class MisPermisosTest(TestCase):
+    def setUp(self):
+        cache_permisos._local.clear()
+        autenticacion._local.clear()
+        caches['permisos'].clear()
+
+        self.usuario = Usuario.objects.create(
+            username='ana', correo='ana@test.com', password='clave', tipo_usuario='admin'
+        )
+        self.ventas = PermisoModulo.objects.create(modulo='ventas', nombre_menu='Ventas', ruta='/ventas', orden=2)
+        self.clientes = PermisoModulo.objects.create(modulo='clientes', nombre_menu='Clientes', ruta='/clientes', orden=1)
+        self.cajero = Rol.objects.create(nombre='Cajero')
+        self.supervisor = Rol.objects.create(nombre='Supervisor')
+        RolPermiso.objects.create(rol=self.cajero, permiso_modulo=self.ventas, puede_crear=True)
+        RolPermiso.objects.create(rol=self.supervisor, permiso_modulo=self.ventas, puede_eliminar=True)
+        RolPermiso.objects.create(rol=self.supervisor, permiso_modulo=self.clientes)
+        UsuarioRol.objects.create(usuario=self.usuario, rol=self.cajero)
+        UsuarioRol.objects.create(usuario=self.usuario, rol=self.supervisor)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(self.usuario)}')
+        # generate_token cachea los permisos; el test mide la primera consulta
+        cache_permisos._local.clear()
+        caches['permisos'].clear()
+
+    def modulos(self):
+        respuesta = self.api.get('/api/permisos/mis-permisos/')
+        return {modulo['modulo']: modulo for modulo in respuesta.data['modulos']}
+
+    def test_combina_roles_y_cachea(self):
+        # Versión de sesión del token y permisos
+        with self.assertNumQueries(2):
+            modulos = self.modulos()
+        self.assertEqual(list(modulos), ['clientes', 'ventas'])
+        self.assertTrue(modulos['ventas']['puede_crear'])
+        self.assertTrue(modulos['ventas']['puede_eliminar'])
+        self.assertFalse(modulos['ventas']['puede_editar'])
+
+        # Todo desde la caché
+        with self.assertNumQueries(0):
+            self.modulos()
+
+    def test_invalidacion(self):
+        self.modulos()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RolPermiso.objects.filter(rol=self.cajero).update(puede_editar=True)
+            RolPermiso.objects.get(rol=self.cajero).save()
+        self.assertTrue(self.modulos()['ventas']['puede_editar'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.supervisor.activo = False
+            self.supervisor.save()
+        self.assertEqual(list(self.modulos()), ['ventas'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UsuarioRol.objects.get(rol=self.cajero).delete()
+        self.assertEqual(self.modulos(), {})
+
+
+class PermisoPorModuloTest(TestCase):
+    def setUp(self):
+        cache_permisos._local.clear()
+        autenticacion._local.clear()
+        caches['permisos'].clear()
+
+        self.usuario = Usuario.objects.create(
+            username='luis', correo='luis@test.com', password='clave', tipo_usuario='cliente'
+        )
+        rol = Rol.objects.create(nombre='Cliente')
+        for modulo, puede_crear in (('catalogo', False), ('carrito', True)):
+            permiso_modulo = PermisoModulo.objects.create(modulo=modulo, nombre_menu=modulo, ruta=f'/{modulo}')
+            RolPermiso.objects.create(rol=rol, permiso_modulo=permiso_modulo, puede_crear=puede_crear)
+        UsuarioRol.objects.create(usuario=self.usuario, rol=rol)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(self.usuario)}')
+
+    def test_tabla_de_rutas(self):
+        self.assertEqual(regla_de_ruta('/api/productos/movimientos/3/'), (('inventario',), None, '3'))
+        self.assertEqual(regla_de_ruta('/api/productos/7/'), (('inventario', 'catalogo'), None, '7'))
+        self.assertIsNone(regla_de_ruta('/admin/'))
+        self.assertEqual(permiso_requerido('POST', None, 'restaurar'), EDITAR)
+        self.assertEqual(permiso_requerido('DELETE', None, '5'), ELIMINAR)
+        self.assertEqual(permiso_requerido('DELETE', CREAR, 'eliminar_item'), CREAR)
+        self.assertEqual(permiso_requerido('GET', CREAR, 'mi_carrito'), VER)
+
+    def test_aplica_permisos_del_rol(self):
+        self.assertEqual(self.api.get('/api/productos/').status_code, 200)
+        self.assertEqual(self.api.post('/api/productos/', {'nombre': 'X'}).status_code, 403)
+        self.assertEqual(self.api.get('/api/clientes/').status_code, 403)
+        self.assertEqual(self.api.get('/api/carritos/mi_carrito/').status_code, 200)
+
+        # Con la caché caliente la verificación no consulta la BD
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get('/api/ventas/').status_code, 403)
+
+    @override_settings(BITACORA_ASINCRONA=False)
+    def test_registro_anonimo(self):
+        respuesta = APIClient().post('/api/usuarios/crear/', {
+            'username': 'nuevo', 'correo': 'nuevo@test.com', 'password': 'clave123', 'tipo_usuario': 'cliente'
+        }, format='json')
+        self.assertNotIn(respuesta.status_code, (401, 403))
+        self.assertTrue(Usuario.objects.filter(username='nuevo').exists())
+
+    def test_anonimo_y_admin(self):
+        anonimo = APIClient()
+        respuesta = anonimo.get('/api/productos/')
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(respuesta.data, {'error': 'Token no proporcionado'})
+        self.assertNotEqual(anonimo.post('/api/usuarios/login/', {}).status_code, 401)
+
+        admin = Usuario.objects.create(username='admin', correo='admin@test.com', password='clave', tipo_usuario='admin')
+        anonimo.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(admin)}')
+        self.assertEqual(anonimo.get('/api/clientes/').status_code, 200)
@@ -6,6 +6,7 @@ from .serializers import (PermisoSerializer, RolSerializer, PermisoModuloSeriali
                           RolPermisoSerializer, UsuarioRolSerializer)
 from Usuarios.decorators import jwt_required
 from Bitacora.utils import registrar_accion_bitacora
+from .cache import permisos_de_usuario
 
 
 # ============== ENDPOINT PRINCIPAL: Obtener permisos del usuario autenticado ==============
@@ -16,41 +17,16 @@ def mis_permisos(request):
     Devuelve todos los módulos a los que el usuario tiene acceso
     según sus roles asignados.
     """
-    usuario = request.user
+    # Unión de los permisos de los roles activos del usuario, cacheada
+    # (ver Permisos/cache.py)
+    permisos = permisos_de_usuario(request.user.id)
     
-    # Obtener todos los roles activos del usuario
-    roles_usuario = UsuarioRol.objects.filter(usuario=usuario, activo=True)
-    
-    if not roles_usuario.exists():
+    if not permisos and not UsuarioRol.objects.filter(usuario_id=request.user.id, activo=True).exists():
         return Response({
             'modulos': [],
             'mensaje': 'Usuario sin roles asignados'
         })
     
-    # Obtener todos los permisos de los roles del usuario
-    permisos = []
-    modulos_vistos = set()
-    
-    for usuario_rol in roles_usuario:
-        rol_permisos = RolPermiso.objects.filter(
-            rol=usuario_rol.rol,
-            puede_ver=True
-        ).select_related('permiso_modulo')
-        
-        for rp in rol_permisos:
-            if rp.permiso_modulo.modulo not in modulos_vistos:
-                permisos.append({
-                    'modulo': rp.permiso_modulo.modulo,
-                    'nombre_menu': rp.permiso_modulo.nombre_menu,
-                    'ruta': rp.permiso_modulo.ruta,
-                    'icono': rp.permiso_modulo.icono,
-                    'puede_ver': rp.puede_ver,
-                    'puede_crear': rp.puede_crear,
-                    'puede_editar': rp.puede_editar,
-                    'puede_eliminar': rp.puede_eliminar,
-                })
-                modulos_vistos.add(rp.permiso_modulo.modulo)
-    
     return Response({
         'modulos': permisos,
         'total': len(permisos)
@@ -0,0 +1,39 @@
+"""
+Caché de pronósticos del modelo de ventas
+
+Los pronósticos sólo cambian cuando se guarda un modelo nuevo o cambia el día,
+así que se guardan en la caché 'predicciones' (ver CACHES en settings) con una
+clave formada por la huella del modelo, el endpoint, el horizonte, el producto
+y la fecha. Al guardar un modelo nuevo cambia la huella y las entradas viejas
+dejan de consultarse hasta que la política LRU de la caché las descarta.
+"""
+
+from datetime import datetime
+from django.core.cache import caches
+from .ml_service import predictor
+
+
+def clave_pronostico(huella, endpoint, horizonte, producto_id=None):
+    """
+    Arma la clave de caché de un pronóstico
+    """
+    dia = datetime.now().strftime('%Y-%m-%d')
+    return f"pronostico:{huella}:{endpoint}:{horizonte}:{producto_id or '-'}:{dia}"
+
+
+def obtener_pronostico(endpoint, horizonte, calcular, producto_id=None):
+    """
+    Retorna el pronóstico cacheado o lo calcula con `calcular()` y lo guarda
+    """
+    huella = predictor.huella_modelo()
+    if huella is None:
+        return calcular()
+    
+    cache = caches['predicciones']
+    clave = clave_pronostico(huella, endpoint, horizonte, producto_id)
+    
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(clave, resultado)
+    return resultado
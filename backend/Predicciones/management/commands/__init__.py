@@ -0,0 +1 @@
+# Este archivo es necesario para que Python reconozca este directorio como un paquete
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from Predicciones.trabajos import encolar_entrenamiento
+
+
+class Command(BaseCommand):
+    help = "Encola un entrenamiento del modelo de ventas (p. ej. desde un cron nocturno)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true', help='Entrenar sólo con las ventas nuevas (warm start)')
+        parser.add_argument('--sinteticos', action='store_true', help='Entrenar con datos sintéticos')
+
+    def handle(self, *args, **options):
+        trabajo, creado = encolar_entrenamiento(
+            usar_datos_reales=not options['sinteticos'],
+            incremental=options['incremental']
+        )
+
+        if creado:
+            self.stdout.write(self.style.SUCCESS(f"Entrenamiento encolado (trabajo #{trabajo.id})"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Ya hay un entrenamiento en curso (trabajo #{trabajo.id})"))
@@ -0,0 +1,70 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import django
+from django.core.management.base import BaseCommand
+from Predicciones.trabajos import (
+    tomar_siguiente_trabajo, finalizar_trabajo, liberar_trabajos_colgados, ejecutar_entrenamiento
+)
+
+
+def crear_pool():
+    # 'spawn' para que el proceso de entrenamiento no herede las conexiones a la BD;
+    # sólo hay un trabajo activo a la vez, así que basta un proceso
+    contexto = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=1, mp_context=contexto, initializer=django.setup)
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de entrenamientos del modelo de ventas en un pool de procesos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre consultas a la cola')
+        parser.add_argument('--timeout', type=int, default=3600, help='Segundos tras los que un trabajo en proceso se considera colgado')
+        parser.add_argument('--una-vez', action='store_true', help='Procesar los trabajos pendientes y terminar')
+
+    def liberar_colgados(self, timeout):
+        liberados = liberar_trabajos_colgados(timeout)
+        if liberados:
+            self.stdout.write(self.style.WARNING(f"{liberados} trabajo(s) colgado(s) marcados como fallidos"))
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        una_vez = options['una_vez']
+
+        self.liberar_colgados(options['timeout'])
+        self.stdout.write(self.style.SUCCESS("Esperando entrenamientos..."))
+
+        pool = crear_pool()
+        try:
+            while True:
+                trabajo = tomar_siguiente_trabajo()
+
+                if trabajo is None:
+                    if una_vez:
+                        break
+                    # Un worker anterior pudo morir a mitad de un trabajo sin que este
+                    # proceso se reiniciara: se revisa cada vez que la cola está vacía
+                    self.liberar_colgados(options['timeout'])
+                    time.sleep(intervalo)
+                    continue
+
+                self.stdout.write(f"Entrenando (trabajo #{trabajo.id})...")
+                try:
+                    metricas = pool.submit(
+                        ejecutar_entrenamiento, trabajo.usar_datos_reales, trabajo.incremental
+                    ).result()
+                    finalizar_trabajo(trabajo, metricas=metricas)
+                    self.stdout.write(self.style.SUCCESS(f"Trabajo #{trabajo.id} completado: {metricas}"))
+                except BrokenProcessPool:
+                    # El proceso de entrenamiento murió (p. ej. sin memoria): se reemplaza el pool
+                    finalizar_trabajo(trabajo, error='El proceso de entrenamiento terminó inesperadamente')
+                    self.stdout.write(self.style.ERROR(f"Trabajo #{trabajo.id} fallido: proceso terminado"))
+                    pool.shutdown(wait=False)
+                    pool = crear_pool()
+                except Exception as e:
+                    finalizar_trabajo(trabajo, error=str(e) or e.__class__.__name__)
+                    self.stdout.write(self.style.ERROR(f"Trabajo #{trabajo.id} fallido: {e}"))
+        finally:
+            pool.shutdown()
@@ -6,32 +6,76 @@ Utiliza Random Forest Regressor de scikit-learn
 import os
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
 import joblib
+from itertools import islice
 from datetime import datetime, timedelta
 from django.conf import settings
-from Ventas.models import Venta
+from django.db import transaction
+from django.db.models import Avg, Count, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import (
+    Coalesce, ExtractDay, ExtractIsoWeekDay, ExtractMonth, ExtractQuarter
+)
+from Ventas.models import Venta, VentaDetalle
 from Producto.models import Producto
 
 
+# Orden de las columnas con el que se entrena y se consulta el modelo
+FEATURES = ['mes', 'dia_semana', 'dia_mes', 'trimestre', 'es_fin_semana',
+            'producto_id', 'categoria', 'precio_promedio', 'cantidad']
+
+# Máximo de filas que se envían al modelo en una sola llamada a predict
+TAMANO_LOTE_PREDICCION = 5000
+
+# Filas que se leen de la BD por cada vuelta del cursor al extraer datos de entrenamiento
+TAMANO_LOTE_EXTRACCION = 10000
+
+# Columnas del almacén de features usado por el entrenamiento incremental
+COLUMNAS_ALMACEN = ['venta_id'] + FEATURES + ['total_venta']
+
+# Unidades por venta que se asumen para un producto sin historial
+CANTIDAD_POR_DEFECTO = 10
+
+# Ventas más recientes que se conservan en el almacén (ventana móvil del reentrenamiento)
+VENTANA_INCREMENTAL = 100000
+
+
 class VentasPredictor:
     """
     Clase para manejar predicciones de ventas usando Random Forest
     """
     
     def __init__(self):
-        self.model = None
+        self._model = None
+        self._carga_intentada = False
         self.model_path = os.path.join(settings.BASE_DIR, 'Predicciones', 'models', 'ventas_model.pkl')
         self.scaler_path = os.path.join(settings.BASE_DIR, 'Predicciones', 'models', 'scaler.pkl')
-        self.is_trained = False
+        self.features_path = os.path.join(settings.BASE_DIR, 'Predicciones', 'models', 'ventas_features.npy')
+        self.huella = None  # Huella (mtime + tamaño) del archivo del modelo cargado
         
         # Crear directorio de modelos si no existe
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         
-        # Cargar modelo si existe
-        self.load_model()
+        # El modelo no se carga aquí sino en su primer uso (ver la propiedad model),
+        # así importar este módulo (migraciones, comandos, arranque de cada worker)
+        # no paga el joblib.load del bosque completo
+    
+    @property
+    def model(self):
+        """
+        Modelo entrenado. Se carga desde disco la primera vez que se accede
+        """
+        if not self._carga_intentada:
+            self.load_model()
+        return self._model
+    
+    @model.setter
+    def model(self, modelo):
+        self._model = modelo
+        self._carga_intentada = True
+    
+    @property
+    def is_trained(self):
+        return self.model is not None
     
     def generar_datos_sinteticos(self, n_registros=500):
         """
@@ -84,40 +128,86 @@ class VentasPredictor:
         
         return pd.DataFrame(data)
     
-    def obtener_datos_reales(self):
+    def obtener_datos_reales(self, desde_id=None):
         """
-        Obtiene datos reales de ventas de la base de datos
+        Obtiene datos reales de ventas de la base de datos.
+        Una sola consulta agregada (una fila por venta) que se recorre con un
+        cursor del lado del servidor y se vuelca en columnas NumPy.
+        Con desde_id sólo trae las ventas posteriores a ese id (entrenamiento incremental)
         """
         try:
-            ventas = Venta.objects.all().select_related('cliente').prefetch_related('detalles__producto')
+            ventas = Venta.objects.all()
+            if desde_id is not None:
+                ventas = ventas.filter(id__gt=desde_id)
             
-            if ventas.count() < 10:
+            resumen = ventas.aggregate(total=Count('id'), ultimo_id=Max('id'))
+            
+            if resumen['total'] == 0 or (desde_id is None and resumen['total'] < 10):
                 return None
             
-            data_list = []
-            for venta in ventas:
-                # Calcular precio promedio y cantidad total
-                total_cantidad = sum(item.cantidad for item in venta.detalles.all())
-                precio_promedio = venta.monto_total / total_cantidad if total_cantidad > 0 else 0
-                
-                # Obtener primer producto como referencia (simplificación)
-                primer_item = venta.detalles.first()
-                producto_id = primer_item.producto.id if primer_item else 1
-                
-                data_list.append({
-                    'mes': venta.fecha_venta.month,
-                    'dia_semana': venta.fecha_venta.weekday(),
-                    'dia_mes': venta.fecha_venta.day,
-                    'trimestre': (venta.fecha_venta.month - 1) // 3 + 1,
-                    'es_fin_semana': 1 if venta.fecha_venta.weekday() >= 5 else 0,
-                    'producto_id': producto_id,
-                    'categoria': 1,  # Simplificación
-                    'precio_promedio': float(precio_promedio),
-                    'cantidad': total_cantidad,
-                    'total_venta': float(venta.monto_total)
-                })
+            detalles = VentaDetalle.objects.filter(venta=OuterRef('pk'))
+            # El primer producto de cada venta se usa como referencia (simplificación)
+            primer_detalle = detalles.order_by('id')
+            cantidad_total = detalles.order_by().values('venta').annotate(total=Sum('cantidad')).values('total')
+            
+            filas = ventas.filter(
+                id__lte=resumen['ultimo_id']
+            ).order_by().annotate(
+                mes=ExtractMonth('fecha_venta'),
+                dia_iso=ExtractIsoWeekDay('fecha_venta'),
+                dia_mes=ExtractDay('fecha_venta'),
+                trimestre=ExtractQuarter('fecha_venta'),
+                producto_ref=Coalesce(
+                    Subquery(primer_detalle.values('producto_id')[:1]), Value(1),
+                    output_field=IntegerField()
+                ),
+                categoria_ref=Coalesce(
+                    Subquery(primer_detalle.values('producto__categoria_id')[:1]), Value(0),
+                    output_field=IntegerField()
+                ),
+                total_cantidad=Coalesce(
+                    Subquery(cantidad_total), Value(0),
+                    output_field=IntegerField()
+                ),
+            ).values_list(
+                'id', 'mes', 'dia_iso', 'dia_mes', 'trimestre', 'producto_ref',
+                'categoria_ref', 'total_cantidad', 'monto_total'
+            ).iterator(chunk_size=TAMANO_LOTE_EXTRACCION)
             
-            return pd.DataFrame(data_list)
+            # Matriz preasignada; se llena por bloques a medida que avanza el cursor.
+            # La transacción mantiene el cursor de servidor aun detrás de un pooler (Neon/PgBouncer)
+            datos = np.empty((resumen['total'], 9), dtype=np.float64)
+            n = 0
+            with transaction.atomic():
+                while True:
+                    bloque = list(islice(filas, TAMANO_LOTE_EXTRACCION))
+                    if not bloque:
+                        break
+                    datos[n:n + len(bloque)] = np.array(bloque, dtype=np.float64)
+                    n += len(bloque)
+            datos = datos[:n]
+            
+            venta_id, mes, dia_iso, dia_mes, trimestre, producto_id, categoria, cantidad, total_venta = datos.T
+            dia_semana = dia_iso - 1  # ISO: 1 = lunes; weekday(): 0 = lunes
+            
+            # Precio promedio por unidad de la venta (0 si la venta no tiene detalles)
+            precio_promedio = np.divide(
+                total_venta, cantidad, out=np.zeros_like(total_venta), where=cantidad > 0
+            )
+            
+            return pd.DataFrame({
+                'venta_id': venta_id.astype(np.int64),
+                'mes': mes.astype(np.int64),
+                'dia_semana': dia_semana.astype(np.int64),
+                'dia_mes': dia_mes.astype(np.int64),
+                'trimestre': trimestre.astype(np.int64),
+                'es_fin_semana': (dia_semana >= 5).astype(np.int64),
+                'producto_id': producto_id.astype(np.int64),
+                'categoria': categoria.astype(np.int64),
+                'precio_promedio': precio_promedio,
+                'cantidad': cantidad.astype(np.int64),
+                'total_venta': total_venta
+            })
         
         except Exception as e:
             print(f"Error obteniendo datos reales: {e}")
@@ -127,22 +217,27 @@ class VentasPredictor:
         """
         Entrena el modelo Random Forest
         """
+        # scikit-learn se importa sólo al entrenar: su import toma ~1 s y no hace
+        # falta para arrancar los workers ni para los comandos de manage.py
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_squared_error, r2_score
+        
         # Intentar obtener datos reales
         df = None
         if usar_datos_reales:
             df = self.obtener_datos_reales()
         
         # Si no hay datos reales suficientes, usar sintéticos
-        if df is None or len(df) < 50:
+        sinteticos = df is None or len(df) < 50
+        if sinteticos:
             print("Usando datos sintéticos para entrenamiento")
             df = self.generar_datos_sinteticos()
         else:
             print(f"Usando {len(df)} registros reales para entrenamiento")
         
         # Preparar features y target
-        features = ['mes', 'dia_semana', 'dia_mes', 'trimestre', 'es_fin_semana', 
-                   'producto_id', 'categoria', 'precio_promedio', 'cantidad']
-        X = df[features]
+        X = df[FEATURES]
         y = df['total_venta']
         
         # Split train/test
@@ -167,11 +262,18 @@ class VentasPredictor:
         mse = mean_squared_error(y_test, y_pred)
         r2 = r2_score(y_test, y_pred)
         
-        self.is_trained = True
-        
         # Guardar modelo
         self.save_model()
         
+        # El almacén (y con él la marca del incremental) se actualiza sólo después de
+        # guardar el modelo, para que nunca incluya ventas que el modelo no vio
+        if sinteticos:
+            # Sin datos reales no hay punto de partida para el entrenamiento incremental
+            if os.path.exists(self.features_path):
+                os.remove(self.features_path)
+        else:
+            self.guardar_almacen_features(df[COLUMNAS_ALMACEN].to_numpy(dtype=np.float64))
+        
         return {
             'mse': float(mse),
             'rmse': float(np.sqrt(mse)),
@@ -180,6 +282,144 @@ class VentasPredictor:
             'data_type': 'real' if usar_datos_reales and df is not None else 'sintético'
         }
     
+    def entrenar_incremental(self, arboles_nuevos=20, max_arboles=200):
+        """
+        Actualiza el modelo sólo con las ventas posteriores al último entrenamiento.
+        Las ventas nuevas se agregan al almacén de features (ventana móvil de las
+        VENTANA_INCREMENTAL más recientes) y el bosque crece con `arboles_nuevos`
+        árboles ajustados sobre esa ventana (warm_start), descartando los más
+        antiguos al superar `max_arboles`. Así el costo no crece con el historial.
+        Si no hay almacén ni modelo previos, hace un entrenamiento completo
+        """
+        from sklearn.metrics import mean_squared_error, r2_score
+        
+        almacen = self.cargar_almacen_features()
+        
+        if almacen is None or not self.is_trained:
+            print("Sin almacén de features previo: entrenamiento completo")
+            resultados = self.entrenar_modelo(usar_datos_reales=True)
+            resultados['modo'] = 'completo'
+            return resultados
+        
+        marca = int(almacen[:, 0].max()) if len(almacen) else 0
+        nuevos = self.obtener_datos_reales(desde_id=marca)
+        
+        if nuevos is None:
+            print("No hay ventas nuevas desde el último entrenamiento")
+            return {
+                'modo': 'incremental',
+                'mse': None,
+                'rmse': None,
+                'r2_score': None,
+                'n_nuevos': 0,
+                'n_samples': len(almacen),
+                'n_arboles': len(self.model.estimators_),
+                'data_type': 'real'
+            }
+        
+        nuevos_array = nuevos[COLUMNAS_ALMACEN].to_numpy(dtype=np.float64)
+        nuevos_array = nuevos_array[np.argsort(nuevos_array[:, 0], kind='stable')]
+        ventana = np.concatenate([almacen, nuevos_array])[-VENTANA_INCREMENTAL:]
+        
+        # Error del modelo vigente sobre las ventas que aún no vio
+        y_pred = self._predecir_lote(nuevos_array[:, 1:-1])
+        mse = mean_squared_error(nuevos_array[:, -1], y_pred)
+        r2 = r2_score(nuevos_array[:, -1], y_pred) if len(nuevos_array) > 1 else None
+        
+        # Agregar árboles nuevos entrenados sobre la ventana
+        X = pd.DataFrame(ventana[:, 1:-1], columns=FEATURES)
+        y = ventana[:, -1]
+        # Semilla nueva en cada corrida (la marca crece con cada venta): con una semilla
+        # fija, al recortar el bosque a max_arboles warm_start repetiría siempre las
+        # mismas semillas y los mismos bootstraps para los árboles nuevos
+        self.model.set_params(
+            warm_start=True,
+            n_estimators=len(self.model.estimators_) + arboles_nuevos,
+            random_state=marca % (2 ** 32)
+        )
+        self.model.fit(X, y)
+        
+        # Descartar los árboles más antiguos
+        if len(self.model.estimators_) > max_arboles:
+            self.model.estimators_ = self.model.estimators_[-max_arboles:]
+            self.model.n_estimators = max_arboles
+        
+        self.save_model()
+        self.guardar_almacen_features(ventana)
+        
+        return {
+            'modo': 'incremental',
+            'mse': float(mse),
+            'rmse': float(np.sqrt(mse)),
+            'r2_score': float(r2) if r2 is not None else None,
+            'n_nuevos': len(nuevos_array),
+            'n_samples': len(ventana),
+            'n_arboles': len(self.model.estimators_),
+            'data_type': 'real'
+        }
+    
+    def cargar_almacen_features(self):
+        """
+        Carga el almacén de features (columnas COLUMNAS_ALMACEN) si existe
+        """
+        if not os.path.exists(self.features_path):
+            return None
+        try:
+            almacen = np.load(self.features_path)
+        except Exception as e:
+            print(f"Error cargando almacén de features: {e}")
+            return None
+        if almacen.ndim != 2 or almacen.shape[1] != len(COLUMNAS_ALMACEN):
+            return None
+        return almacen
+    
+    def guardar_almacen_features(self, datos):
+        """
+        Guarda las VENTANA_INCREMENTAL filas más recientes del almacén de features
+        """
+        datos = datos[np.argsort(datos[:, 0], kind='stable')]
+        tmp_path = f"{self.features_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, datos[-VENTANA_INCREMENTAL:])
+        os.replace(tmp_path, self.features_path)
+    
+    def _matriz_features(self, mes, dia_semana, dia_mes, producto_id=5, categoria=2,
+                         precio_promedio=200, cantidad=10):
+        """
+        Arma la matriz de features del horizonte completo (una fila por día)
+        como un único array NumPy. Los valores por defecto de producto, categoría,
+        precio y cantidad son arbitrarios: sólo sirven para los pronósticos
+        generales, que no se refieren a ningún producto concreto
+        """
+        mes = np.asarray(mes)
+        dia_semana = np.asarray(dia_semana)
+        
+        X = np.empty((len(mes), len(FEATURES)), dtype=np.float64)
+        X[:, 0] = mes
+        X[:, 1] = dia_semana
+        X[:, 2] = dia_mes
+        X[:, 3] = (mes - 1) // 3 + 1
+        X[:, 4] = dia_semana >= 5
+        X[:, 5] = producto_id
+        X[:, 6] = categoria
+        X[:, 7] = precio_promedio
+        X[:, 8] = cantidad
+        return X
+    
+    def _predecir_lote(self, X):
+        """
+        Predice todas las filas de X con una sola llamada al modelo
+        (por bloques de TAMANO_LOTE_PREDICCION filas si el horizonte es muy grande)
+        """
+        if len(X) == 0:
+            return np.empty(0)
+        
+        bloques = [
+            self.model.predict(pd.DataFrame(X[i:i + TAMANO_LOTE_PREDICCION], columns=FEATURES))
+            for i in range(0, len(X), TAMANO_LOTE_PREDICCION)
+        ]
+        return np.concatenate(bloques)
+    
     def predecir_ventas_futuras(self, dias=30):
         """
         Predice ventas para los próximos N días
@@ -187,35 +427,45 @@ class VentasPredictor:
         if not self.is_trained:
             raise Exception("El modelo no ha sido entrenado aún")
         
-        predicciones = []
-        fecha_actual = datetime.now()
+        # Un horizonte negativo (p. ej. ?dias=-3) no tiene días que predecir
+        fechas = pd.date_range(datetime.now(), periods=max(0, dias), freq='D')
         
-        for i in range(dias):
-            fecha = fecha_actual + timedelta(days=i)
-            
-            # Features para predicción (valores promedio)
-            features = {
-                'mes': fecha.month,
-                'dia_semana': fecha.weekday(),
-                'dia_mes': fecha.day,
-                'trimestre': (fecha.month - 1) // 3 + 1,
-                'es_fin_semana': 1 if fecha.weekday() >= 5 else 0,
-                'producto_id': 5,  # Producto promedio
-                'categoria': 2,    # Categoría promedio
-                'precio_promedio': 200,  # Precio promedio
-                'cantidad': 10     # Cantidad promedio
-            }
-            
-            X = pd.DataFrame([features])
-            prediccion = self.model.predict(X)[0]
-            
-            predicciones.append({
-                'fecha': fecha.strftime('%Y-%m-%d'),
+        # Features para predicción (valores promedio de producto, precio y cantidad)
+        X = self._matriz_features(fechas.month, fechas.weekday, fechas.day)
+        predicciones = self._predecir_lote(X)
+        
+        return [
+            {
+                'fecha': fecha,
                 'prediccion': float(prediccion),
-                'dia_semana': fecha.strftime('%A')
-            })
+                'dia_semana': dia_semana
+            }
+            for fecha, prediccion, dia_semana in zip(
+                fechas.strftime('%Y-%m-%d'), predicciones, fechas.strftime('%A')
+            )
+        ]
+    
+    def datos_productos(self, producto_ids=None, categoria_ids=None):
+        """
+        Retorna (producto_id, categoria, precio, cantidad) de los productos pedidos
+        por id o por categoría, en una sola consulta. La cantidad es el promedio
+        histórico de unidades por línea de venta del producto
+        """
+        filtro = Q(id__in=producto_ids or []) | Q(categoria_id__in=categoria_ids or [])
+        filas = Producto.objects.filter(filtro).annotate(
+            cantidad_promedio=Avg('ventadetalle__cantidad')
+        ).order_by('id').values_list('id', 'categoria_id', 'precio', 'cantidad_promedio')
         
-        return predicciones
+        return [
+            (
+                producto_id,
+                # Igual que en el entrenamiento: 0 para productos sin categoría
+                categoria or 0,
+                float(precio),
+                float(cantidad) if cantidad is not None else CANTIDAD_POR_DEFECTO
+            )
+            for producto_id, categoria, precio, cantidad in filas
+        ]
     
     def predecir_por_producto(self, producto_id, dias=30):
         """
@@ -224,40 +474,57 @@ class VentasPredictor:
         if not self.is_trained:
             raise Exception("El modelo no ha sido entrenado aún")
         
-        predicciones = []
-        fecha_actual = datetime.now()
-        
         # Obtener info del producto si existe
-        try:
-            producto = Producto.objects.get(id=producto_id)
-            precio = float(producto.precio)
-        except:
-            precio = 200
+        productos = self.datos_productos(producto_ids=[producto_id])
+        if not productos:
+            productos = [(producto_id, 2, 200, CANTIDAD_POR_DEFECTO)]
         
-        for i in range(dias):
-            fecha = fecha_actual + timedelta(days=i)
-            
-            features = {
-                'mes': fecha.month,
-                'dia_semana': fecha.weekday(),
-                'dia_mes': fecha.day,
-                'trimestre': (fecha.month - 1) // 3 + 1,
-                'es_fin_semana': 1 if fecha.weekday() >= 5 else 0,
-                'producto_id': producto_id,
-                'categoria': 2,
-                'precio_promedio': precio,
-                'cantidad': 10
-            }
+        return next(self.predecir_lote(productos, dias=dias))['predicciones']
+    
+    def predecir_lote(self, productos, dias=30):
+        """
+        Predice las ventas diarias de varios productos (tuplas de datos_productos).
+        Arma la grilla producto × día y la predice de forma vectorizada, por bloques
+        de hasta TAMANO_LOTE_PREDICCION filas. Es un generador con un resultado por
+        producto, para poder transmitir la respuesta a medida que se calcula
+        """
+        if not self.is_trained:
+            raise Exception("El modelo no ha sido entrenado aún")
+        
+        # Un horizonte negativo (p. ej. ?dias=-3) no tiene días que predecir
+        fechas = pd.date_range(datetime.now(), periods=max(0, dias), freq='D')
+        etiquetas = list(fechas.strftime('%Y-%m-%d'))
+        n_dias = len(fechas)
+        productos_por_bloque = max(1, TAMANO_LOTE_PREDICCION // max(n_dias, 1))
+        
+        for inicio in range(0, len(productos), productos_por_bloque):
+            bloque = productos[inicio:inicio + productos_por_bloque]
+            datos = np.array(bloque, dtype=np.float64).reshape(-1, 4)
             
-            X = pd.DataFrame([features])
-            prediccion = self.model.predict(X)[0]
+            X = self._matriz_features(
+                np.tile(fechas.month.to_numpy(), len(bloque)),
+                np.tile(fechas.weekday.to_numpy(), len(bloque)),
+                np.tile(fechas.day.to_numpy(), len(bloque)),
+                producto_id=np.repeat(datos[:, 0], n_dias),
+                categoria=np.repeat(datos[:, 1], n_dias),
+                precio_promedio=np.repeat(datos[:, 2], n_dias),
+                cantidad=np.repeat(datos[:, 3], n_dias)
+            )
+            predicciones = self._predecir_lote(X).reshape(len(bloque), n_dias)
             
-            predicciones.append({
-                'fecha': fecha.strftime('%Y-%m-%d'),
-                'prediccion': float(prediccion)
-            })
-        
-        return predicciones
+            for (producto_id, categoria, _, _), fila in zip(bloque, predicciones):
+                yield {
+                    'producto_id': producto_id,
+                    'categoria_id': categoria or None,
+                    'total': float(fila.sum()),
+                    'predicciones': [
+                        {
+                            'fecha': fecha,
+                            'prediccion': float(prediccion)
+                        }
+                        for fecha, prediccion in zip(etiquetas, fila)
+                    ]
+                }
     
     def predecir_mensual(self, meses=6):
         """
@@ -266,45 +533,36 @@ class VentasPredictor:
         if not self.is_trained:
             raise Exception("El modelo no ha sido entrenado aún")
         
-        predicciones = []
         fecha_actual = datetime.now()
+        dias_mes = 30  # Simplificación
+        dias = np.arange(1, dias_mes + 1)
         
-        for i in range(meses):
+        periodos = []
+        for i in range(max(0, meses)):
             # Calcular mes futuro
             mes = ((fecha_actual.month - 1 + i) % 12) + 1
             año = fecha_actual.year + ((fecha_actual.month - 1 + i) // 12)
-            
-            # Predecir para cada día del mes (promedio)
-            suma_mes = 0
-            dias_mes = 30  # Simplificación
-            
-            for dia in range(dias_mes):
-                fecha = datetime(año, mes, min(dia + 1, 28))
-                
-                features = {
-                    'mes': mes,
-                    'dia_semana': fecha.weekday(),
-                    'dia_mes': dia + 1,
-                    'trimestre': (mes - 1) // 3 + 1,
-                    'es_fin_semana': 1 if fecha.weekday() >= 5 else 0,
-                    'producto_id': 5,
-                    'categoria': 2,
-                    'precio_promedio': 200,
-                    'cantidad': 10
-                }
-                
-                X = pd.DataFrame([features])
-                prediccion = self.model.predict(X)[0]
-                suma_mes += prediccion
-            
-            predicciones.append({
+            periodos.append((año, mes))
+        
+        # Una fila por cada día de cada mes; el día de la semana se calcula
+        # sobre min(día, 28) para no salirse de los meses cortos
+        primer_dia = np.array([datetime(año, mes, 1).weekday() for año, mes in periodos], dtype=int)
+        X = self._matriz_features(
+            np.repeat([mes for _, mes in periodos], dias_mes),
+            ((primer_dia[:, None] + np.minimum(dias, 28) - 1) % 7).ravel(),
+            np.tile(dias, len(periodos)),
+        )
+        sumas = self._predecir_lote(X).reshape(len(periodos), dias_mes).sum(axis=1)
+        
+        return [
+            {
                 'mes': f"{año}-{mes:02d}",
                 'prediccion': float(suma_mes),
                 'año': año,
                 'mes_numero': mes
-            })
-        
-        return predicciones
+            }
+            for (año, mes), suma_mes in zip(periodos, sumas)
+        ]
     
     def obtener_importancia_features(self):
         """
@@ -313,39 +571,64 @@ class VentasPredictor:
         if not self.is_trained:
             return None
         
-        features = ['mes', 'dia_semana', 'dia_mes', 'trimestre', 'es_fin_semana', 
-                   'producto_id', 'categoria', 'precio_promedio', 'cantidad']
-        
         importancias = self.model.feature_importances_
         
         return [
             {'feature': feat, 'importancia': float(imp)}
-            for feat, imp in zip(features, importancias)
+            for feat, imp in zip(FEATURES, importancias)
         ]
     
+    def _huella_archivo(self):
+        """
+        Calcula la huella del modelo en disco a partir de su mtime y tamaño
+        """
+        try:
+            stat = os.stat(self.model_path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    
+    def huella_modelo(self):
+        """
+        Retorna la huella del modelo vigente. Si otro proceso guardó un modelo
+        nuevo desde la última carga, lo recarga antes de responder
+        """
+        huella = self._huella_archivo()
+        if huella is not None and huella != self.huella:
+            self.load_model()
+        return self.huella
+    
     def save_model(self):
         """
         Guarda el modelo entrenado
         """
         if self.model is not None:
-            joblib.dump(self.model, self.model_path)
+            # Se escribe a un temporal y se reemplaza de forma atómica para que
+            # los demás procesos nunca lean un archivo a medio escribir
+            tmp_path = f"{self.model_path}.{os.getpid()}.tmp"
+            joblib.dump(self.model, tmp_path)
+            os.replace(tmp_path, self.model_path)
+            # La nueva huella invalida los pronósticos cacheados del modelo anterior
+            self.huella = self._huella_archivo()
             print(f"Modelo guardado en {self.model_path}")
     
     def load_model(self):
         """
         Carga el modelo guardado
         """
+        self._carga_intentada = True
         if os.path.exists(self.model_path):
             try:
-                self.model = joblib.load(self.model_path)
-                self.is_trained = True
+                huella = self._huella_archivo()
+                self._model = joblib.load(self.model_path)
+                self.huella = huella
                 print("Modelo cargado exitosamente")
             except Exception as e:
                 print(f"Error cargando modelo: {e}")
-                self.is_trained = False
+                self._model = None
         else:
             print("No se encontró modelo guardado")
-            self.is_trained = False
+            self._model = None
 
 
 # Instancia global del predictor
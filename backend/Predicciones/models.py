@@ -14,3 +14,39 @@ class PrediccionVentas(models.Model):
     
     def __str__(self):
         return f"Predicción {self.fecha_prediccion} - ${self.monto_predicho}"
+
+
+class TrabajoEntrenamiento(models.Model):
+    """Entrenamiento del modelo de ventas ejecutado en segundo plano"""
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+    ESTADOS_ACTIVOS = ['pendiente', 'en_proceso']
+    
+    modelo = models.CharField(max_length=50, default='ventas')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    usar_datos_reales = models.BooleanField(default=True)
+    incremental = models.BooleanField(default=False)
+    metricas = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'trabajo_entrenamiento'
+        ordering = ['-fecha_creacion']
+        constraints = [
+            # Como máximo un entrenamiento pendiente o en proceso por modelo
+            models.UniqueConstraint(
+                fields=['modelo'],
+                condition=models.Q(estado__in=['pendiente', 'en_proceso']),
+                name='trabajo_entrenamiento_activo_unico',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Entrenamiento #{self.id} - {self.estado}"
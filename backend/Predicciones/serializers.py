@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import PrediccionVentas
+from .models import PrediccionVentas, TrabajoEntrenamiento
 
 class PrediccionVentasSerializer(serializers.ModelSerializer):
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
@@ -9,3 +9,11 @@ class PrediccionVentasSerializer(serializers.ModelSerializer):
         fields = ['id', 'fecha_prediccion', 'monto_predicho', 'categoria', 'categoria_nombre', 
                   'fecha_generacion', 'modelo_usado']
         read_only_fields = ['fecha_generacion']
+
+
+class TrabajoEntrenamientoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrabajoEntrenamiento
+        fields = ['id', 'modelo', 'estado', 'usar_datos_reales', 'incremental', 'metricas', 'error',
+                  'fecha_creacion', 'fecha_inicio', 'fecha_fin']
+        read_only_fields = fields
@@ -0,0 +1,97 @@
+"""
+Cola de entrenamientos del modelo de ventas
+
+Las vistas sólo encolan un TrabajoEntrenamiento; el comando
+`python manage.py procesar_entrenamientos` los toma de la tabla y entrena en un
+proceso aparte, de modo que ningún worker de gunicorn queda bloqueado ajustando
+el Random Forest.
+"""
+
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import TrabajoEntrenamiento
+
+
+def encolar_entrenamiento(usar_datos_reales=True, incremental=False):
+    """
+    Encola un entrenamiento. Si ya hay uno pendiente o en proceso se retorna ese
+    mismo trabajo, así varias peticiones simultáneas nunca disparan entrenamientos
+    en paralelo.
+    Retorna (trabajo, creado)
+    """
+    while True:
+        activo = TrabajoEntrenamiento.objects.filter(
+            estado__in=TrabajoEntrenamiento.ESTADOS_ACTIVOS
+        ).first()
+        if activo is not None:
+            return activo, False
+
+        try:
+            with transaction.atomic():
+                trabajo = TrabajoEntrenamiento.objects.create(
+                    usar_datos_reales=usar_datos_reales,
+                    incremental=incremental
+                )
+            return trabajo, True
+        except IntegrityError:
+            # Otra petición encoló un trabajo entre la consulta y el insert
+            continue
+
+
+def tomar_siguiente_trabajo():
+    """
+    Marca como 'en_proceso' el trabajo pendiente más antiguo y lo retorna
+    """
+    with transaction.atomic():
+        trabajo = TrabajoEntrenamiento.objects.select_for_update(skip_locked=True).filter(
+            estado='pendiente'
+        ).order_by('fecha_creacion').first()
+
+        if trabajo is None:
+            return None
+
+        trabajo.estado = 'en_proceso'
+        trabajo.fecha_inicio = timezone.now()
+        trabajo.save(update_fields=['estado', 'fecha_inicio'])
+        return trabajo
+
+
+def finalizar_trabajo(trabajo, metricas=None, error=None):
+    """
+    Registra el resultado de un trabajo
+    """
+    trabajo.estado = 'fallido' if error else 'completado'
+    trabajo.metricas = metricas
+    trabajo.error = error
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save(update_fields=['estado', 'metricas', 'error', 'fecha_fin'])
+
+
+def liberar_trabajos_colgados(timeout):
+    """
+    Marca como fallidos los trabajos 'en_proceso' iniciados hace más de `timeout`
+    segundos (p. ej. si el worker se detuvo a mitad del entrenamiento), para que no
+    bloqueen la cola
+    """
+    limite = timezone.now() - timedelta(seconds=timeout)
+    return TrabajoEntrenamiento.objects.filter(
+        estado='en_proceso',
+        fecha_inicio__lt=limite
+    ).update(
+        estado='fallido',
+        error='Entrenamiento interrumpido',
+        fecha_fin=timezone.now()
+    )
+
+
+def ejecutar_entrenamiento(usar_datos_reales, incremental=False):
+    """
+    Entrena y guarda el modelo. Se ejecuta dentro de un proceso del pool del
+    comando procesar_entrenamientos
+    """
+    from .ml_service import predictor
+
+    if incremental:
+        return predictor.entrenar_incremental()
+    return predictor.entrenar_modelo(usar_datos_reales=usar_datos_reales)
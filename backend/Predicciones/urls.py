@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PrediccionVentasViewSet, dashboard_data
+from .views import PrediccionVentasViewSet, TrabajoEntrenamientoViewSet, dashboard_data, predecir_lote
 
 router = DefaultRouter()
 router.register(r'predicciones', PrediccionVentasViewSet, basename='prediccion')
+router.register(r'trabajos', TrabajoEntrenamientoViewSet, basename='trabajo-entrenamiento')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('dashboard/', dashboard_data, name='dashboard_data'),
+    path('predecir_lote/', predecir_lote, name='predecir_lote'),
 ]
@@ -1,16 +1,46 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 from django.db.models import Sum, Count, Avg
 from django.db.models.functions import TruncMonth, TruncDate
+from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import PrediccionVentas
-from .serializers import PrediccionVentasSerializer
+import json
+from .models import PrediccionVentas, TrabajoEntrenamiento
+from .serializers import PrediccionVentasSerializer, TrabajoEntrenamientoSerializer
 from .ml_service import predictor
-from Ventas.models import Venta
+from .cache import obtener_pronostico
+from .trabajos import encolar_entrenamiento
+from Ventas.models import ResumenVentaDiario, ResumenProductoDiario
 from Producto.models import Producto
 
 
+# Horizonte máximo del pronóstico por lote (la grilla crece con productos × días)
+MAX_DIAS_LOTE = 365
+
+def modelo_disponible():
+    """
+    Indica si hay un modelo entrenado, recargándolo si otro proceso
+    (p. ej. el worker de entrenamientos) guardó uno nuevo
+    """
+    predictor.huella_modelo()
+    return predictor.is_trained
+
+
+def respuesta_modelo_no_entrenado():
+    """
+    Encola un entrenamiento (o reutiliza el que está en curso) y responde 503
+    mientras el modelo no esté disponible
+    """
+    trabajo, _ = encolar_entrenamiento()
+    return Response({
+        'success': False,
+        'error': 'El modelo aún no está entrenado. Se está entrenando, intente nuevamente en unos minutos',
+        'trabajo': TrabajoEntrenamientoSerializer(trabajo).data
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 class PrediccionVentasViewSet(viewsets.ModelViewSet):
     queryset = PrediccionVentas.objects.all()
     serializer_class = PrediccionVentasSerializer
@@ -18,18 +48,24 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def entrenar_modelo(self, request):
         """
-        Entrena el modelo de IA con datos históricos
+        Encola el entrenamiento del modelo de IA con datos históricos
+        (completo, o sólo con las ventas nuevas si incremental=true).
+        El estado se consulta en /api/predicciones/trabajos/{id}/
         """
         try:
             usar_datos_reales = request.data.get('usar_datos_reales', True)
+            incremental = request.data.get('incremental', False)
             
-            resultados = predictor.entrenar_modelo(usar_datos_reales=usar_datos_reales)
+            trabajo, creado = encolar_entrenamiento(
+                usar_datos_reales=usar_datos_reales,
+                incremental=incremental
+            )
             
             return Response({
                 'success': True,
-                'message': 'Modelo entrenado exitosamente',
-                'metricas': resultados
-            }, status=status.HTTP_200_OK)
+                'message': 'Entrenamiento encolado' if creado else 'Ya hay un entrenamiento en curso',
+                'trabajo': TrabajoEntrenamientoSerializer(trabajo).data
+            }, status=status.HTTP_202_ACCEPTED)
         
         except Exception as e:
             return Response({
@@ -45,11 +81,13 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
         try:
             dias = int(request.query_params.get('dias', 30))
             
-            if not predictor.is_trained:
-                # Entrenar automáticamente si no está entrenado
-                predictor.entrenar_modelo()
+            if not modelo_disponible():
+                return respuesta_modelo_no_entrenado()
             
-            predicciones = predictor.predecir_ventas_futuras(dias=dias)
+            predicciones = obtener_pronostico(
+                'predecir_futuro', dias,
+                lambda: predictor.predecir_ventas_futuras(dias=dias)
+            )
             
             return Response({
                 'success': True,
@@ -77,10 +115,14 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
                     'error': 'producto_id es requerido'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            if not predictor.is_trained:
-                predictor.entrenar_modelo()
+            if not modelo_disponible():
+                return respuesta_modelo_no_entrenado()
             
-            predicciones = predictor.predecir_por_producto(int(producto_id), dias=dias)
+            predicciones = obtener_pronostico(
+                'predecir_por_producto', dias,
+                lambda: predictor.predecir_por_producto(int(producto_id), dias=dias),
+                producto_id=int(producto_id)
+            )
             
             return Response({
                 'success': True,
@@ -102,10 +144,13 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
         try:
             meses = int(request.query_params.get('meses', 6))
             
-            if not predictor.is_trained:
-                predictor.entrenar_modelo()
+            if not modelo_disponible():
+                return respuesta_modelo_no_entrenado()
             
-            predicciones = predictor.predecir_mensual(meses=meses)
+            predicciones = obtener_pronostico(
+                'predecir_mensual', meses,
+                lambda: predictor.predecir_mensual(meses=meses)
+            )
             
             return Response({
                 'success': True,
@@ -124,11 +169,12 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
         Retorna métricas y estado del modelo
         """
         try:
+            modelo_entrenado = modelo_disponible()
             importancias = predictor.obtener_importancia_features()
             
             return Response({
                 'success': True,
-                'modelo_entrenado': predictor.is_trained,
+                'modelo_entrenado': modelo_entrenado,
                 'importancia_features': importancias
             }, status=status.HTTP_200_OK)
         
@@ -148,15 +194,13 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
             
             if periodo == 'diario':
                 # Últimos 30 días
-                fecha_inicio = datetime.now() - timedelta(days=30)
-                ventas = Venta.objects.filter(
-                    fecha_venta__gte=fecha_inicio
-                ).annotate(
-                    fecha=TruncDate('fecha_venta')
+                fecha_inicio = timezone.localdate() - timedelta(days=30)
+                ventas = ResumenVentaDiario.objects.filter(
+                    fecha__gte=fecha_inicio
                 ).values('fecha').annotate(
                     total=Sum('monto_total'),
-                    cantidad=Count('id')
-                ).order_by('fecha')
+                    cantidad=Sum('cantidad_ventas')
+                ).filter(cantidad__gt=0).order_by('fecha')
                 
                 data = [
                     {
@@ -169,23 +213,22 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
             
             else:  # mensual
                 # Últimos 12 meses
-                fecha_inicio = datetime.now() - timedelta(days=365)
-                ventas = Venta.objects.filter(
-                    fecha_venta__gte=fecha_inicio
+                fecha_inicio = timezone.localdate() - timedelta(days=365)
+                ventas = ResumenVentaDiario.objects.filter(
+                    fecha__gte=fecha_inicio
                 ).annotate(
-                    mes=TruncMonth('fecha_venta')
+                    mes=TruncMonth('fecha')
                 ).values('mes').annotate(
                     total=Sum('monto_total'),
-                    cantidad=Count('id'),
-                    promedio=Avg('monto_total')
-                ).order_by('mes')
+                    cantidad=Sum('cantidad_ventas')
+                ).filter(cantidad__gt=0).order_by('mes')
                 
                 data = [
                     {
                         'mes': v['mes'].strftime('%Y-%m'),
                         'total': float(v['total']),
                         'cantidad': v['cantidad'],
-                        'promedio': float(v['promedio'])
+                        'promedio': float(v['total']) / v['cantidad']
                     }
                     for v in ventas
                 ]
@@ -208,17 +251,15 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
         Retorna los productos más vendidos
         """
         try:
-            from Ventas.models import VentaDetalle
-            
             limite = int(request.query_params.get('limite', 10))
             
-            productos = VentaDetalle.objects.values(
+            productos = ResumenProductoDiario.objects.values(
                 'producto__id',
                 'producto__nombre',
                 'producto__precio'
             ).annotate(
                 cantidad_total=Sum('cantidad'),
-                ventas_total=Sum('subtotal')
+                ventas_total=Sum('monto_total')
             ).order_by('-cantidad_total')[:limite]
             
             data = [
@@ -244,26 +285,31 @@ class PrediccionVentasViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class TrabajoEntrenamientoViewSet(viewsets.ReadOnlyModelViewSet):
+    """Consulta del estado de los entrenamientos encolados"""
+    queryset = TrabajoEntrenamiento.objects.all()
+    serializer_class = TrabajoEntrenamientoSerializer
+
+
 @api_view(['GET'])
 def dashboard_data(request):
     """
     Endpoint unificado para obtener todos los datos del dashboard
     """
     try:
-        # Entrenar modelo si no está entrenado
-        if not predictor.is_trained:
-            predictor.entrenar_modelo()
+        if not modelo_disponible():
+            return respuesta_modelo_no_entrenado()
         
         # Obtener ventas históricas mensuales
-        fecha_inicio = datetime.now() - timedelta(days=365)
-        ventas_historicas = Venta.objects.filter(
-            fecha_venta__gte=fecha_inicio
+        fecha_inicio = timezone.localdate() - timedelta(days=365)
+        ventas_historicas = ResumenVentaDiario.objects.filter(
+            fecha__gte=fecha_inicio
         ).annotate(
-            mes=TruncMonth('fecha_venta')
+            mes=TruncMonth('fecha')
         ).values('mes').annotate(
             total_ventas=Sum('monto_total'),
-            cantidad=Count('id')
-        ).order_by('mes')
+            cantidad=Sum('cantidad_ventas')
+        ).filter(cantidad__gt=0).order_by('mes')
         
         historico = [
             {
@@ -275,14 +321,19 @@ def dashboard_data(request):
         ]
         
         # Predicciones mensuales
-        predicciones_mensuales = predictor.predecir_mensual(meses=6)
+        predicciones_mensuales = obtener_pronostico(
+            'predecir_mensual', 6,
+            lambda: predictor.predecir_mensual(meses=6)
+        )
         
         # Predicciones diarias (próximos 30 días)
-        predicciones_diarias = predictor.predecir_ventas_futuras(dias=30)
+        predicciones_diarias = obtener_pronostico(
+            'predecir_futuro', 30,
+            lambda: predictor.predecir_ventas_futuras(dias=30)
+        )
         
         # Productos más vendidos
-        from Ventas.models import VentaDetalle
-        productos_top = VentaDetalle.objects.values(
+        productos_top = ResumenProductoDiario.objects.values(
             'producto__id',
             'producto__nombre'
         ).annotate(
@@ -311,3 +362,56 @@ def dashboard_data(request):
             'success': False,
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+def predecir_lote(request):
+    """
+    Pronóstico diario de varios productos en una sola petición.
+    Body: {"producto_ids": [...], "categoria_ids": [...], "dias": 30}
+    Se pronostican los productos indicados más todos los de las categorías
+    indicadas. La respuesta se transmite como NDJSON, una línea por producto
+    """
+    producto_ids = request.data.get('producto_ids') or []
+    categoria_ids = request.data.get('categoria_ids') or []
+    
+    try:
+        if not isinstance(producto_ids, list) or not isinstance(categoria_ids, list):
+            raise TypeError
+        dias = int(request.data.get('dias', 30))
+        producto_ids = [int(producto_id) for producto_id in producto_ids]
+        categoria_ids = [int(categoria_id) for categoria_id in categoria_ids]
+    except (TypeError, ValueError):
+        return Response({
+            'success': False,
+            'error': 'dias, producto_ids y categoria_ids deben ser números enteros'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not producto_ids and not categoria_ids:
+        return Response({
+            'success': False,
+            'error': 'Debe indicar producto_ids o categoria_ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not 1 <= dias <= MAX_DIAS_LOTE:
+        return Response({
+            'success': False,
+            'error': f'dias debe estar entre 1 y {MAX_DIAS_LOTE}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        if not modelo_disponible():
+            return respuesta_modelo_no_entrenado()
+        
+        productos = predictor.datos_productos(producto_ids, categoria_ids)
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    lineas = (
+        json.dumps(resultado) + '\n'
+        for resultado in predictor.predecir_lote(productos, dias=dias)
+    )
+    return StreamingHttpResponse(lineas, content_type='application/x-ndjson')
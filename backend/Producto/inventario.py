@@ -0,0 +1,170 @@
+"""
+Operaciones de stock compartidas por las ventas y los movimientos de inventario
+
+Todas las funciones deben llamarse dentro de transaction.atomic(): los productos
+quedan bloqueados (SELECT ... FOR UPDATE) hasta que la transacción termina.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import MovimientoInventario, Producto, ReservaStock
+
+
+class StockInsuficiente(Exception):
+    """No hay unidades suficientes de un producto"""
+
+    def __init__(self, producto, solicitado):
+        self.producto = producto
+        self.solicitado = solicitado
+        # Con reservas (productos_disponibles) lo disponible es menos que el stock
+        self.disponible = max(getattr(producto, 'disponible', producto.stock), 0)
+        super().__init__(
+            f'Stock insuficiente para {producto.nombre}. '
+            f'Solo hay {self.disponible} unidades disponibles'
+        )
+
+
+class ProductoNoExiste(Exception):
+    """Se pidió stock de un producto inexistente"""
+
+    def __init__(self, producto_id):
+        self.producto_id = producto_id
+        super().__init__(f'Producto con ID {producto_id} no existe')
+
+
+def bloquear_productos(producto_ids):
+    """
+    Bloquea los productos con SELECT ... FOR UPDATE, siempre en orden de id para
+    que dos ventas concurrentes no se bloqueen mutuamente, y los retorna como
+    {id: Producto}. Una sola consulta
+    """
+    return Producto.objects.select_for_update().order_by('id').in_bulk(list(producto_ids))
+
+
+def productos_disponibles(producto_ids, usuario_id=None):
+    """
+    Como bloquear_productos, pero cada Producto trae `disponible`: su stock menos
+    las reservas vigentes (Producto/reservas.py) de los demás usuarios, sumadas en
+    la misma consulta sobre el índice (producto, vence)
+    """
+    reservas = ReservaStock.objects.filter(producto=OuterRef('pk'), vence__gt=timezone.now())
+    if usuario_id is not None:
+        reservas = reservas.exclude(usuario_id=usuario_id)
+    reservado = Subquery(
+        reservas.order_by().values('producto').annotate(total=Sum('cantidad')).values('total')
+    )
+    productos = Producto.objects.select_for_update().order_by('id').annotate(
+        reservado=Coalesce(reservado, 0)
+    ).in_bulk(list(producto_ids))
+    for producto in productos.values():
+        producto.disponible = producto.stock - producto.reservado
+    return productos
+
+
+def descontar_stock(cantidades, usuario_id=None):
+    """
+    Descuenta stock de varios productos. `cantidades` es {producto_id: unidades}.
+    Bloquea los productos, valida el stock en memoria y descuenta todo con un único
+    UPDATE condicional (stock >= unidades) con CASE sobre F('stock'). Con
+    `usuario_id` se valida contra lo disponible para ese usuario (sin las reservas
+    de los demás). Retorna {id: Producto} con los datos leídos antes del descuento.
+    Lanza ProductoNoExiste o StockInsuficiente sin modificar nada
+    """
+    cantidades = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad}
+    if usuario_id is None:
+        productos = bloquear_productos(cantidades.keys())
+    else:
+        productos = productos_disponibles(cantidades.keys(), usuario_id)
+
+    for producto_id, cantidad in sorted(cantidades.items()):
+        producto = productos.get(producto_id)
+        if producto is None:
+            raise ProductoNoExiste(producto_id)
+        if getattr(producto, 'disponible', producto.stock) < cantidad:
+            raise StockInsuficiente(producto, cantidad)
+
+    if not cantidades:
+        return productos
+
+    # La condición stock >= unidades es una segunda defensa contra vender de más:
+    # si alguna fila no la cumple, el número de filas actualizadas no coincide
+    condicion = Q()
+    for producto_id, cantidad in cantidades.items():
+        condicion |= Q(id=producto_id, stock__gte=cantidad)
+
+    actualizados = Producto.objects.filter(condicion).update(
+        stock=Case(
+            *[When(id=producto_id, then=F('stock') - cantidad)
+              for producto_id, cantidad in cantidades.items()],
+            default=F('stock')
+        )
+    )
+    if actualizados != len(cantidades):
+        # Con los productos bloqueados no debería ocurrir; la excepción revierte la
+        # transacción del llamador, incluido el descuento parcial
+        producto_id = min(cantidades)
+        raise StockInsuficiente(productos[producto_id], cantidades[producto_id])
+
+    return productos
+
+
+def aplicar_movimientos(movimientos):
+    """
+    Libro de inventario: guarda los movimientos (MovimientoInventario sin guardar)
+    y aplica su efecto en el stock, todo en una transacción. Entrada suma, salida
+    resta y ajuste fija el stock en `cantidad`; los de un mismo producto se
+    aplican en orden y ninguna salida puede dejar el stock negativo.
+
+    Bloquea los productos en orden de id, actualiza todos con un único UPDATE
+    condicional con CASE sobre F('stock') y guarda los movimientos con un
+    bulk_create: cuatro consultas sin importar cuántas líneas tenga el lote.
+    Retorna {id: Producto} con el stock resultante (y asigna `producto` a cada
+    movimiento). Lanza ProductoNoExiste o StockInsuficiente sin modificar nada
+    """
+    with transaction.atomic():
+        productos = bloquear_productos({movimiento.producto_id for movimiento in movimientos})
+
+        fijados = {}  # producto_id: stock fijado por su último ajuste
+        sumas = {}    # producto_id: unidades sumadas desde el inicio o desde ese ajuste
+        for movimiento in movimientos:
+            producto_id = movimiento.producto_id
+            producto = productos.get(producto_id)
+            if producto is None:
+                raise ProductoNoExiste(producto_id)
+            actual = fijados.get(producto_id, producto.stock) + sumas.get(producto_id, 0)
+            if movimiento.tipo_movimiento == 'ajuste':
+                fijados[producto_id] = movimiento.cantidad
+                sumas[producto_id] = 0
+            elif movimiento.tipo_movimiento == 'entrada':
+                sumas[producto_id] = sumas.get(producto_id, 0) + movimiento.cantidad
+            else:
+                if actual < movimiento.cantidad:
+                    producto.disponible = actual
+                    raise StockInsuficiente(producto, movimiento.cantidad)
+                sumas[producto_id] = sumas.get(producto_id, 0) - movimiento.cantidad
+            movimiento.producto = producto
+
+        # Los ajustes fijan un valor; el resto suma sobre F('stock') con la condición
+        # de no quedar negativo como segunda defensa, igual que descontar_stock
+        casos = []
+        condicion = Q()
+        for producto_id, suma in sumas.items():
+            if producto_id in fijados:
+                casos.append(When(id=producto_id, then=Value(fijados[producto_id] + suma)))
+                condicion |= Q(id=producto_id)
+            else:
+                casos.append(When(id=producto_id, then=F('stock') + suma))
+                condicion |= Q(id=producto_id, stock__gte=-suma) if suma < 0 else Q(id=producto_id)
+        if casos:
+            actualizados = Producto.objects.filter(condicion).update(stock=Case(*casos, default=F('stock')))
+            if actualizados != len(casos):
+                producto_id = min(sumas)
+                raise StockInsuficiente(productos[producto_id], -sumas[producto_id])
+
+        MovimientoInventario.objects.bulk_create(movimientos)
+
+    for producto_id, suma in sumas.items():
+        productos[producto_id].stock = fijados.get(producto_id, productos[producto_id].stock) + suma
+    return productos
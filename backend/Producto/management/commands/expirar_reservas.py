@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from Producto.reservas import LOTE_EXPIRAR, expirar
+
+
+class Command(BaseCommand):
+    help = "Borra las reservas de stock vencidas (conviene ejecutarlo cada pocos minutos)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_EXPIRAR,
+                            help='Reservas borradas por cada DELETE')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor que cero")
+
+        borradas = expirar(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{borradas} reservas vencidas eliminadas"))
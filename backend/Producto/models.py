@@ -64,6 +64,42 @@ class MovimientoInventario(models.Model):
     class Meta:
         db_table = 'movimiento_inventario'
         ordering = ['-fecha_movimiento']
+        indexes = [
+            # Orden de la paginación por cursor del listado
+            models.Index(fields=['-fecha_movimiento', '-id'], name='movimiento_fecha_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tipo_movimiento} - {self.producto.nombre} - {self.cantidad}"
+
+
+class ReservaStock(models.Model):
+    """
+    Unidades de un producto apartadas por un usuario hasta `vence` (ver
+    Producto/reservas.py). Una por usuario y producto
+    """
+    ORIGEN_CHOICES = [
+        ('carrito', 'Carrito'),
+        ('pago', 'Pago'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    usuario = models.ForeignKey('Usuarios.Usuario', on_delete=models.CASCADE, related_name='reservas_stock')
+    cantidad = models.PositiveIntegerField()
+    vence = models.DateTimeField()
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES, default='carrito')
+
+    class Meta:
+        db_table = 'reserva_stock'
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'usuario'], name='reserva_producto_usuario_uniq'),
+        ]
+        indexes = [
+            # Suma de las reservas vigentes de un producto
+            models.Index(fields=['producto', 'vence'], name='reserva_producto_vence_idx'),
+            # Barrido de las vencidas
+            models.Index(fields=['vence'], name='reserva_vence_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} - {self.usuario_id} - {self.cantidad}"
@@ -0,0 +1,89 @@
+"""
+Reservas de stock de los carritos
+
+Al agregar un producto al carrito (o cambiar su cantidad) el usuario reserva esas
+unidades por TTL_RESERVA_CARRITO segundos; al crear la sesión o el intento de pago
+de Stripe las reservas del carrito se extienden a TTL_RESERVA_PAGO. Hay una
+reserva por usuario y producto, con la cantidad que tiene en el carrito.
+
+Lo disponible de un producto para un usuario es su stock menos las reservas
+vigentes de los demás (productos_disponibles en Producto/inventario.py). El
+checkout valida contra eso y libera las reservas del comprador.
+
+Las reservas vencidas dejan de contar en el momento, aunque sigan en la tabla;
+el comando expirar_reservas las borra por lotes y conviene ejecutarlo cada pocos
+minutos (cron).
+"""
+
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .inventario import ProductoNoExiste, StockInsuficiente, productos_disponibles
+from .models import ReservaStock
+
+
+TTL_RESERVA_CARRITO = 15 * 60
+
+# Las sesiones de Stripe Checkout duran al menos 30 minutos
+TTL_RESERVA_PAGO = 30 * 60
+
+# Reservas borradas por cada DELETE del barrido
+LOTE_EXPIRAR = 5000
+
+
+def reservar(usuario_id, cantidades, ttl=TTL_RESERVA_CARRITO, origen='carrito'):
+    """
+    Fija las reservas del usuario en {producto_id: cantidad} (0 la libera). Bloquea
+    los productos y, si alguno no tiene disponible suficiente, lanza
+    StockInsuficiente (con `disponible`) o ProductoNoExiste sin modificar nada
+    """
+    pedidas = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad > 0}
+    liberadas = [producto_id for producto_id, cantidad in cantidades.items() if cantidad <= 0]
+
+    with transaction.atomic():
+        if pedidas:
+            productos = productos_disponibles(pedidas, usuario_id)
+            for producto_id, cantidad in sorted(pedidas.items()):
+                producto = productos.get(producto_id)
+                if producto is None:
+                    raise ProductoNoExiste(producto_id)
+                if producto.disponible < cantidad:
+                    raise StockInsuficiente(producto, cantidad)
+
+            vence = timezone.now() + timedelta(seconds=ttl)
+            ReservaStock.objects.bulk_create(
+                [
+                    ReservaStock(producto_id=producto_id, usuario_id=usuario_id, cantidad=cantidad, vence=vence, origen=origen)
+                    for producto_id, cantidad in pedidas.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['producto', 'usuario'],
+                update_fields=['cantidad', 'vence', 'origen'],
+            )
+        if liberadas:
+            liberar(usuario_id, liberadas)
+
+
+def liberar(usuario_id, producto_ids=None):
+    """
+    Borra las reservas del usuario (solo las de `producto_ids` si se indican).
+    Retorna cuántas borró
+    """
+    reservas = ReservaStock.objects.filter(usuario_id=usuario_id)
+    if producto_ids is not None:
+        reservas = reservas.filter(producto_id__in=list(producto_ids))
+    return reservas.delete()[0]
+
+
+def expirar(lote=LOTE_EXPIRAR):
+    """
+    Borra las reservas vencidas en lotes de `lote` filas, para no bloquear la
+    tabla en un solo DELETE largo. Retorna cuántas borró
+    """
+    ahora = timezone.now()
+    borradas = 0
+    while True:
+        ids = list(ReservaStock.objects.filter(vence__lte=ahora).values_list('pk', flat=True)[:lote])
+        if not ids:
+            return borradas
+        borradas += ReservaStock.objects.filter(pk__in=ids).delete()[0]
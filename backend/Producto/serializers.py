@@ -32,6 +32,10 @@ class ProductoSerializer(serializers.ModelSerializer):
 
 
 class MovimientoInventarioSerializer(serializers.ModelSerializer):
+    # Ids sin consultar cada uno: el libro de inventario valida los productos de un
+    # lote con una sola consulta (ver Producto/inventario.py)
+    producto = serializers.IntegerField(source='producto_id')
+    usuario_responsable = serializers.IntegerField(source='usuario_responsable_id', required=False, allow_null=True)
     producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
     usuario_username = serializers.CharField(source='usuario_responsable.username', read_only=True)
     
@@ -40,3 +44,12 @@ class MovimientoInventarioSerializer(serializers.ModelSerializer):
         fields = ['id', 'producto', 'producto_nombre', 'tipo_movimiento', 'cantidad', 
                   'fecha_movimiento', 'usuario_responsable', 'usuario_username', 'motivo']
         read_only_fields = ['fecha_movimiento']
+    
+    def validate(self, data):
+        tipo = data.get('tipo_movimiento', getattr(self.instance, 'tipo_movimiento', None))
+        cantidad = data.get('cantidad', getattr(self.instance, 'cantidad', 0))
+        if tipo == 'ajuste' and cantidad < 0:
+            raise serializers.ValidationError('La cantidad de un ajuste no puede ser negativa')
+        if tipo in ('entrada', 'salida') and cantidad <= 0:
+            raise serializers.ValidationError('La cantidad debe ser mayor que cero')
+        return data
@@ -0,0 +1,191 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+from Carrito import almacen
+from Usuarios import autenticacion
+from Usuarios.jwt_utils import generate_token
+from Usuarios.models import Usuario
+from .inventario import StockInsuficiente, aplicar_movimientos, descontar_stock
+from .models import MovimientoInventario, Producto, ReservaStock
+from .reservas import expirar, liberar, reservar
+
+
+class ReservasStockTest(TestCase):
+    """Lo reservado por un usuario no está disponible para los demás hasta que vence"""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Producto', precio='2.50', stock=10)
+        self.ana, self.beto = Usuario.objects.bulk_create([
+            Usuario(username='ana', correo='ana@test.com', password='clave'),
+            Usuario(username='beto', correo='beto@test.com', password='clave'),
+        ])
+
+    def test_reserva_de_otro_descuenta_disponible(self):
+        reservar(self.ana.id, {self.producto.id: 8})
+        with self.assertRaises(StockInsuficiente) as error:
+            reservar(self.beto.id, {self.producto.id: 3})
+        self.assertEqual(error.exception.disponible, 2)
+
+        # La reserva propia no cuenta: Ana puede subir hasta el stock
+        reservar(self.ana.id, {self.producto.id: 10})
+        self.assertEqual(ReservaStock.objects.get(usuario=self.ana).cantidad, 10)
+
+        reservar(self.ana.id, {self.producto.id: 0})
+        reservar(self.beto.id, {self.producto.id: 10})
+        self.assertEqual(list(ReservaStock.objects.values_list('usuario_id', 'cantidad')), [(self.beto.id, 10)])
+
+    def test_checkout_respeta_reservas(self):
+        reservar(self.ana.id, {self.producto.id: 9})
+        with self.assertRaises(StockInsuficiente):
+            descontar_stock({self.producto.id: 2}, usuario_id=self.beto.id)
+        descontar_stock({self.producto.id: 9}, usuario_id=self.ana.id)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+        self.assertEqual(liberar(self.ana.id), 1)
+
+    def test_reservas_vencidas(self):
+        reservar(self.ana.id, {self.producto.id: 10})
+        ReservaStock.objects.update(vence=timezone.now() - timedelta(seconds=1))
+        # Vencida ya no cuenta, aunque el barrido todavía no la haya borrado
+        reservar(self.beto.id, {self.producto.id: 10})
+
+        salida = StringIO()
+        call_command('expirar_reservas', stdout=salida)
+        self.assertIn('1 reservas vencidas eliminadas', salida.getvalue())
+        self.assertEqual(list(ReservaStock.objects.values_list('usuario_id', flat=True)), [self.beto.id])
+        self.assertEqual(expirar(), 0)
+
+    def test_agregar_al_carrito_reserva(self):
+        almacen._productos.clear()
+        admin = Usuario.objects.create(username='admin', correo='admin@test.com', password='clave', tipo_usuario='admin')
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(admin)}')
+
+        def agregar(usuario, cantidad):
+            return api.post('/api/carritos/agregar_item/', {
+                'usuario_id': usuario.id, 'producto_id': self.producto.id, 'cantidad': cantidad
+            }, format='json')
+
+        self.assertEqual(agregar(self.ana, 7).status_code, 200)
+        respuesta = agregar(self.beto, 4)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Solo hay 3 unidades', respuesta.data['error'])
+
+        api.post('/api/carritos/vaciar/', {'usuario_id': self.ana.id}, format='json')
+        self.assertEqual(agregar(self.beto, 4).status_code, 200)
+
+
+class LibroInventarioTest(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create(username='admin', correo='admin@test.com', password='clave', tipo_usuario='admin')
+        token = f'Bearer {generate_token(self.usuario)}'
+        autenticacion._local.clear()
+        autenticacion.autenticar(token)  # Versión de sesión ya cacheada: no suma consultas
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=token)
+        self.productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', precio='1.00', stock=10) for i in range(50)
+        ])
+
+    def recepcion(self, lineas):
+        return [
+            {'producto': self.productos[i % 50].id, 'tipo_movimiento': 'entrada', 'cantidad': 2,
+             'usuario_responsable': self.usuario.id, 'motivo': 'Recepción'}
+            for i in range(lineas)
+        ]
+
+    def test_lote_con_consultas_constantes(self):
+        respuesta = self.api.post('/api/productos/movimientos/', self.recepcion(10), format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        # Usuarios, bloqueo de productos, UPDATE de stock e INSERT de movimientos
+        # (más el SAVEPOINT de la transacción)
+        with self.assertNumQueries(6):
+            respuesta = self.api.post('/api/productos/movimientos/', self.recepcion(100), format='json')
+        self.assertEqual(len(respuesta.data), 100)
+        self.assertEqual(respuesta.data[0]['usuario_username'], 'admin')
+
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 10 + 2 + 4)
+        self.assertEqual(MovimientoInventario.objects.count(), 110)
+
+    def test_en_orden_y_todo_o_nada(self):
+        producto = self.productos[0]
+        movimientos = [
+            MovimientoInventario(producto_id=producto.id, tipo_movimiento='salida', cantidad=10),
+            MovimientoInventario(producto_id=producto.id, tipo_movimiento='ajuste', cantidad=5),
+            MovimientoInventario(producto_id=producto.id, tipo_movimiento='entrada', cantidad=3),
+        ]
+        self.assertEqual(aplicar_movimientos(movimientos)[producto.id].stock, 8)
+
+        with self.assertRaises(StockInsuficiente):
+            aplicar_movimientos([
+                MovimientoInventario(producto_id=self.productos[1].id, tipo_movimiento='entrada', cantidad=4),
+                MovimientoInventario(producto_id=producto.id, tipo_movimiento='salida', cantidad=9),
+            ])
+        self.assertEqual(Producto.objects.get(pk=producto.pk).stock, 8)
+        self.assertEqual(Producto.objects.get(pk=self.productos[1].pk).stock, 10)
+        self.assertEqual(MovimientoInventario.objects.count(), 3)
+
+    def test_movimientos_no_se_editan(self):
+        self.api.post('/api/productos/movimientos/', self.recepcion(1), format='json')
+        movimiento = MovimientoInventario.objects.get()
+        url = f'/api/productos/movimientos/{movimiento.id}/'
+        self.assertEqual(self.api.patch(url, {'producto': 999999}, format='json').status_code, 405)
+        self.assertEqual(self.api.delete(url).status_code, 405)
+        self.assertEqual(self.api.get(url).status_code, 200)
+
+    def test_ajustar_stock(self):
+        url = f'/api/productos/{self.productos[0].id}/ajustar_stock/'
+        respuesta = self.api.post(url, {'tipo_movimiento': 'salida', 'cantidad': 4, 'usuario_id': self.usuario.id}, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(respuesta.data['stock'], 6)
+
+        respuesta = self.api.post(url, {'tipo_movimiento': 'salida', 'cantidad': 7}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 6)
+        self.assertEqual(MovimientoInventario.objects.filter(producto=self.productos[0]).count(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class MovimientosConcurrentesTest(TransactionTestCase):
+    """
+    Salidas y entradas simultáneas sobre el mismo producto: ninguna se pierde y el
+    stock nunca queda negativo (requiere una BD con SELECT ... FOR UPDATE, p. ej. PostgreSQL)
+    """
+    HILOS = 60
+    STOCK = 20
+
+    def test_sin_actualizaciones_perdidas(self):
+        producto = Producto.objects.create(nombre='Producto', precio='1.00', stock=self.STOCK)
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def mover(tipo, cantidad):
+            try:
+                barrera.wait()
+                aplicar_movimientos([MovimientoInventario(producto_id=producto.id, tipo_movimiento=tipo, cantidad=cantidad)])
+                resultados.append(tipo)
+            except StockInsuficiente:
+                resultados.append('rechazado')
+            finally:
+                connection.close()
+
+        hilos = [
+            threading.Thread(target=mover, args=('salida', 3) if i % 3 else ('entrada', 2))
+            for i in range(self.HILOS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        entradas, salidas = resultados.count('entrada'), resultados.count('salida')
+        self.assertEqual(entradas, self.HILOS // 3)
+        self.assertEqual(producto.stock, self.STOCK + 2 * entradas - 3 * salidas)
+        self.assertGreaterEqual(producto.stock, 0)
+        self.assertEqual(MovimientoInventario.objects.filter(producto=producto).count(), entradas + salidas)
@@ -4,8 +4,9 @@ from .views import CategoriaViewSet, ProductoViewSet, MovimientoInventarioViewSe
 
 router = DefaultRouter()
 router.register(r'categorias', CategoriaViewSet)
-router.register(r'', ProductoViewSet)
+# Antes que el prefijo vacío: si no, /movimientos/ se toma como el detalle de un producto
 router.register(r'movimientos', MovimientoInventarioViewSet)
+router.register(r'', ProductoViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,9 +1,36 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import models
 from .models import Categoria, Producto, MovimientoInventario
 from .serializers import CategoriaSerializer, ProductoSerializer, MovimientoInventarioSerializer
+from .inventario import ProductoNoExiste, StockInsuficiente, aplicar_movimientos
+from Usuarios.models import Usuario
+
+
+def registrar_movimientos(movimientos):
+    """
+    Aplica los movimientos con el libro de inventario (Producto/inventario.py).
+    Retorna ({id: Producto}, None) o (None, Response con el error)
+    """
+    usuario_ids = {movimiento.usuario_responsable_id for movimiento in movimientos} - {None}
+    usuarios = Usuario.objects.in_bulk(list(usuario_ids)) if usuario_ids else {}
+    if len(usuarios) != len(usuario_ids):
+        return None, Response({'error': 'Usuario responsable no encontrado'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        productos = aplicar_movimientos(movimientos)
+    except ProductoNoExiste as e:
+        return None, Response({'error': 'Producto no encontrado', 'producto': e.producto_id}, status=status.HTTP_404_NOT_FOUND)
+    except StockInsuficiente as e:
+        return None, Response({
+            'error': 'Stock insuficiente para realizar la salida', 'producto': e.producto.id
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    for movimiento in movimientos:
+        movimiento.usuario_responsable = usuarios.get(movimiento.usuario_responsable_id)
+    return productos, None
+
 
 class CategoriaViewSet(viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
@@ -13,6 +40,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
 class ProductoViewSet(viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
+    orden_cursor = ('-id',)
     
     @action(detail=False, methods=['get'])
     def inventario_critico(self, request):
@@ -31,71 +59,49 @@ class ProductoViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def ajustar_stock(self, request, pk=None):
         """Ajustar stock de un producto"""
-        producto = self.get_object()
-        cantidad = request.data.get('cantidad')
-        tipo_movimiento = request.data.get('tipo_movimiento', 'ajuste')
-        motivo = request.data.get('motivo', '')
-        usuario_id = request.data.get('usuario_id')
-        
-        if tipo_movimiento == 'entrada':
-            producto.stock += int(cantidad)
-        elif tipo_movimiento == 'salida':
-            producto.stock -= int(cantidad)
-        else:  # ajuste
-            producto.stock = int(cantidad)
+        serializer = MovimientoInventarioSerializer(data={
+            'producto': pk,
+            'tipo_movimiento': request.data.get('tipo_movimiento', 'ajuste'),
+            'cantidad': request.data.get('cantidad'),
+            'usuario_responsable': request.data.get('usuario_id'),
+            'motivo': request.data.get('motivo', ''),
+        })
+        serializer.is_valid(raise_exception=True)
+        movimiento = MovimientoInventario(**serializer.validated_data)
         
-        producto.save()
+        # Stock y movimiento en una transacción, con UPDATE condicional
+        productos, error = registrar_movimientos([movimiento])
+        if error:
+            return error
         
-        # Registrar movimiento
-        MovimientoInventario.objects.create(
-            producto=producto,
-            tipo_movimiento=tipo_movimiento,
-            cantidad=cantidad,
-            usuario_responsable_id=usuario_id,
-            motivo=motivo
-        )
-        
-        return Response(self.get_serializer(producto).data)
+        return Response(self.get_serializer(productos[movimiento.producto_id]).data)
 
 
-class MovimientoInventarioViewSet(viewsets.ModelViewSet):
+class MovimientoInventarioViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                                  mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    # Los movimientos son el libro de inventario: se registran, no se editan ni se borran
     queryset = MovimientoInventario.objects.all()
     serializer_class = MovimientoInventarioSerializer
+    orden_cursor = ('-fecha_movimiento', '-id')
     
     def create(self, request, *args, **kwargs):
-        """Crear movimiento de inventario y actualizar stock automáticamente"""
-        producto_id = request.data.get('producto')
-        tipo_movimiento = request.data.get('tipo_movimiento')
-        cantidad = int(request.data.get('cantidad', 0))
+        """
+        Crear movimientos de inventario y actualizar el stock en la misma
+        transacción. Acepta un movimiento o una lista (p. ej. una recepción de
+        mercadería con cientos de líneas), que se aplica completa o no se aplica
+        """
+        lote = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=lote)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data if lote else [serializer.validated_data]
+        movimientos = [MovimientoInventario(**campos) for campos in datos]
+        
+        _, error = registrar_movimientos(movimientos)
+        if error:
+            return error
         
-        try:
-            producto = Producto.objects.get(id=producto_id)
-            
-            # Actualizar stock según tipo de movimiento
-            if tipo_movimiento == 'entrada':
-                producto.stock += cantidad
-            elif tipo_movimiento == 'salida':
-                if producto.stock < cantidad:
-                    return Response(
-                        {'error': 'Stock insuficiente para realizar la salida'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                producto.stock -= cantidad
-            elif tipo_movimiento == 'ajuste':
-                producto.stock = cantidad
-            
-            producto.save()
-            
-            # Crear el movimiento
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            self.perform_create(serializer)
-            
-            headers = self.get_success_headers(serializer.data)
-            return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-            
-        except Producto.DoesNotExist:
-            return Response({'error': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        respuesta = self.get_serializer(movimientos, many=True).data
+        return Response(respuesta if lote else respuesta[0], status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['get'])
     def por_producto(self, request):
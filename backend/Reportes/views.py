@@ -13,7 +13,7 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from reportlab.pdfgen import canvas
 from io import BytesIO
-from Ventas.models import Venta, VentaDetalle
+from Ventas.models import Venta, ResumenVentaDiario, ResumenProductoDiario
 from Producto.models import Producto
 from Cliente.models import Cliente
 
@@ -91,14 +91,21 @@ class ReporteLogViewSet(viewsets.ViewSet):
             
             if tipo_reporte == 'ventas':
                 # Reporte de ventas
+                # Hasta el final del último día, igual que los totales del resumen
                 ventas = Venta.objects.filter(
-                    fecha_venta__gte=fecha_inicio,
-                    fecha_venta__lte=fecha_fin
-                )
+                    fecha_venta__date__gte=fecha_inicio.date(),
+                    fecha_venta__date__lte=fecha_fin.date()
+                ).select_related('cliente')
                 
-                total_ventas = ventas.aggregate(total=Sum('monto_total'))['total'] or 0
-                cantidad_ventas = ventas.count()
-                promedio = ventas.aggregate(promedio=Avg('monto_total'))['promedio'] or 0
+                # Totales desde el resumen diario (días completos del período)
+                resumen = ResumenVentaDiario.objects.filter(
+                    fecha__gte=fecha_inicio.date(),
+                    fecha__lte=fecha_fin.date()
+                ).aggregate(total=Sum('monto_total'), cantidad=Sum('cantidad_ventas'))
+                
+                total_ventas = resumen['total'] or 0
+                cantidad_ventas = resumen['cantidad'] or 0
+                promedio = total_ventas / cantidad_ventas if cantidad_ventas else 0
                 
                 # Resumen ejecutivo
                 elements.append(Paragraph("RESUMEN EJECUTIVO", heading_style))
@@ -163,15 +170,15 @@ class ReporteLogViewSet(viewsets.ViewSet):
                 # Reporte de productos más vendidos
                 elements.append(Paragraph("PRODUCTOS MÁS VENDIDOS", heading_style))
                 
-                productos = VentaDetalle.objects.filter(
-                    venta__fecha_venta__gte=fecha_inicio,
-                    venta__fecha_venta__lte=fecha_fin
+                productos = ResumenProductoDiario.objects.filter(
+                    fecha__gte=fecha_inicio.date(),
+                    fecha__lte=fecha_fin.date()
                 ).values(
                     'producto__nombre',
                     'producto__precio'
                 ).annotate(
                     cantidad_vendida=Sum('cantidad'),
-                    total_ventas=Sum('subtotal')
+                    total_ventas=Sum('monto_total')
                 ).order_by('-cantidad_vendida')[:20]
                 
                 data_productos = [['Producto', 'Cantidad', 'Total Ventas']]
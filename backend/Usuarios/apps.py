@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Usuarios'
+
+    def ready(self):
+        # Invalidación de la versión de sesión cacheada
+        from . import signals  # noqa: F401
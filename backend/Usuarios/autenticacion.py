@@ -0,0 +1,155 @@
+"""
+Autenticación JWT sin consultar el usuario en cada petición
+
+El token (ver jwt_utils.generate_token) lleva, además del id y el username, el
+tipo de usuario, los roles, las máscaras de permisos por módulo y la versión de
+sesión del usuario (`ver`). Al autenticar no se carga el Usuario: request.user es
+un UsuarioToken armado con esos datos, y solo se comprueba que la versión del
+token siga siendo la del usuario.
+
+La versión (Usuario.version_token) sube al cerrar sesión o cambiar la contraseña,
+y un usuario inactivo no tiene versión válida. Se cachea en dos niveles, como los
+permisos (Permisos/cache.py): una copia por proceso de TTL_LOCAL_VERSION segundos
+y la caché 'permisos', así que una petición normal no hace ninguna consulta. Tras
+una revocación, los demás procesos la ven al vencer su copia local (o, sin Redis,
+al vencer la caché 'permisos').
+
+Los roles y permisos del token son los del momento del login, para el frontend y
+para lecturas que toleren ese retraso; las comprobaciones de acceso deben usar
+Permisos.cache, que se invalida con cada cambio.
+"""
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from rest_framework.authentication import BaseAuthentication
+from nucleo.cache_local import CacheLocal
+from .jwt_utils import decode_token
+from .models import Usuario
+
+
+# Segundos que un proceso confía en su copia de la versión de sesión
+TTL_LOCAL_VERSION = 5
+
+# Usuarios cuya versión guarda cada proceso
+MAX_VERSIONES_LOCALES = 4096
+
+# Versión cacheada de un usuario inexistente o inactivo: no coincide con ningún token
+SIN_SESION = -1
+
+_local = CacheLocal(MAX_VERSIONES_LOCALES, TTL_LOCAL_VERSION)
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+class UsuarioToken:
+    """
+    Usuario autenticado según los datos del token. `usuario` carga el modelo
+    completo cuando una vista lo necesita
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, payload):
+        self.id = self.pk = payload['id']
+        self.username = payload.get('username', '')
+        self.tipo_usuario = payload.get('tipo_usuario')
+        self.roles = payload.get('roles', [])
+        self.permisos = payload.get('permisos', {})
+        self._usuario = None
+
+    @property
+    def usuario(self):
+        if self._usuario is None:
+            self._usuario = Usuario.objects.get(pk=self.id)
+        return self._usuario
+
+    def __str__(self):
+        return self.username
+
+
+def _clave(usuario_id):
+    return f'version:{usuario_id}'
+
+
+def version_de_sesion(usuario_id):
+    """
+    Versión vigente de los tokens del usuario, o SIN_SESION si no existe o está inactivo
+    """
+    clave = _clave(usuario_id)
+    version = _local.get(clave)
+    if version is not None:
+        return version
+
+    compartida = caches['permisos']
+    version = compartida.get(clave)
+    if version is None:
+        fila = Usuario.objects.filter(pk=usuario_id).values_list('version_token', 'estado').first()
+        version = fila[0] if fila and fila[1] else SIN_SESION
+        compartida.set(clave, version)
+    _local.set(clave, version)
+    return version
+
+
+def invalidar_sesion(usuario_id):
+    """
+    Descarta la versión cacheada del usuario (al confirmar la transacción en curso)
+    """
+    def invalidar():
+        _local.delete(_clave(usuario_id))
+        caches['permisos'].delete(_clave(usuario_id))
+    transaction.on_commit(invalidar)
+
+
+def revocar_tokens(usuario_id):
+    """
+    Invalida todos los tokens emitidos hasta ahora para el usuario
+    """
+    Usuario.objects.filter(pk=usuario_id).update(version_token=F('version_token') + 1)
+    invalidar_sesion(usuario_id)
+
+
+def autenticar(encabezado):
+    """
+    Valida el encabezado Authorization ("Bearer <token>").
+    Retorna (UsuarioToken, payload) o lanza TokenInvalido con el motivo
+    """
+    if not encabezado:
+        raise TokenInvalido('Token no proporcionado')
+
+    partes = encabezado.split()
+    if len(partes) != 2 or partes[0].lower() != 'bearer':
+        raise TokenInvalido('Formato de token inválido. Use: Bearer <token>')
+
+    payload = decode_token(partes[1])
+    if payload is None or 'id' not in payload:
+        raise TokenInvalido('Token inválido o expirado')
+
+    version = version_de_sesion(payload['id'])
+    if version == SIN_SESION:
+        raise TokenInvalido('Usuario no encontrado')
+    if payload.get('ver', 0) != version:
+        raise TokenInvalido('Sesión cerrada, vuelva a iniciar sesión')
+
+    return UsuarioToken(payload), payload
+
+
+class JWTAutenticacion(BaseAuthentication):
+    """
+    Autenticación de DRF para vistas de función y viewsets. Sin token válido la
+    petición sigue como anónima: @jwt_required y las clases de permisos deciden si
+    la rechazan, así un token vencido guardado en el cliente no bloquea el login
+    """
+
+    def authenticate(self, request):
+        try:
+            return autenticar(request.headers.get('Authorization'))
+        except TokenInvalido as e:
+            # Motivo para el 401 de Permisos.acceso.PermisoPorModulo
+            request.error_token = str(e)
+            return None
+
+    def authenticate_header(self, request):
+        return 'Bearer'
@@ -1,8 +1,7 @@
 from functools import wraps
 from rest_framework.response import Response
 from rest_framework import status
-from .jwt_utils import decode_token
-from .models import Usuario
+from .autenticacion import autenticar, TokenInvalido
 
 def jwt_required(view_func):
     """
@@ -10,45 +9,21 @@ def jwt_required(view_func):
     """
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        # Obtener el token del header
-        auth_header = request.headers.get('Authorization', None)
-        
-        if not auth_header:
-            return Response(
-                {'error': 'Token no proporcionado'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        # El formato debe ser: "Bearer <token>"
-        parts = auth_header.split()
-        
-        if len(parts) != 2 or parts[0].lower() != 'bearer':
-            return Response(
-                {'error': 'Formato de token inválido. Use: Bearer <token>'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        token = parts[1]
-        
-        # Decodificar y validar el token
-        payload = decode_token(token)
-        
-        if payload is None:
-            return Response(
-                {'error': 'Token inválido o expirado'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        
-        # Verificar que el usuario existe
+        # Con @api_view, JWTAutenticacion ya resolvió request.user desde el token
+        # (ver Usuarios/autenticacion.py), sin consultar la BD
+        if getattr(getattr(request, 'user', None), 'is_authenticated', False):
+            return view_func(request, *args, **kwargs)
+
+        # Sin @api_view se valida aquí. El formato debe ser: "Bearer <token>"
         try:
-            user = Usuario.objects.get(id=payload['id'])
-            request.user = user  # Agregar usuario al request
-        except Usuario.DoesNotExist:
+            user, _ = autenticar(request.headers.get('Authorization', None))
+        except TokenInvalido as e:
             return Response(
-                {'error': 'Usuario no encontrado'},
+                {'error': str(e)},
                 status=status.HTTP_401_UNAUTHORIZED
             )
-        
+
+        request.user = user  # Agregar usuario al request
         return view_func(request, *args, **kwargs)
     
-    return wrapper
\ No newline at end of file
+    return wrapper
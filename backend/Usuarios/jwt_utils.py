@@ -1,14 +1,20 @@
 import jwt
 import datetime
 from django.conf import settings
+from Permisos.cache import mascaras_de_usuario, roles_de_usuario
 
 def generate_token(user):
     """
-    Genera un JWT token con información del usuario
+    Genera un JWT token con información del usuario, sus roles y sus permisos
+    por módulo (ver Usuarios/autenticacion.py)
     """
     payload = {
         'id': user.id,
         'username': user.username,
+        'tipo_usuario': user.tipo_usuario,
+        'roles': roles_de_usuario(user.id),
+        'permisos': mascaras_de_usuario(user.id),
+        'ver': user.version_token,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=settings.JWT_EXP_DELTA_HOURS),
         'iat': datetime.datetime.utcnow()
     }
@@ -7,14 +7,26 @@ class Usuario(models.Model):
     password = models.CharField(max_length=255)
     tipo_usuario = models.CharField(max_length=20)
     estado = models.BooleanField(default=True)  # True = Activo, False = Inactivo (eliminado lógicamente)
+    # Se incrementa al cerrar sesión o cambiar la contraseña: invalida los tokens emitidos antes
+    version_token = models.PositiveIntegerField(default=0)
     
     class Meta:
         db_table = 'usuarios'
     
     def save(self, *args, **kwargs):
+        # El token lleva el tipo de usuario (ver Usuarios/autenticacion.py): si cambia,
+        # los tokens anteriores dejan de valer
+        if self.pk and kwargs.get('update_fields') is None and Usuario.objects.filter(
+                pk=self.pk).exclude(tipo_usuario=self.tipo_usuario).exists():
+            self.version_token += 1
         # Hashear la contraseña antes de guardar
         if not self.password.startswith('pbkdf2_'):
             self.password = make_password(self.password)
+            if self.pk:
+                # Contraseña nueva: los tokens anteriores dejan de valer
+                self.version_token += 1
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = set(kwargs['update_fields']) | {'version_token'}
         super().save(*args, **kwargs)
     
     def check_password(self, raw_password):
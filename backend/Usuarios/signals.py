@@ -0,0 +1,16 @@
+"""
+Descarta la versión de sesión cacheada (Usuarios/autenticacion.py) de cada
+usuario modificado: un cambio de contraseña o una baja lógica se aplica a sus
+tokens en la siguiente petición.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .autenticacion import invalidar_sesion
+from .models import Usuario
+
+
+@receiver(post_save, sender=Usuario)
+def invalidar_sesion_de_usuario(sender, instance, created, **kwargs):
+    if not created:
+        invalidar_sesion(instance.pk)
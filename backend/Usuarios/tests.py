@@ -1,3 +1,85 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from Permisos import cache as cache_permisos
+from Permisos.cache import VER, CREAR
+from Permisos.models import PermisoModulo, Rol, RolPermiso, UsuarioRol
+from . import autenticacion
+from .jwt_utils import decode_token, generate_token
+from .models import Usuario
 
-# Create your tests here.
+
+# La bitácora se escribe en el momento, dentro de la transacción de cada test
+@override_settings(BITACORA_ASINCRONA=False)
+class AutenticacionJWTTest(TestCase):
+    def setUp(self):
+        autenticacion._local.clear()
+        cache_permisos._local.clear()
+        caches['permisos'].clear()
+
+        self.usuario = Usuario.objects.create(
+            username='ana', correo='ana@test.com', password='clave', tipo_usuario='admin'
+        )
+        modulo = PermisoModulo.objects.create(modulo='ventas', nombre_menu='Ventas', ruta='/ventas')
+        rol = Rol.objects.create(nombre='Cajero')
+        RolPermiso.objects.create(rol=rol, permiso_modulo=modulo, puede_crear=True)
+        UsuarioRol.objects.create(usuario=self.usuario, rol=rol)
+
+        self.token = generate_token(self.usuario)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_claims_del_token(self):
+        payload = decode_token(self.token)
+        self.assertEqual(payload['tipo_usuario'], 'admin')
+        self.assertEqual(payload['roles'], ['Cajero'])
+        self.assertEqual(payload['permisos'], {'ventas': VER | CREAR})
+        self.assertEqual(payload['ver'], 0)
+
+    def test_autentica_sin_consultar_el_usuario(self):
+        usuario, _ = autenticacion.autenticar(f'Bearer {self.token}')
+        self.assertEqual((usuario.id, usuario.username, usuario.roles), (self.usuario.id, 'ana', ['Cajero']))
+
+        with self.assertNumQueries(0):
+            usuario, _ = autenticacion.autenticar(f'Bearer {self.token}')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(usuario.usuario.correo, 'ana@test.com')
+
+    def test_logout_revoca_el_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.api.post('/api/usuarios/logout/')
+        self.assertEqual(respuesta.status_code, 200)
+
+        respuesta = self.api.post('/api/usuarios/logout/')
+        self.assertEqual(respuesta.status_code, 401)
+
+        # Un token nuevo sí vale
+        self.usuario.refresh_from_db()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(self.usuario)}')
+        self.assertEqual(self.api.get('/api/permisos/mis-permisos/').status_code, 200)
+
+    def test_cambio_de_contrasena_y_baja_revocan(self):
+        autenticacion.autenticar(f'Bearer {self.token}')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.password = 'otra'
+            self.usuario.save()
+        with self.assertRaises(autenticacion.TokenInvalido):
+            autenticacion.autenticar(f'Bearer {self.token}')
+
+        token = generate_token(self.usuario)
+        autenticacion.autenticar(f'Bearer {token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.delete()
+        with self.assertRaises(autenticacion.TokenInvalido):
+            autenticacion.autenticar(f'Bearer {token}')
+
+    def test_token_invalido_no_bloquea_vistas_publicas(self):
+        self.api.credentials(HTTP_AUTHORIZATION='Bearer basura')
+        respuesta = self.api.post('/api/usuarios/login/', {'username': 'ana', 'password': 'clave'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+
+        respuesta = self.api.get('/api/permisos/mis-permisos/')
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(respuesta.data, {'error': 'Token inválido o expirado'})
@@ -4,8 +4,10 @@ from rest_framework import status
 from .models import Usuario
 from .serializers import UsuarioSerializer, LoginSerializer
 from .jwt_utils import generate_token
+from .autenticacion import revocar_tokens
 from .decorators import jwt_required
 from Bitacora.utils import registrar_accion_bitacora
+from nucleo.paginacion import respuesta_paginada
 
 # POST /api/login/ - Login de usuario
 @api_view(['POST'])
@@ -60,6 +62,9 @@ def logout_view(request):
     # El decorador @jwt_required ya nos da el usuario en request.user
     usuario = request.user
     
+    # El token usado (y cualquier otro emitido antes) deja de ser válido
+    revocar_tokens(usuario.id)
+    
     # Registrar en bitácora
     registrar_accion_bitacora(
         request=request,
@@ -83,8 +88,7 @@ def listar_usuarios(request):
 @jwt_required
 def listar_todos_usuarios(request):
     usuarios = Usuario.objects.all()
-    serializer = UsuarioSerializer(usuarios, many=True)
-    return Response(serializer.data)
+    return respuesta_paginada(request, usuarios, UsuarioSerializer, ('-id',))
 
 
 # POST /api/usuarios/crear/ - Crear un usuario (PÚBLICA)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VentasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Ventas'
+
+    def ready(self):
+        # Señales que mantienen el resumen diario de ventas
+        from . import signals  # noqa: F401
@@ -0,0 +1,336 @@
+"""
+Importación masiva de ventas (históricas o de cajas sin conexión)
+
+Formatos aceptados:
+- CSV con una fila por detalle y columnas venta, fecha, cliente_id, metodo_pago,
+  producto_id, cantidad, precio_unitario y, opcionales, vendedor_id,
+  referencia_pago y monto_total. Las filas consecutivas con el mismo valor en
+  `venta` forman una sola venta (sin esa columna, cada fila es una venta).
+- NDJSON con una venta por línea:
+  {"fecha": ..., "cliente_id": ..., "metodo_pago": ..., "detalles": [
+      {"producto_id": ..., "cantidad": ..., "precio_unitario": ...}]}
+
+El archivo se lee como stream y se procesa por lotes: cada lote se valida con un
+puñado de consultas y se escribe con bulk_create dentro de su propia transacción,
+así un error en un lote no deshace los anteriores y la memoria usada no depende
+del tamaño del archivo. Las ventas inválidas se rechazan individualmente.
+"""
+
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from Cliente.models import Cliente
+from Empleados.models import Empleado
+from Producto.inventario import bloquear_productos, descontar_stock
+from .models import Venta, VentaDetalle
+from .resumen import registrar_ventas, registrar_detalles
+
+
+# Ventas que se validan y escriben por transacción
+TAMANO_LOTE_IMPORTACION = 1000
+
+# Rechazos que se conservan con su detalle en el resultado
+MAX_RECHAZOS_REPORTADOS = 100
+
+METODOS_PAGO = {'efectivo', 'tarjeta', 'yape', 'plin', 'transferencia'}
+
+FORMATOS = ('csv', 'ndjson')
+
+
+class VentaInvalida(Exception):
+    pass
+
+
+def detectar_formato(nombre_archivo):
+    """
+    Deduce el formato a partir de la extensión del archivo
+    """
+    nombre = (nombre_archivo or '').lower()
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return None
+
+
+def leer_ventas(archivo, formato):
+    """
+    Generador de (número de línea, registro de venta) desde un archivo binario
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    if formato == 'csv':
+        return _leer_csv(texto)
+    return _leer_ndjson(texto)
+
+
+def _leer_ndjson(texto):
+    for numero, linea in enumerate(texto, start=1):
+        if not linea.strip():
+            continue
+        try:
+            registro = json.loads(linea)
+        except ValueError:
+            registro = None
+        yield numero, registro
+
+
+def _leer_csv(texto):
+    lector = csv.DictReader(texto)
+    actual = None
+    clave_actual = None
+    for fila in lector:
+        numero = lector.line_num
+        clave = fila.get('venta') or f'fila-{numero}'
+        if actual is not None and clave != clave_actual:
+            yield actual
+            actual = None
+        if actual is None:
+            clave_actual = clave
+            actual = (numero, {
+                campo: fila.get(campo)
+                for campo in ('fecha', 'cliente_id', 'vendedor_id', 'metodo_pago',
+                              'referencia_pago', 'monto_total')
+            })
+            actual[1]['detalles'] = []
+        actual[1]['detalles'].append({
+            'producto_id': fila.get('producto_id'),
+            'cantidad': fila.get('cantidad'),
+            'precio_unitario': fila.get('precio_unitario'),
+        })
+    if actual is not None:
+        yield actual
+
+
+def _entero(valor, campo, opcional=False):
+    if opcional and valor in (None, ''):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise VentaInvalida(f'{campo} inválido: {valor!r}')
+
+
+def _decimal(valor, campo):
+    try:
+        numero = Decimal(str(valor))
+    except (InvalidOperation, TypeError, ValueError):
+        raise VentaInvalida(f'{campo} inválido: {valor!r}')
+    if not numero.is_finite() or numero < 0:
+        raise VentaInvalida(f'{campo} inválido: {valor!r}')
+    return numero
+
+
+def _fecha(valor):
+    texto = valor.strip() if isinstance(valor, str) else ''
+    try:
+        fecha = parse_datetime(texto)
+        dia = parse_date(texto) if fecha is None else None
+    except ValueError:
+        raise VentaInvalida(f'fecha inválida: {valor!r}')
+    if fecha is None:
+        if dia is None:
+            raise VentaInvalida(f'fecha inválida: {valor!r}')
+        fecha = datetime(dia.year, dia.month, dia.day)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def _normalizar(registro):
+    """
+    Valida el formato de una venta (sin consultar la BD) y la retorna normalizada
+    """
+    if not isinstance(registro, dict):
+        raise VentaInvalida('Registro ilegible')
+
+    metodo_pago = (registro.get('metodo_pago') or '').strip().lower()
+    if metodo_pago not in METODOS_PAGO:
+        raise VentaInvalida(f'metodo_pago inválido: {registro.get("metodo_pago")!r}')
+
+    detalles = registro.get('detalles')
+    if not isinstance(detalles, list) or not detalles:
+        raise VentaInvalida('La venta no tiene detalles')
+
+    lineas = []
+    for detalle in detalles:
+        if not isinstance(detalle, dict):
+            raise VentaInvalida('Detalle ilegible')
+        cantidad = _entero(detalle.get('cantidad'), 'cantidad')
+        if cantidad <= 0:
+            raise VentaInvalida(f'cantidad inválida: {cantidad}')
+        lineas.append((
+            _entero(detalle.get('producto_id'), 'producto_id'),
+            cantidad,
+            _decimal(detalle.get('precio_unitario'), 'precio_unitario'),
+        ))
+
+    subtotal = sum(precio * cantidad for _, cantidad, precio in lineas)
+    monto_total = registro.get('monto_total')
+    return {
+        'fecha': _fecha(registro.get('fecha')),
+        'cliente_id': _entero(registro.get('cliente_id'), 'cliente_id'),
+        'vendedor_id': _entero(registro.get('vendedor_id'), 'vendedor_id', opcional=True),
+        'metodo_pago': metodo_pago,
+        'referencia_pago': registro.get('referencia_pago') or '',
+        # Como en VentaCreateSerializer: IGV incluido si no viene el total
+        'monto_total': (
+            _decimal(monto_total, 'monto_total') if monto_total not in (None, '')
+            else (subtotal * Decimal('1.18')).quantize(Decimal('0.01'))
+        ),
+        'lineas': lineas,
+    }
+
+
+def _importar_lote(lote, ajustar_stock, rechazar):
+    """
+    Valida y guarda un lote de (número de línea, registro). Retorna (ventas, detalles)
+    """
+    validas = []
+    for numero, registro in lote:
+        try:
+            validas.append((numero, _normalizar(registro)))
+        except VentaInvalida as e:
+            rechazar(numero, str(e))
+
+    if not validas:
+        return 0, 0
+
+    with transaction.atomic():
+        clientes = set(Cliente.objects.filter(
+            id__in={venta['cliente_id'] for _, venta in validas}
+        ).values_list('id', flat=True))
+        vendedor_ids = {venta['vendedor_id'] for _, venta in validas} - {None}
+        vendedores = set(Empleado.objects.filter(
+            id__in=vendedor_ids
+        ).values_list('id', flat=True)) if vendedor_ids else set()
+        productos = bloquear_productos(sorted({
+            producto_id for _, venta in validas for producto_id, _, _ in venta['lineas']
+        }))
+        disponible = {producto_id: producto.stock for producto_id, producto in productos.items()}
+
+        aceptadas = []
+        descuentos = {}
+        for numero, venta in validas:
+            if venta['cliente_id'] not in clientes:
+                rechazar(numero, f'Cliente con ID {venta["cliente_id"]} no existe')
+                continue
+            if venta['vendedor_id'] is not None and venta['vendedor_id'] not in vendedores:
+                rechazar(numero, f'Vendedor con ID {venta["vendedor_id"]} no existe')
+                continue
+            faltante = next((
+                producto_id for producto_id, _, _ in venta['lineas'] if producto_id not in productos
+            ), None)
+            if faltante is not None:
+                rechazar(numero, f'Producto con ID {faltante} no existe')
+                continue
+
+            if ajustar_stock:
+                necesarias = {}
+                for producto_id, cantidad, _ in venta['lineas']:
+                    necesarias[producto_id] = necesarias.get(producto_id, 0) + cantidad
+                sin_stock = next((
+                    producto_id for producto_id, cantidad in necesarias.items()
+                    if disponible[producto_id] < cantidad
+                ), None)
+                if sin_stock is not None:
+                    rechazar(numero, (
+                        f'Stock insuficiente para {productos[sin_stock].nombre}. '
+                        f'Stock disponible: {disponible[sin_stock]}'
+                    ))
+                    continue
+                for producto_id, cantidad in necesarias.items():
+                    disponible[producto_id] -= cantidad
+                    descuentos[producto_id] = descuentos.get(producto_id, 0) + cantidad
+
+            aceptadas.append(venta)
+
+        if not aceptadas:
+            return 0, 0
+
+        if descuentos:
+            descontar_stock(descuentos)
+
+        ventas = Venta.objects.bulk_create([
+            Venta(
+                cliente_id=venta['cliente_id'],
+                vendedor_id=venta['vendedor_id'],
+                monto_total=venta['monto_total'],
+                metodo_pago=venta['metodo_pago'],
+                referencia_pago=venta['referencia_pago'],
+                estado='Completada'
+            )
+            for venta in aceptadas
+        ])
+        # fecha_venta es auto_now_add y bulk_create la reemplaza por la fecha actual:
+        # se restaura la fecha original con un único UPDATE ... CASE
+        for objeto, venta in zip(ventas, aceptadas):
+            objeto.fecha_venta = venta['fecha']
+        Venta.objects.bulk_update(ventas, ['fecha_venta'], batch_size=TAMANO_LOTE_IMPORTACION)
+
+        detalles = VentaDetalle.objects.bulk_create([
+            VentaDetalle(
+                venta=objeto,
+                producto=productos[producto_id],
+                cantidad=cantidad,
+                precio_unitario=precio,
+                subtotal=precio * cantidad
+            )
+            for objeto, venta in zip(ventas, aceptadas)
+            for producto_id, cantidad, precio in venta['lineas']
+        ], batch_size=TAMANO_LOTE_IMPORTACION)
+
+        # bulk_create no dispara las señales del resumen diario
+        registrar_ventas(ventas)
+        registrar_detalles(detalles)
+
+    return len(ventas), len(detalles)
+
+
+def importar_ventas(registros, tamano_lote=TAMANO_LOTE_IMPORTACION, ajustar_stock=True,
+                    al_terminar_lote=None):
+    """
+    Importa los (número de línea, registro) de `registros` por lotes de
+    `tamano_lote` ventas. Con ajustar_stock=False no se valida ni descuenta stock
+    (p. ej. para cargar historial). `al_terminar_lote(resultado)` se llama tras
+    cada lote con el resultado parcial.
+    Retorna un dict con totales, filas por segundo y los rechazos
+    """
+    resultado = {
+        'ventas': 0,
+        'detalles': 0,
+        'rechazadas': 0,
+        'rechazos': [],
+        'segundos': 0.0,
+        'ventas_por_segundo': 0.0,
+    }
+
+    def rechazar(numero, motivo):
+        resultado['rechazadas'] += 1
+        if len(resultado['rechazos']) < MAX_RECHAZOS_REPORTADOS:
+            resultado['rechazos'].append({'linea': numero, 'error': motivo})
+
+    inicio = time.perf_counter()
+    registros = iter(registros)
+    while True:
+        lote = list(islice(registros, tamano_lote))
+        if not lote:
+            break
+        ventas, detalles = _importar_lote(lote, ajustar_stock, rechazar)
+        resultado['ventas'] += ventas
+        resultado['detalles'] += detalles
+        resultado['segundos'] = time.perf_counter() - inicio
+        resultado['ventas_por_segundo'] = resultado['ventas'] / resultado['segundos']
+        if al_terminar_lote:
+            al_terminar_lote(resultado)
+
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    if resultado['segundos']:
+        resultado['ventas_por_segundo'] = round(resultado['ventas'] / resultado['segundos'], 1)
+    return resultado
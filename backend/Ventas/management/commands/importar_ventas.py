@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from Ventas.importacion import (
+    FORMATOS, TAMANO_LOTE_IMPORTACION, detectar_formato, leer_ventas, importar_ventas
+)
+
+
+class Command(BaseCommand):
+    help = "Importa ventas desde un archivo CSV o NDJSON (ver Ventas/importacion.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo a importar')
+        parser.add_argument('--formato', choices=FORMATOS, help='Formato del archivo (por defecto según la extensión)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_IMPORTACION, help='Ventas por transacción')
+        parser.add_argument('--sin-stock', action='store_true', help='No validar ni descontar stock (carga de historial)')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or detectar_formato(options['archivo'])
+        if formato is None:
+            raise CommandError("No se pudo deducir el formato: use --formato csv|ndjson")
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor a cero")
+
+        def progreso(resultado):
+            self.stdout.write(
+                f"{resultado['ventas']} ventas importadas, {resultado['rechazadas']} rechazadas "
+                f"({resultado['ventas_por_segundo']:.0f} ventas/s)"
+            )
+
+        try:
+            archivo = open(options['archivo'], 'rb')
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir el archivo: {e}")
+
+        with archivo:
+            resultado = importar_ventas(
+                leer_ventas(archivo, formato),
+                tamano_lote=options['lote'],
+                ajustar_stock=not options['sin_stock'],
+                al_terminar_lote=progreso
+            )
+
+        for rechazo in resultado['rechazos']:
+            self.stderr.write(f"Línea {rechazo['linea']}: {rechazo['error']}")
+        if resultado['rechazadas'] > len(resultado['rechazos']):
+            self.stderr.write(f"... y {resultado['rechazadas'] - len(resultado['rechazos'])} rechazos más")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {resultado['ventas']} ventas, {resultado['detalles']} detalles, "
+            f"{resultado['rechazadas']} rechazadas en {resultado['segundos']} s "
+            f"({resultado['ventas_por_segundo']} ventas/s)"
+        ))
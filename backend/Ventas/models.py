@@ -1,7 +1,7 @@
 from django.db import models
 from Cliente.models import Cliente
 from Empleados.models import Empleado
-from Producto.models import Producto
+from Producto.models import Producto, Categoria
 
 class Venta(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.RESTRICT, related_name='ventas')
@@ -15,6 +15,10 @@ class Venta(models.Model):
     class Meta:
         db_table = 'venta'
         ordering = ['-fecha_venta']
+        indexes = [
+            # Orden de la paginación por cursor del listado
+            models.Index(fields=['-fecha_venta', '-id'], name='venta_fecha_id_idx'),
+        ]
     
     def __str__(self):
         return f"Venta #{self.id} - {self.cliente.nombre_completo} - ${self.monto_total}"
@@ -37,3 +41,43 @@ class VentaDetalle(models.Model):
     
     def __str__(self):
         return f"{self.producto.nombre} x {self.cantidad}"
+
+
+class ResumenVentaDiario(models.Model):
+    """Ventas agregadas por día y método de pago (se mantiene en Ventas/resumen.py)"""
+    fecha = models.DateField()
+    metodo_pago = models.CharField(max_length=50, blank=True, default='')
+    cantidad_ventas = models.IntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'resumen_venta_diario'
+        ordering = ['fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'metodo_pago'], name='resumen_venta_diario_unico'),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} {self.metodo_pago or '-'}: {self.cantidad_ventas} ventas"
+
+
+class ResumenProductoDiario(models.Model):
+    """Unidades y montos vendidos por día y producto, con la categoría del producto"""
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_diarios')
+    cantidad = models.IntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'resumen_producto_diario'
+        ordering = ['fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto'], name='resumen_producto_diario_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'categoria'], name='resumen_prod_fecha_cat_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} {self.producto_id}: {self.cantidad} unidades"
@@ -0,0 +1,242 @@
+"""
+Resumen diario de ventas
+
+Las tablas resumen_venta_diario (día × método de pago) y resumen_producto_diario
+(día × producto, con su categoría) guardan las ventas ya agregadas, así los
+dashboards y reportes no recorren las tablas venta / venta_detalle completas en
+cada petición.
+
+Se mantienen de forma incremental: las señales de Ventas/signals.py registran
+cada venta o detalle creado, modificado o eliminado, y quien cree ventas con
+bulk_create (que no dispara señales) debe llamar a registrar_ventas /
+registrar_detalles. Los incrementos se aplican al confirmar la transacción de la
+venta, en UPDATEs cortos, para que las filas del resumen del día no queden
+bloqueadas durante todo el checkout. Si el resumen se desajusta (cargas por SQL,
+una caída entre el commit y la actualización) se reconstruye con
+`python manage.py reconstruir_resumen_ventas`.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import Venta, VentaDetalle, ResumenVentaDiario, ResumenProductoDiario
+
+
+# Filas que se insertan por cada bulk_create al reconstruir el resumen
+TAMANO_LOTE_RESUMEN = 5000
+
+# Hasta cuántas filas del resumen se actualizan una a una; por encima se escriben en bloque
+MAX_FILAS_FILA_A_FILA = 20
+
+
+def fecha_resumen(fecha_venta):
+    """
+    Día (en la zona horaria del proyecto) al que corresponde una venta
+    """
+    if timezone.is_aware(fecha_venta):
+        fecha_venta = timezone.localtime(fecha_venta)
+    return fecha_venta.date()
+
+
+def _monto(valor):
+    # Mismo redondeo que las columnas DecimalField(decimal_places=2)
+    return Decimal(str(valor)).quantize(Decimal('0.01'))
+
+
+def _acumular(modelo, claves, incrementos, valores_iniciales=None):
+    """
+    Suma los incrementos a la fila identificada por `claves`, creándola si no existe
+    """
+    actualizacion = {campo: F(campo) + valor for campo, valor in incrementos.items()}
+    while True:
+        if modelo.objects.filter(**claves).update(**actualizacion):
+            return
+        try:
+            with transaction.atomic():
+                modelo.objects.create(**claves, **incrementos, **(valores_iniciales or {}))
+            return
+        except IntegrityError:
+            # Otra venta del mismo día creó la fila entre el UPDATE y el INSERT
+            continue
+
+
+def _aplicar(modelo, campos_clave, incrementos, iniciales):
+    """
+    Aplica {clave: {campo: incremento}} al resumen. Pocas filas se actualizan una
+    a una con UPDATE ... + F(); muchas (p. ej. una importación masiva) se bloquean
+    con una consulta y se escriben con bulk_update / bulk_create
+    """
+    if len(incrementos) > MAX_FILAS_FILA_A_FILA:
+        try:
+            _aplicar_en_bloque(modelo, campos_clave, incrementos, iniciales)
+            return
+        except IntegrityError:
+            # Otra transacción creó alguna de las filas nuevas: se aplica fila a fila
+            pass
+
+    # Orden fijo de las filas para que dos transacciones no se bloqueen mutuamente
+    for clave in sorted(incrementos):
+        _acumular(modelo, dict(zip(campos_clave, clave)), incrementos[clave], iniciales.get(clave))
+
+
+def _aplicar_en_bloque(modelo, campos_clave, incrementos, iniciales):
+    # Las filas existentes se bloquean, se borran y se vuelven a insertar con los
+    # totales nuevos junto con las filas que faltan: un DELETE y un bulk_create
+    # cuestan mucho menos que un bulk_update (un CASE por campo y fila)
+    filtro = {
+        f'{campo}__in': {clave[i] for clave in incrementos}
+        for i, campo in enumerate(campos_clave)
+    }
+    with transaction.atomic():
+        existentes = {
+            tuple(getattr(fila, campo) for campo in campos_clave): fila
+            for fila in modelo.objects.select_for_update().filter(**filtro).order_by('pk')
+        }
+        filas = []
+        reemplazadas = []
+        for clave, incremento in incrementos.items():
+            fila = existentes.get(clave)
+            if fila is None:
+                filas.append(modelo(**dict(zip(campos_clave, clave)), **incremento, **iniciales.get(clave, {})))
+                continue
+            for campo, valor in incremento.items():
+                setattr(fila, campo, getattr(fila, campo) + valor)
+            reemplazadas.append(fila.pk)
+            fila.pk = None
+            filas.append(fila)
+
+        if reemplazadas:
+            modelo.objects.filter(pk__in=reemplazadas).delete()
+        modelo.objects.bulk_create(filas, batch_size=TAMANO_LOTE_RESUMEN)
+
+
+def _aplicar_ventas(grupos):
+    _aplicar(
+        ResumenVentaDiario,
+        ('fecha', 'metodo_pago'),
+        {
+            clave: {'cantidad_ventas': cantidad, 'monto_total': monto}
+            for clave, (cantidad, monto) in grupos.items()
+        },
+        {}
+    )
+
+
+def _aplicar_detalles(grupos):
+    _aplicar(
+        ResumenProductoDiario,
+        ('fecha', 'producto_id'),
+        {
+            clave: {'cantidad': cantidad, 'monto_total': monto}
+            for clave, (_, cantidad, monto) in grupos.items()
+        },
+        {clave: {'categoria_id': categoria_id} for clave, (categoria_id, _, _) in grupos.items()}
+    )
+
+
+def registrar_ventas(ventas, signo=1):
+    """
+    Suma (o resta, con signo=-1) las ventas al resumen por día y método de pago.
+    Los valores se toman al llamar; el resumen se actualiza al confirmar la transacción
+    """
+    grupos = defaultdict(lambda: [0, Decimal('0')])
+    for venta in ventas:
+        grupo = grupos[(fecha_resumen(venta.fecha_venta), venta.metodo_pago or '')]
+        grupo[0] += signo
+        grupo[1] += signo * _monto(venta.monto_total)
+
+    if grupos:
+        transaction.on_commit(lambda: _aplicar_ventas(grupos))
+
+
+def registrar_detalles(detalles, signo=1):
+    """
+    Suma (o resta, con signo=-1) los detalles al resumen por día y producto.
+    Usa detalle.venta y detalle.producto: conviene pasarlos ya cargados
+    """
+    grupos = defaultdict(lambda: [None, 0, Decimal('0')])
+    for detalle in detalles:
+        grupo = grupos[(fecha_resumen(detalle.venta.fecha_venta), detalle.producto_id)]
+        grupo[0] = detalle.producto.categoria_id
+        grupo[1] += signo * detalle.cantidad
+        grupo[2] += signo * _monto(detalle.subtotal)
+
+    if grupos:
+        transaction.on_commit(lambda: _aplicar_detalles(grupos))
+
+
+def reconstruir_resumen(desde=None, hasta=None):
+    """
+    Recalcula el resumen de los días entre `desde` y `hasta` (fechas, ambos
+    inclusive; sin límites, todo el historial) a partir de las tablas de ventas.
+    Retorna (filas de ventas, filas de productos)
+    """
+    filtro_resumen = {}
+    filtro_ventas = {}
+    if desde:
+        filtro_resumen['fecha__gte'] = desde
+        filtro_ventas['fecha_venta__date__gte'] = desde
+    if hasta:
+        filtro_resumen['fecha__lte'] = hasta
+        filtro_ventas['fecha_venta__date__lte'] = hasta
+
+    ventas = Venta.objects.filter(**filtro_ventas).annotate(
+        dia=TruncDate('fecha_venta'),
+        metodo=Coalesce('metodo_pago', Value(''))
+    ).values('dia', 'metodo').annotate(
+        cantidad=Count('id'),
+        total=Sum('monto_total')
+    ).order_by()
+
+    detalles = VentaDetalle.objects.filter(
+        **{f'venta__{campo}': valor for campo, valor in filtro_ventas.items()}
+    ).annotate(
+        dia=TruncDate('venta__fecha_venta')
+    ).values('dia', 'producto_id', 'producto__categoria_id').annotate(
+        cantidad_total=Sum('cantidad'),
+        total=Sum('subtotal')
+    ).order_by()
+
+    with transaction.atomic():
+        ResumenVentaDiario.objects.filter(**filtro_resumen).delete()
+        ResumenProductoDiario.objects.filter(**filtro_resumen).delete()
+
+        filas_ventas = _insertar_por_lotes(ResumenVentaDiario, (
+            ResumenVentaDiario(
+                fecha=fila['dia'],
+                metodo_pago=fila['metodo'],
+                cantidad_ventas=fila['cantidad'],
+                monto_total=fila['total'] or 0
+            )
+            for fila in ventas.iterator(chunk_size=TAMANO_LOTE_RESUMEN)
+        ))
+        filas_productos = _insertar_por_lotes(ResumenProductoDiario, (
+            ResumenProductoDiario(
+                fecha=fila['dia'],
+                producto_id=fila['producto_id'],
+                categoria_id=fila['producto__categoria_id'],
+                cantidad=fila['cantidad_total'] or 0,
+                monto_total=fila['total'] or 0
+            )
+            for fila in detalles.iterator(chunk_size=TAMANO_LOTE_RESUMEN)
+        ))
+
+    return filas_ventas, filas_productos
+
+
+def _insertar_por_lotes(modelo, objetos):
+    total = 0
+    lote = []
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) >= TAMANO_LOTE_RESUMEN:
+            modelo.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+        total += len(lote)
+    return total
@@ -5,7 +5,12 @@ from .models import Venta, VentaDetalle
 from Cliente.models import Cliente
 from Empleados.models import Empleado
 from Producto.models import Producto
-from Carrito.models import Carrito
+from Carrito.models import Carrito, CarritoItem
+from Carrito.almacen import almacen_carritos
+from Carrito.precios import actualizar_totales
+from Producto.inventario import descontar_stock, StockInsuficiente, ProductoNoExiste
+from Producto.reservas import liberar
+from .resumen import registrar_detalles
 
 class VentaDetalleSerializer(serializers.ModelSerializer):
     producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
@@ -55,55 +60,66 @@ class CrearVentaDesdeCarritoSerializer(serializers.Serializer):
     def create(self, validated_data):
         usuario_id = validated_data.get('usuario_id', 1)
         
-        try:
-            carrito = Carrito.objects.get(usuario_id=usuario_id)
-            
-            if not carrito.items.exists():
-                raise serializers.ValidationError('El carrito está vacío')
-            
-            # Verificar stock de todos los productos
-            for item in carrito.items.all():
-                if item.producto.stock < item.cantidad:
-                    raise serializers.ValidationError(
-                        f'Stock insuficiente para {item.producto.nombre}. '
-                        f'Solo hay {item.producto.stock} unidades disponibles'
-                    )
-            
-            # Calcular totales
-            subtotal = carrito.total()
-            igv = subtotal * 0.18
-            monto_total = subtotal + igv
-            
-            # Crear venta
-            venta = Venta.objects.create(
-                cliente_id=validated_data['cliente_id'],
-                monto_total=monto_total,
-                metodo_pago=validated_data['metodo_pago'],
-                referencia_pago=validated_data.get('referencia_pago', ''),
-                estado='Completada'
-            )
-            
-            # Crear detalles y actualizar stock
-            for item in carrito.items.all():
-                VentaDetalle.objects.create(
-                    venta=venta,
-                    producto=item.producto,
-                    cantidad=item.cantidad,
-                    precio_unitario=item.producto.precio,
-                    subtotal=item.subtotal()
-                )
-                
-                # Actualizar stock
-                item.producto.stock -= item.cantidad
-                item.producto.save()
-            
-            # Vaciar carrito
-            carrito.items.all().delete()
-            
-            return venta
+        # El carrito activo puede tener cambios que aún no están en la BD
+        almacen = almacen_carritos()
+        almacen.persistir(usuario_id)
         
+        try:
+            # Bloquear el carrito evita que un doble envío lo cobre dos veces
+            carrito = Carrito.objects.select_for_update().get(usuario_id=usuario_id)
         except Carrito.DoesNotExist:
             raise serializers.ValidationError('Carrito no encontrado')
+        
+        items = list(carrito.items.all())
+        if not items:
+            raise serializers.ValidationError('El carrito está vacío')
+        
+        # Bloquear los productos (en orden de id), verificar y descontar stock
+        # con un único UPDATE condicional
+        cantidades = {}
+        for item in items:
+            cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+        try:
+            # Sin contar como disponible lo reservado por otros carritos
+            productos = descontar_stock(cantidades, usuario_id=usuario_id)
+        except (StockInsuficiente, ProductoNoExiste) as e:
+            raise serializers.ValidationError(str(e))
+        
+        # Calcular totales con los precios leídos bajo bloqueo
+        subtotal = sum(productos[item.producto_id].precio * item.cantidad for item in items)
+        igv = subtotal * Decimal('0.18')
+        monto_total = subtotal + igv
+        
+        # Crear venta
+        venta = Venta.objects.create(
+            cliente_id=validated_data['cliente_id'],
+            monto_total=monto_total,
+            metodo_pago=validated_data['metodo_pago'],
+            referencia_pago=validated_data.get('referencia_pago', ''),
+            estado='Completada'
+        )
+        
+        # Crear todos los detalles en un solo INSERT
+        detalles = VentaDetalle.objects.bulk_create([
+            VentaDetalle(
+                venta=venta,
+                producto=productos[item.producto_id],
+                cantidad=item.cantidad,
+                precio_unitario=productos[item.producto_id].precio,
+                subtotal=productos[item.producto_id].precio * item.cantidad
+            )
+            for item in items
+        ])
+        # bulk_create no dispara las señales del resumen diario
+        registrar_detalles(detalles)
+        
+        # Vaciar carrito
+        CarritoItem.objects.filter(carrito=carrito).delete()
+        actualizar_totales([carrito.id])
+        liberar(usuario_id, cantidades)
+        transaction.on_commit(lambda: almacen.olvidar(usuario_id))
+        
+        return venta
 
 
 class VentaCreateSerializer(serializers.Serializer):
@@ -128,23 +144,37 @@ class VentaCreateSerializer(serializers.Serializer):
         if not detalles_data:
             raise serializers.ValidationError('Debe incluir al menos un detalle de venta')
         
-        # Verificar stock
-        for detalle in detalles_data:
-            try:
-                producto = Producto.objects.get(id=detalle['producto_id'])
-                if producto.stock < int(detalle['cantidad']):
-                    raise serializers.ValidationError(
-                        f'Stock insuficiente para {producto.nombre}. Stock disponible: {producto.stock}'
-                    )
-            except Producto.DoesNotExist:
-                raise serializers.ValidationError(f'Producto con ID {detalle["producto_id"]} no existe')
+        try:
+            lineas = [
+                (int(detalle['producto_id']), int(detalle['cantidad']), Decimal(str(detalle['precio_unitario'])))
+                for detalle in detalles_data
+            ]
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            raise serializers.ValidationError(
+                'Cada detalle debe incluir producto_id, cantidad y precio_unitario válidos'
+            )
+        if any(cantidad <= 0 for _, cantidad, _ in lineas):
+            raise serializers.ValidationError('La cantidad de cada detalle debe ser mayor a cero')
+        
+        # Bloquear todos los productos con una sola consulta (in_bulk), verificar
+        # el stock en memoria y descontarlo con un único UPDATE ... CASE.
+        # La venta en tienda tiene prioridad sobre las reservas de los carritos: el
+        # producto está en el mostrador, así que se valida contra el stock físico y
+        # no contra lo disponible (el checkout del carrito revalida al pagar)
+        cantidades = {}
+        for producto_id, cantidad, _ in lineas:
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+        try:
+            productos = descontar_stock(cantidades)
+        except ProductoNoExiste as e:
+            raise serializers.ValidationError(str(e))
+        except StockInsuficiente as e:
+            raise serializers.ValidationError(
+                f'Stock insuficiente para {e.producto.nombre}. Stock disponible: {e.producto.stock}'
+            )
         
         # Calcular monto total (con IGV incluido)
-        from decimal import Decimal
-        subtotal = sum(
-            Decimal(str(detalle['precio_unitario'])) * Decimal(str(detalle['cantidad'])) 
-            for detalle in detalles_data
-        )
+        subtotal = sum(precio_unit * cantidad for _, cantidad, precio_unit in lineas)
         monto_total = subtotal * Decimal('1.18')
         
         # Crear venta
@@ -156,24 +186,18 @@ class VentaCreateSerializer(serializers.Serializer):
             referencia_pago=validated_data.get('referencia_pago', '')
         )
         
-        # Crear detalles y actualizar stock
-        for detalle in detalles_data:
-            producto = Producto.objects.get(id=detalle['producto_id'])
-            
-            from decimal import Decimal
-            precio_unit = Decimal(str(detalle['precio_unitario']))
-            cantidad = int(detalle['cantidad'])
-            
-            VentaDetalle.objects.create(
+        # Crear todos los detalles en un solo INSERT
+        detalles = VentaDetalle.objects.bulk_create([
+            VentaDetalle(
                 venta=venta,
-                producto=producto,
+                producto=productos[producto_id],
                 cantidad=cantidad,
                 precio_unitario=precio_unit,
-                subtotal=precio_unit * Decimal(str(cantidad))
+                subtotal=precio_unit * cantidad
             )
-            
-            # Actualizar stock del producto
-            producto.stock -= cantidad
-            producto.save()
+            for producto_id, cantidad, precio_unit in lineas
+        ])
+        # bulk_create no dispara las señales del resumen diario
+        registrar_detalles(detalles)
         
         return venta
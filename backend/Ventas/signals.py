@@ -0,0 +1,62 @@
+"""
+Mantiene el resumen diario de ventas (Ventas/resumen.py) al crear, modificar o
+eliminar ventas y detalles. bulk_create no dispara estas señales.
+"""
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Venta, VentaDetalle
+from .resumen import registrar_ventas, registrar_detalles
+
+
+@receiver(pre_save, sender=Venta)
+def guardar_venta_anterior(sender, instance, raw=False, **kwargs):
+    # En una modificación se resta lo que había y se suma lo nuevo
+    instance._resumen_anterior = None
+    if instance.pk and not raw and not instance._state.adding:
+        instance._resumen_anterior = Venta.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Venta)
+def actualizar_resumen_venta(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_resumen_anterior', None)
+    if anterior is not None:
+        if (anterior.fecha_venta, anterior.metodo_pago, anterior.monto_total) == (
+                instance.fecha_venta, instance.metodo_pago, instance.monto_total):
+            return
+        registrar_ventas([anterior], signo=-1)
+    registrar_ventas([instance])
+
+
+@receiver(post_delete, sender=Venta)
+def descontar_resumen_venta(sender, instance, **kwargs):
+    registrar_ventas([instance], signo=-1)
+
+
+@receiver(pre_save, sender=VentaDetalle)
+def guardar_detalle_anterior(sender, instance, raw=False, **kwargs):
+    instance._resumen_anterior = None
+    if instance.pk and not raw and not instance._state.adding:
+        instance._resumen_anterior = VentaDetalle.objects.select_related(
+            'venta', 'producto'
+        ).filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=VentaDetalle)
+def actualizar_resumen_detalle(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_resumen_anterior', None)
+    if anterior is not None:
+        if (anterior.venta_id, anterior.producto_id, anterior.cantidad, anterior.subtotal) == (
+                instance.venta_id, instance.producto_id, instance.cantidad, instance.subtotal):
+            return
+        registrar_detalles([anterior], signo=-1)
+    registrar_detalles([instance])
+
+
+@receiver(post_delete, sender=VentaDetalle)
+def descontar_resumen_detalle(sender, instance, **kwargs):
+    registrar_detalles([instance], signo=-1)
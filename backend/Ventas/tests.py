@@ -1,3 +1,376 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from Carrito.models import Carrito, CarritoItem
+from Cliente.models import Cliente
+from Empleados.models import Empleado
+from Producto.models import Producto
+from Producto.reservas import reservar
+from Usuarios import autenticacion
+from Usuarios.jwt_utils import generate_token
+from Usuarios.models import Usuario
+from .importacion import importar_ventas, leer_ventas
+from .models import Venta, VentaDetalle, ResumenProductoDiario
+from .serializers import CrearVentaDesdeCarritoSerializer, VentaCreateSerializer
 
-# Create your tests here.
+
+def crear_carritos(producto, cantidad_carritos, unidades=1):
+    """Crea usuarios con un carrito que contiene `unidades` del producto"""
+    Usuario.objects.bulk_create([
+        Usuario(
+            username=f'comprador{i}',
+            correo=f'comprador{i}@test.com',
+            password='pbkdf2_sin_uso',
+            tipo_usuario='cliente'
+        )
+        for i in range(cantidad_carritos)
+    ])
+    usuarios = list(Usuario.objects.filter(username__startswith='comprador').order_by('id'))
+    Carrito.objects.bulk_create([Carrito(usuario=usuario) for usuario in usuarios])
+    carritos = list(Carrito.objects.filter(usuario__in=usuarios))
+    CarritoItem.objects.bulk_create([
+        CarritoItem(carrito=carrito, producto=producto, cantidad=unidades)
+        for carrito in carritos
+    ])
+    return usuarios
+
+
+def checkout(usuario_id, cliente_id):
+    serializer = CrearVentaDesdeCarritoSerializer(data={
+        'usuario_id': usuario_id,
+        'cliente_id': cliente_id,
+        'metodo_pago': 'efectivo',
+    })
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre_completo='Cliente', correo='cliente@test.com',
+            telefono='700', direccion='-', ci='1'
+        )
+        self.producto = Producto.objects.create(nombre='Producto', precio='10.00', stock=3)
+
+    def test_descuenta_stock_y_rechaza_sin_stock(self):
+        usuarios = crear_carritos(self.producto, 2, unidades=2)
+
+        venta = checkout(usuarios[0].id, self.cliente.id)
+        self.assertEqual(venta.detalles.count(), 1)
+        self.assertEqual(venta.monto_total, Decimal('23.60'))
+
+        with self.assertRaises(serializers.ValidationError):
+            checkout(usuarios[1].id, self.cliente.id)
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertTrue(CarritoItem.objects.filter(carrito__usuario=usuarios[1]).exists())
+
+
+class VentaCreateTest(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre_completo='Cliente', correo='cliente@test.com',
+            telefono='700', direccion='-', ci='1'
+        )
+        self.productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', precio='5.00', stock=10) for i in range(60)
+        ])
+
+    def crear_venta(self, lineas):
+        serializer = VentaCreateSerializer(data={
+            'cliente_id': self.cliente.id,
+            'metodo_pago': 'efectivo',
+            'detalles': [
+                {'producto_id': producto.id, 'cantidad': 2, 'precio_unitario': '5.00'}
+                for producto in self.productos[:lineas]
+            ],
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_consultas_constantes(self):
+        # Bloqueo de productos, UPDATE de stock, venta e INSERT de detalles (más el
+        # SAVEPOINT de @transaction.atomic), sin importar la cantidad de líneas
+        with self.assertNumQueries(6):
+            self.crear_venta(5)
+        with self.assertNumQueries(6):
+            venta = self.crear_venta(50)
+
+        self.assertEqual(venta.detalles.count(), 50)
+        self.assertEqual(venta.monto_total, Decimal('590.00'))
+        self.assertEqual(
+            list(Producto.objects.filter(id__in=[p.id for p in self.productos[:5]]).values_list('stock', flat=True)),
+            [6] * 5
+        )
+
+    def test_rechaza_stock_insuficiente(self):
+        producto = self.productos[0]
+        serializer = VentaCreateSerializer(data={
+            'cliente_id': self.cliente.id,
+            'metodo_pago': 'efectivo',
+            'detalles': [
+                {'producto_id': producto.id, 'cantidad': 6, 'precio_unitario': '5.00'},
+                {'producto_id': producto.id, 'cantidad': 6, 'precio_unitario': '5.00'},
+            ],
+        })
+        serializer.is_valid(raise_exception=True)
+        with self.assertRaises(serializers.ValidationError):
+            serializer.save()
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 10)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_venta_en_tienda_ignora_reservas(self):
+        producto = self.productos[0]
+        comprador = crear_carritos(producto, 1, unidades=9)[0]
+        reservar(comprador.id, {producto.id: 9})
+
+        self.crear_venta(1)
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 8)
+        # El carrito reservado ya no alcanza: su checkout se rechaza
+        with self.assertRaises(serializers.ValidationError):
+            checkout(comprador.id, self.cliente.id)
+
+
+class ConsultasEndpointsTest(TestCase):
+    """
+    Cantidad de consultas de los endpoints de ventas: no debe crecer con la
+    cantidad de ventas ni de detalles (sin N+1 en VentaSerializer)
+    """
+
+    def setUp(self):
+        admin = Usuario.objects.create(username='admin', correo='admin@test.com', password='clave', tipo_usuario='admin')
+        token = f'Bearer {generate_token(admin)}'
+        autenticacion._local.clear()
+        autenticacion.autenticar(token)  # Versión de sesión ya cacheada: no suma consultas
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=token)
+        self.cliente = Cliente.objects.create(
+            nombre_completo='Cliente', correo='cliente@test.com',
+            telefono='700', direccion='-', ci='1'
+        )
+        self.vendedor = Empleado.objects.create(
+            nombre_completo='Vendedor', telefono='701', ci='2', rol='vendedor', direccion='-'
+        )
+        self.productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', precio='5.00', stock=100) for i in range(5)
+        ])
+
+    def crear_ventas(self, cantidad):
+        ventas = Venta.objects.bulk_create([
+            Venta(cliente=self.cliente, vendedor=self.vendedor, monto_total='11.80', metodo_pago='efectivo')
+            for _ in range(cantidad)
+        ])
+        VentaDetalle.objects.bulk_create([
+            VentaDetalle(venta=venta, producto=producto, cantidad=1, precio_unitario='5.00', subtotal='5.00')
+            for venta in ventas
+            for producto in self.productos[:2]
+        ])
+        return ventas
+
+    def test_listado_y_detalle(self):
+        venta = self.crear_ventas(1)[0]
+        # Ventas con cliente y vendedor, y detalles con su producto
+        with self.assertNumQueries(2):
+            respuesta = self.api.get('/api/ventas/')
+        self.crear_ventas(30)
+        with self.assertNumQueries(2):
+            respuesta = self.api.get('/api/ventas/')
+        self.assertEqual(len(respuesta.data), 31)
+        self.assertEqual(respuesta.data[0]['vendedor_nombre'], 'Vendedor')
+        self.assertEqual(respuesta.data[0]['detalles'][0]['producto_nombre'], 'Producto 0')
+
+        with self.assertNumQueries(2):
+            respuesta = self.api.get('/api/ventas/ultimas/?limit=20')
+        self.assertEqual(len(respuesta.data), 20)
+
+        with self.assertNumQueries(2):
+            respuesta = self.api.get(f'/api/ventas/{venta.id}/')
+        self.assertEqual(respuesta.data['cliente_nombre'], 'Cliente')
+
+    def test_paginacion_por_cursor(self):
+        ventas = self.crear_ventas(25)
+        Venta.objects.filter(id__in=[venta.id for venta in ventas[:10]]).update(
+            fecha_venta=timezone.now() - timedelta(days=1)
+        )
+
+        vistas = []
+        url = '/api/ventas/?page_size=10'
+        while url:
+            # Página de ventas y detalles de la página, sin COUNT(*)
+            with self.assertNumQueries(2):
+                respuesta = self.api.get(url)
+            vistas.extend(venta['id'] for venta in respuesta.data['results'])
+            url = respuesta.data['next']
+
+        esperadas = list(Venta.objects.order_by('-fecha_venta', '-id').values_list('id', flat=True))
+        self.assertEqual(vistas, esperadas)
+
+    def test_exportacion_en_stream(self):
+        self.crear_ventas(3)
+        respuesta = self.api.get('/api/ventas/exportar/')
+        self.assertTrue(respuesta.streaming)
+        filas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual(len(filas), 3)
+        self.assertEqual((filas[0]['cliente_nombre'], filas[0]['monto_total']), ('Cliente', '11.80'))
+
+        respuesta = self.api.get('/api/ventas/exportar/?formato=csv')
+        lineas = b''.join(respuesta.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lineas[0].split(',')[:3], ['id', 'fecha_venta', 'cliente'])
+        self.assertEqual(len(lineas), 4)
+
+        self.assertEqual(self.api.get('/api/ventas/exportar/?formato=xml').status_code, 400)
+
+    def test_estadisticas_y_metodos_pago(self):
+        self.crear_ventas(10)
+        with self.assertNumQueries(2):
+            self.api.get('/api/ventas/estadisticas/')
+        with self.assertNumQueries(0):
+            self.api.get('/api/ventas/metodos_pago/')
+
+    def test_respuesta_de_creacion(self):
+        for lineas in (2, 5):
+            # Las 6 consultas de VentaCreateSerializer más las 2 de la respuesta
+            with self.assertNumQueries(8):
+                respuesta = self.api.post('/api/ventas/', {
+                    'cliente_id': self.cliente.id,
+                    'metodo_pago': 'efectivo',
+                    'detalles': [
+                        {'producto_id': producto.id, 'cantidad': 1, 'precio_unitario': '5.00'}
+                        for producto in self.productos[:lineas]
+                    ],
+                }, format='json')
+            self.assertEqual(respuesta.status_code, 201)
+            self.assertEqual(len(respuesta.data['detalles']), lineas)
+
+    def test_respuesta_de_checkout(self):
+        usuario = crear_carritos(self.productos[0], 1)[0]
+        CarritoItem.objects.bulk_create([
+            CarritoItem(carrito=usuario.carrito, producto=producto, cantidad=1)
+            for producto in self.productos[1:]
+        ])
+        with self.assertNumQueries(13):
+            respuesta = self.api.post('/api/ventas/crear_desde_carrito/', {
+                'usuario_id': usuario.id, 'cliente_id': self.cliente.id, 'metodo_pago': 'yape'
+            }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.data['venta']['detalles']), 5)
+
+
+class ImportacionTest(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre_completo='Cliente', correo='cliente@test.com',
+            telefono='700', direccion='-', ci='1'
+        )
+        self.producto = Producto.objects.create(nombre='Producto', precio='5.00', stock=10)
+
+    def importar(self, contenido, formato, **kwargs):
+        return importar_ventas(leer_ventas(io.BytesIO(contenido.encode()), formato), **kwargs)
+
+    def test_csv_agrupa_por_venta_y_rechaza_filas_invalidas(self):
+        p = self.producto.id
+        c = self.cliente.id
+        contenido = (
+            'venta,fecha,cliente_id,metodo_pago,producto_id,cantidad,precio_unitario\n'
+            f'A,2025-01-03 10:00:00,{c},efectivo,{p},2,5.00\n'
+            f'A,2025-01-03 10:00:00,{c},efectivo,{p},1,5.00\n'
+            f'B,2025-01-04,{c},cheque,{p},1,5.00\n'
+            f'C,2025-01-04,{c},yape,{p},20,5.00\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = self.importar(contenido, 'csv', tamano_lote=2)
+
+        self.assertEqual((resultado['ventas'], resultado['detalles'], resultado['rechazadas']), (1, 2, 2))
+        self.assertEqual([rechazo['linea'] for rechazo in resultado['rechazos']], [4, 5])
+        venta = Venta.objects.get()
+        self.assertEqual(timezone.localtime(venta.fecha_venta).date(), date(2025, 1, 3))
+        self.assertEqual(venta.monto_total, Decimal('17.70'))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 7)
+        self.assertEqual(
+            ResumenProductoDiario.objects.get(fecha=date(2025, 1, 3), producto=self.producto).cantidad, 3
+        )
+
+    def test_rechaza_vendedor_inexistente(self):
+        contenido = (
+            'venta,fecha,cliente_id,vendedor_id,metodo_pago,producto_id,cantidad,precio_unitario\n'
+            f'A,2025-01-03,{self.cliente.id},999999,efectivo,{self.producto.id},1,5.00\n'
+            f'B,2025-01-03,{self.cliente.id},,efectivo,{self.producto.id},1,5.00\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = self.importar(contenido, 'csv')
+
+        self.assertEqual((resultado['ventas'], resultado['rechazadas']), (1, 1))
+        self.assertIn('Vendedor con ID 999999', resultado['rechazos'][0]['error'])
+        self.assertIsNone(Venta.objects.get().vendedor_id)
+
+    def test_ndjson_sin_ajustar_stock(self):
+        contenido = '{"fecha": "2025-01-03", "cliente_id": %d, "metodo_pago": "efectivo", ' \
+                    '"detalles": [{"producto_id": %d, "cantidad": 50, "precio_unitario": "5"}]}\n' \
+                    'no es json\n' % (self.cliente.id, self.producto.id)
+        resultado = self.importar(contenido, 'ndjson', ajustar_stock=False)
+
+        self.assertEqual((resultado['ventas'], resultado['rechazadas']), (1, 1))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 10)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class CheckoutConcurrenteTest(TransactionTestCase):
+    """
+    50 checkouts simultáneos de un producto con stock para 20: deben venderse
+    exactamente 20 unidades (requiere una BD con SELECT ... FOR UPDATE, p. ej. PostgreSQL)
+    """
+    CHECKOUTS = 50
+    STOCK = 20
+
+    def test_sin_sobreventa(self):
+        cliente = Cliente.objects.create(
+            nombre_completo='Cliente', correo='cliente@test.com',
+            telefono='700', direccion='-', ci='1'
+        )
+        producto = Producto.objects.create(nombre='Producto', precio='10.00', stock=self.STOCK)
+        usuarios = crear_carritos(producto, self.CHECKOUTS)
+
+        barrera = threading.Barrier(self.CHECKOUTS)
+        resultados = []
+
+        def comprar(usuario_id):
+            try:
+                barrera.wait()
+                checkout(usuario_id, cliente.id)
+                resultados.append('ok')
+            except serializers.ValidationError:
+                resultados.append('rechazado')
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar, args=(usuario.id,)) for usuario in usuarios]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        producto.refresh_from_db()
+        self.assertEqual(resultados.count('ok'), self.STOCK)
+        self.assertEqual(resultados.count('rechazado'), self.CHECKOUTS - self.STOCK)
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(VentaDetalle.objects.filter(producto=producto).count(), self.STOCK)
+        print(f"\n{self.CHECKOUTS} checkouts concurrentes en {duracion:.2f} s")
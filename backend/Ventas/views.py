@@ -2,19 +2,45 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
-from .models import Venta, VentaDetalle
+from .models import Venta, VentaDetalle, ResumenVentaDiario
 from .serializers import (
     VentaSerializer, 
     VentaDetalleSerializer, 
     VentaCreateSerializer,
     CrearVentaDesdeCarritoSerializer
 )
-from django.db.models import Sum, Count
+from .importacion import FORMATOS, detectar_formato, leer_ventas, importar_ventas
+from django.db.models import Sum, Count, Prefetch
+from django.utils import timezone
 from datetime import datetime, timedelta
+from nucleo.exportacion import FORMATOS_EXPORTACION, respuesta_exportacion
+
+
+def ventas_para_lectura():
+    """
+    Ventas con cliente, vendedor y detalles (con su producto) cargados de antemano,
+    solo con las columnas que usa VentaSerializer: 2 consultas sin importar cuántas
+    ventas y detalles se serialicen
+    """
+    detalles = VentaDetalle.objects.select_related('producto').only(
+        'id', 'venta_id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal',
+        'producto__nombre', 'producto__imagen_url'
+    ).order_by('id')
+    return Venta.objects.select_related('cliente', 'vendedor').only(
+        'id', 'cliente_id', 'vendedor_id', 'fecha_venta', 'monto_total', 'metodo_pago',
+        'referencia_pago', 'estado', 'cliente__nombre_completo', 'vendedor__nombre_completo'
+    ).prefetch_related(Prefetch('detalles', queryset=detalles))
+
 
 class VentaViewSet(viewsets.ModelViewSet):
     queryset = Venta.objects.all()
     serializer_class = VentaSerializer
+    orden_cursor = ('-fecha_venta', '-id')
+    
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'ultimas'):
+            return ventas_para_lectura()
+        return super().get_queryset()
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -29,8 +55,8 @@ class VentaViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         venta = serializer.save()
         
-        # Usar VentaSerializer para la respuesta
-        response_serializer = VentaSerializer(venta)
+        # Usar VentaSerializer para la respuesta (releída con sus relaciones cargadas)
+        response_serializer = VentaSerializer(ventas_para_lectura().get(pk=venta.pk))
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['post'])
@@ -43,7 +69,7 @@ class VentaViewSet(viewsets.ModelViewSet):
                 venta = serializer.save()
                 return Response({
                     'message': 'Venta creada exitosamente',
-                    'venta': VentaSerializer(venta).data
+                    'venta': VentaSerializer(ventas_para_lectura().get(pk=venta.pk)).data
                 }, status=status.HTTP_201_CREATED)
             except Exception as e:
                 return Response({
@@ -52,6 +78,58 @@ class VentaViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        """
+        Importación masiva de ventas desde un archivo CSV o NDJSON (campo `archivo`,
+        multipart). Opcionales: `formato` (csv|ndjson) y `ajustar_stock` (true|false).
+        Para archivos muy grandes usar `python manage.py importar_ventas`
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({'error': 'Debe enviar el archivo en el campo "archivo"'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        formato = request.data.get('formato') or detectar_formato(archivo.name)
+        if formato not in FORMATOS:
+            return Response({'error': 'Formato no soportado: use csv o ndjson'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        ajustar_stock = str(request.data.get('ajustar_stock', 'true')).lower() not in ('false', '0', 'no')
+        
+        try:
+            resultado = importar_ventas(leer_ventas(archivo.file, formato), ajustar_stock=ajustar_stock)
+        except UnicodeDecodeError:
+            return Response({'error': 'El archivo debe estar codificado en UTF-8'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(resultado, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """
+        Exportar todas las ventas (una fila por venta) como stream, ?formato=ndjson|csv
+        """
+        formato = request.query_params.get('formato', 'ndjson')
+        if formato not in FORMATOS_EXPORTACION:
+            return Response({'error': 'Formato no soportado: use ndjson o csv'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        columnas = {
+            'id': 'id',
+            'fecha_venta': 'fecha_venta',
+            'cliente': 'cliente_id',
+            'cliente_nombre': 'cliente__nombre_completo',
+            'vendedor': 'vendedor_id',
+            'vendedor_nombre': 'vendedor__nombre_completo',
+            'monto_total': 'monto_total',
+            'metodo_pago': 'metodo_pago',
+            'referencia_pago': 'referencia_pago',
+            'estado': 'estado',
+        }
+        ventas = Venta.objects.order_by('-fecha_venta', '-id')
+        return respuesta_exportacion(ventas, columnas, formato, 'ventas')
+    
     @action(detail=False, methods=['get'])
     def metodos_pago(self, request):
         """Obtener métodos de pago disponibles"""
@@ -68,20 +146,25 @@ class VentaViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
         """Obtener estadísticas de ventas"""
-        hoy = datetime.now().date()
+        hoy = timezone.localdate()
         inicio_mes = hoy.replace(day=1)
         
-        ventas_hoy = Venta.objects.filter(fecha_venta__date=hoy)
-        ventas_mes = Venta.objects.filter(fecha_venta__date__gte=inicio_mes)
+        # Se lee del resumen diario: el costo no depende del volumen de ventas
+        ventas_hoy = ResumenVentaDiario.objects.filter(fecha=hoy).aggregate(
+            total=Sum('monto_total'), cantidad=Sum('cantidad_ventas')
+        )
+        ventas_mes = ResumenVentaDiario.objects.filter(fecha__gte=inicio_mes).aggregate(
+            total=Sum('monto_total'), cantidad=Sum('cantidad_ventas')
+        )
         
         return Response({
             'ventas_hoy': {
-                'total': ventas_hoy.aggregate(Sum('monto_total'))['monto_total__sum'] or 0,
-                'cantidad': ventas_hoy.count()
+                'total': ventas_hoy['total'] or 0,
+                'cantidad': ventas_hoy['cantidad'] or 0
             },
             'ventas_mes': {
-                'total': ventas_mes.aggregate(Sum('monto_total'))['monto_total__sum'] or 0,
-                'cantidad': ventas_mes.count()
+                'total': ventas_mes['total'] or 0,
+                'cantidad': ventas_mes['cantidad'] or 0
             }
         })
     
@@ -89,11 +172,11 @@ class VentaViewSet(viewsets.ModelViewSet):
     def ultimas(self, request):
         """Obtener últimas ventas"""
         limit = int(request.query_params.get('limit', 10))
-        ventas = Venta.objects.all()[:limit]
+        ventas = self.get_queryset()[:limit]
         serializer = self.get_serializer(ventas, many=True)
         return Response(serializer.data)
 
 
 class VentaDetalleViewSet(viewsets.ModelViewSet):
-    queryset = VentaDetalle.objects.all()
+    queryset = VentaDetalle.objects.select_related('producto')
     serializer_class = VentaDetalleSerializer
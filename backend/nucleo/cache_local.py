@@ -0,0 +1,48 @@
+"""
+Caché en memoria de cada proceso, de vida corta
+
+Para datos que se consultan en casi todas las peticiones (permisos, versión de la
+sesión de cada usuario) y que ya están en una caché compartida: una copia local
+unos segundos evita incluso el viaje a Redis en las peticiones seguidas.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLocal:
+    """LRU con vencimiento, segura entre hilos"""
+
+    def __init__(self, maximo, ttl):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._candado = threading.Lock()
+
+    def get(self, clave):
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            vence, valor = entrada
+            if vence < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._candado:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._candado:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._candado:
+            self._datos.clear()
@@ -0,0 +1,74 @@
+"""
+Exportación de tablas grandes como stream (NDJSON o CSV)
+
+Las filas se leen con .values_list().iterator(chunk_size=...) (en PostgreSQL, un
+cursor del lado del servidor) y se escriben a medida que se leen con
+StreamingHttpResponse: la memoria del worker no depende de la cantidad de filas,
+a diferencia de serializar la lista completa con un serializer de DRF.
+"""
+
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+# Filas que se traen de la BD por cada viaje del cursor
+TAMANO_BLOQUE_EXPORTACION = 2000
+
+FORMATOS_EXPORTACION = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class _Eco:
+    """Objeto tipo archivo que retorna lo escrito, para usar csv.writer en un generador"""
+
+    def write(self, valor):
+        return valor
+
+
+def _bloques(queryset, campos, formatear_fila):
+    # Se envía un bloque de texto por cada viaje del cursor, no una escritura por fila
+    lineas = []
+    for fila in queryset.values_list(*campos).iterator(chunk_size=TAMANO_BLOQUE_EXPORTACION):
+        lineas.append(formatear_fila(fila))
+        if len(lineas) >= TAMANO_BLOQUE_EXPORTACION:
+            yield ''.join(lineas)
+            lineas = []
+    if lineas:
+        yield ''.join(lineas)
+
+
+def _ndjson(queryset, campos, nombres):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    yield from _bloques(
+        queryset, campos, lambda fila: codificador.encode(dict(zip(nombres, fila))) + '\n'
+    )
+
+
+def _csv(queryset, campos, nombres):
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel reconozca el UTF-8
+    yield '\ufeff' + escritor.writerow(nombres)
+    yield from _bloques(queryset, campos, lambda fila: escritor.writerow([
+        valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in fila
+    ]))
+
+
+def respuesta_exportacion(queryset, columnas, formato, nombre_archivo):
+    """
+    StreamingHttpResponse con las columnas del queryset. `columnas` es
+    {nombre en el archivo: campo}, y el campo acepta búsquedas con __ (p. ej.
+    'cliente__nombre_completo'). `formato` debe ser una clave de FORMATOS_EXPORTACION
+    """
+    generador = _csv if formato == 'csv' else _ndjson
+    respuesta = StreamingHttpResponse(
+        generador(queryset, list(columnas.values()), list(columnas)),
+        content_type=FORMATOS_EXPORTACION[formato]
+    )
+    marca = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}_{marca}.{formato}"'
+    return respuesta
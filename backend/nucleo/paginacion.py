@@ -0,0 +1,57 @@
+"""
+Paginación por cursor (keyset) para los listados de la API
+
+En lugar de OFFSET, cada página se pide con un cursor que codifica la posición de
+la última fila vista, y la consulta filtra con WHERE columna < posición ORDER BY
+columna LIMIT n: con un índice sobre las columnas de orden el costo de cada página
+es el mismo en la primera que en la millonésima.
+
+Se activa cuando el cliente envía `cursor` o `page_size`; sin ellos los endpoints
+responden la lista completa, como antes, para no romper a los clientes actuales.
+La respuesta paginada es {"next": url, "previous": url, "results": [...]}.
+"""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class PaginacionCursor(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (self.cursor_query_param not in request.query_params
+                and self.page_size_query_param not in request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        # Cada vista indica sus columnas de orden en `orden_cursor`; deben terminar
+        # en una columna única (id) para que las páginas no repitan ni salten filas
+        return tuple(getattr(view, 'orden_cursor', self.ordering))
+
+
+class PaginacionPorPagina(PageNumberPagination):
+    """
+    Páginas numeradas (?page=N) para resultados ordenados por un valor calculado,
+    como la relevancia de una búsqueda, donde no hay columna para un cursor. Ordenar
+    por ese valor ya exige leer todas las coincidencias, así que el OFFSET no agrega
+    un costo que crezca con la tabla
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+def respuesta_paginada(request, queryset, serializer_class, orden):
+    """
+    Equivalente de la paginación de los ViewSets para las vistas con @api_view
+    """
+    paginador = PaginacionCursor()
+    paginador.ordering = orden
+    pagina = paginador.paginate_queryset(queryset, request)
+    if pagina is None:
+        return Response(serializer_class(queryset, many=True).data)
+    return paginador.get_paginated_response(serializer_class(pagina, many=True).data)
@@ -118,6 +118,83 @@ if DATABASE_URL:
     # Neon recomienda sslmode=require; dj_database_url con ssl_require asegura SSL si falta en la URL
     DATABASES['default'] = dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=True)
 
+# Caché
+# 'predicciones' guarda los pronósticos del modelo de ventas (ver Predicciones/cache.py).
+# LocMemCache descarta las entradas menos usadas (LRU) al superar MAX_ENTRIES, pero es
+# propia de cada proceso; con REDIS_URL la caché se comparte entre los workers de gunicorn
+# (requiere instalar el paquete redis).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'predicciones': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'predicciones',
+        'TIMEOUT': 60 * 60 * 24,  # Los pronósticos se recalculan al día siguiente
+        'OPTIONS': {
+            'MAX_ENTRIES': 512,
+        },
+    },
+    # 'permisos' guarda los permisos efectivos de cada usuario (ver Permisos/cache.py).
+    # Sin Redis cada worker tiene la suya: un cambio de permisos se ve en los demás
+    # workers al vencer TIMEOUT
+    'permisos': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'permisos',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES['predicciones'].update({
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'predicciones',
+        # MAX_ENTRIES es de LocMemCache; Redis pasaría OPTIONS a su conexión
+        'OPTIONS': {},
+    })
+    CACHES['permisos'].update({
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'permisos',
+        'TIMEOUT': 60 * 60,  # Con Redis la invalidación llega a todos los workers
+        'OPTIONS': {},
+    })
+
+# Cargar el modelo de predicciones al importar la app WSGI. Con `gunicorn --preload`
+# la carga ocurre una sola vez en el proceso maestro y los workers comparten esas
+# páginas de memoria (copy-on-write) en lugar de cargar cada uno su copia
+PRECARGAR_MODELO_PREDICCIONES = os.getenv('PRECARGAR_MODELO_PREDICCIONES', 'False') == 'True'
+
+# Bitácora: las acciones se guardan por lotes desde un hilo de cada proceso (ver
+# Bitacora/escritor.py). Con False cada acción se guarda en el momento
+BITACORA_ASINCRONA = os.getenv('BITACORA_ASINCRONA', 'True') == 'True'
+
+# Carritos activos (ver Carrito/almacen.py): 'bd' escribe cada cambio en la BD;
+# 'redis' (con REDIS_URL) y 'memoria' (un solo proceso) los guardan ahí y los
+# pasan a la BD en segundo plano. Con CARRITO_ASINCRONO=False se pasan en el momento
+CARRITO_ALMACEN = os.getenv('CARRITO_ALMACEN', 'redis' if REDIS_URL else 'bd')
+CARRITO_ASINCRONO = os.getenv('CARRITO_ASINCRONO', 'True') == 'True'
+
+# Permisos por módulo en la API (ver Permisos/acceso.py). Con False cualquier
+# petición pasa, como antes de aplicarlos
+PERMISOS_POR_MODULO = os.getenv('PERMISOS_POR_MODULO', 'True') == 'True'
+
+# Django REST Framework
+# Los listados se paginan por cursor cuando el cliente lo pide (ver nucleo/paginacion.py)
+REST_FRAMEWORK = {
+    # Token JWT propio (Usuarios/autenticacion.py); sin token la petición es anónima
+    'DEFAULT_AUTHENTICATION_CLASSES': ['Usuarios.autenticacion.JWTAutenticacion'],
+    # Permisos por módulo de los roles según la ruta y el método (Permisos/acceso.py)
+    'DEFAULT_PERMISSION_CLASSES': ['Permisos.acceso.PermisoPorModulo'],
+    'DEFAULT_PAGINATION_CLASS': 'nucleo.paginacion.PaginacionCursor',
+    'PAGE_SIZE': 50,
+}
+
 # Configuración de CORS
 # En desarrollo permite localhost y 127.0.0.1
 # En producción, agrega tus dominios de AWS y móvil
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nucleo.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.PRECARGAR_MODELO_PREDICCIONES:
+    from Predicciones.ml_service import predictor
+    predictor.huella_modelo()
@@ -34,6 +34,9 @@ interface DashboardData {
 
 const COLORS = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#8884D8'];
 
+// Tiempo máximo que se espera a que termine un entrenamiento encolado
+const ESPERA_MAXIMA_ENTRENAMIENTO_MS = 10 * 60 * 1000;
+
 const DashboardPredicciones: React.FC = () => {
   const [data, setData] = useState<DashboardData | null>(null);
   const [cargando, setCargando] = useState(true);
@@ -80,11 +83,37 @@ const DashboardPredicciones: React.FC = () => {
 
       const result = await response.json();
 
-      if (result.success) {
-        alert(`Modelo entrenado exitosamente!\n\nMétricas:\n- R² Score: ${result.metricas.r2_score.toFixed(4)}\n- RMSE: ${result.metricas.rmse.toFixed(2)}\n- Muestras: ${result.metricas.n_samples}\n- Tipo: ${result.metricas.data_type}`);
+      if (!result.success) {
+        alert('Error al entrenar modelo: ' + result.error);
+        return;
+      }
+
+      // El entrenamiento corre en segundo plano: consultar su estado hasta que termine
+      let trabajo = result.trabajo;
+      const limite = Date.now() + ESPERA_MAXIMA_ENTRENAMIENTO_MS;
+      while (trabajo.estado === 'pendiente' || trabajo.estado === 'en_proceso') {
+        if (Date.now() > limite) {
+          alert('El entrenamiento sigue en curso. Revisa más tarde el estado del modelo.');
+          return;
+        }
+        await new Promise(resolve => setTimeout(resolve, 3000));
+        const estado = await fetch(`http://localhost:8000/api/predicciones/trabajos/${trabajo.id}/`);
+        if (!estado.ok) {
+          alert(`Error al consultar el entrenamiento (HTTP ${estado.status})`);
+          return;
+        }
+        trabajo = await estado.json();
+      }
+
+      if (trabajo.estado === 'completado') {
+        const metricas = trabajo.metricas;
+        // Un incremental sin ventas nuevas (o con una sola) no trae todas las métricas
+        const formatearMetrica = (valor: number | null | undefined, decimales: number) =>
+          typeof valor === 'number' ? valor.toFixed(decimales) : 'N/D';
+        alert(`Modelo entrenado exitosamente!\n\nMétricas:\n- R² Score: ${formatearMetrica(metricas?.r2_score, 4)}\n- RMSE: ${formatearMetrica(metricas?.rmse, 2)}\n- Muestras: ${metricas?.n_samples ?? 'N/D'}\n- Tipo: ${metricas?.data_type ?? 'N/D'}`);
         await cargarDatos();
       } else {
-        alert('Error al entrenar modelo: ' + result.error);
+        alert('Error al entrenar modelo: ' + trabajo.error);
       }
     } catch (err) {
       console.error('Error:', err);